@@ -0,0 +1,54 @@
+'''
+Benchmark of the campaign planner on synthetic campaigns.
+
+Usage: python benchmarks/plan_campaign.py [experiments ...]
+'''
+import sys
+import time
+import random
+
+from monroe.campaign import plan_campaign, pool_key, _place, _makespan
+
+
+def synthetic_campaign(size, seed=0):
+    rng = random.Random(seed)
+    countries = [['norway'], ['sweden'], ['spain'], ['italy'], ['norway', 'sweden']]
+    specs = []
+    for i in range(size):
+        specs.append({
+            'name': 'exp%d' % i,
+            'script': 'monroe/base',
+            'duration': rng.choice([300, 600, 1800, 3600, 7200]),
+            'nodecount': rng.randint(1, 12),
+            'countries': rng.choice(countries),
+            'deployed': rng.random() < 0.3
+        })
+    pools = {}
+    for spec in specs:
+        pools[pool_key(spec)] = (0, rng.randint(12, 40))
+    return specs, pools
+
+
+def main(sizes):
+    print("%12s %10s %12s %12s %12s" % (
+        'experiments', 'seconds', 'file order', 'planned', 'lower bound'))
+    for size in sizes:
+        specs, pools = synthetic_campaign(size)
+        jobs = dict((j, (s['duration'], s['nodecount'], pool_key(s)))
+                    for j, s in enumerate(specs))
+        naive = _makespan(_place(sorted(jobs.keys()), jobs, pools), jobs)
+        # No plan can beat the busiest pool working at full capacity
+        bound = 0
+        for key, (earliest, capacity) in pools.items():
+            pool = [j for j in jobs.values() if j[2] == key]
+            work = sum(d * n for d, n, k in pool) / float(capacity)
+            bound = max(bound, earliest + max(work, max(d for d, n, k in pool)))
+        start = time.time()
+        plan = plan_campaign(specs, pools)
+        elapsed = time.time() - start
+        print("%12d %10.3f %12d %12d %12d" % (
+            size, elapsed, naive, plan.makespan(), bound))
+
+
+if __name__ == '__main__':
+    main([int(i) for i in sys.argv[1:]] or [100, 200, 500])
@@ -0,0 +1,195 @@
+import os
+import re
+import mmap
+import gzip
+from concurrent.futures import ProcessPoolExecutor
+
+from monroe.core import COMPRESSED_SUFFIX
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Numeric fields summarised by default, as named in MONROE measurement files
+METRICS = ('Rtt', 'Throughput', 'Speed', 'Bandwidth')
+
+PERCENTILES = (50, 90, 99)
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("NumPy is required for result summaries, install it with pip install numpy")
+
+
+def _scan(job):
+    # Runs in a worker process: reads the timestamps and metric values of
+    # every record of a file without building the records themselves
+    path, metrics = job
+    size = os.path.getsize(path)
+    timestamps = []
+    values = {}
+    records = 0
+    if size == 0:
+        return (path, size, 0, np.array([]), {}, True)
+    pattern = re.compile(
+        rb'"(Timestamp|InterfaceName|' + b'|'.join(m.encode() for m in metrics) +
+        rb')"\s*:\s*(?:"([^"]*)"|(-?[0-9][0-9.eE+-]*))')
+    with open(path, 'rb') as f:
+        if path.endswith(COMPRESSED_SUFFIX):
+            # Compressed files cannot be mapped, they are inflated into
+            # anonymous memory instead
+            data = gzip.GzipFile(fileobj=f).read()
+            mm = mmap.mmap(-1, max(len(data), 1))
+            mm.write(data)
+            mm.seek(0)
+            del data
+        else:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            # Measurements are JSON lines, one record per line; other files
+            # (logs, listings, whole JSON documents) are not scanned
+            if not mm.readline().rstrip().endswith(b'}'):
+                return (path, size, 0, np.array([]), {}, False)
+            mm.seek(0)
+            for chunk in iter(mm.readline, b''):
+                fields = pattern.findall(chunk)
+                if not fields:
+                    continue
+                records += 1
+                iface = ''
+                for key, text, number in fields:
+                    if key == b'InterfaceName':
+                        iface = text.decode(errors='replace')
+                for key, text, number in fields:
+                    try:
+                        number = float(number)
+                    except ValueError:
+                        continue
+                    if key == b'Timestamp':
+                        timestamps.append(number)
+                    else:
+                        values.setdefault((iface, key.decode()), []).append(number)
+        finally:
+            mm.close()
+    return (path, size, records, np.array(timestamps, dtype=float),
+            dict((k, np.array(v, dtype=float)) for k, v in values.items()), True)
+
+
+def summarize(directory, nodes=None, metrics=METRICS, gap=60, workers=None):
+    '''Computes per-schedule statistics over the results of an experiment downloaded to ``directory`` (laid out as ``<directory>/<schedule>/...``). Files are memory-mapped and scanned in a process pool, and the statistics are computed with NumPy.
+
+    :param directory: Location of the downloaded results
+    :type directory: string
+    :param nodes: Node ID of each schedule ID
+    :type nodes: dict
+    :param metrics: Numeric fields to compute percentiles for, per interface
+    :type metrics: tuple
+    :param gap: Seconds without measurements counted as a coverage gap
+    :type gap: int
+    :param workers: Number of worker processes, defaults to the number of CPUs
+    :type workers: int
+    :returns: ResultsSummary
+    '''
+    _require_numpy()
+    jobs = []
+    for root, dirs, files in os.walk(directory):
+        parts = os.path.relpath(root, directory).split(os.sep)
+        if not parts[0].isdigit():
+            continue
+        for name in files:
+            if name.startswith('index.html'):
+                continue
+            jobs.append((os.path.join(root, name), metrics))
+    rows = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        scanned = list(pool.map(_scan, jobs, chunksize=16))
+    for path, size, records, timestamps, values, measured in scanned:
+        schedule = int(os.path.relpath(path, directory).split(os.sep)[0])
+        row = rows.setdefault(schedule, {
+            'schedule': schedule,
+            'node': (nodes or {}).get(schedule),
+            'files': 0,
+            'skipped': 0,
+            'bytes': 0,
+            'records': 0,
+            'timestamps': [],
+            'values': {}
+        })
+        row['files'] += 1
+        row['bytes'] += size
+        if not measured:
+            row['skipped'] += 1
+            continue
+        row['records'] += records
+        row['timestamps'].append(timestamps)
+        for key, v in values.items():
+            row['values'].setdefault(key, []).append(v)
+
+    summary = []
+    for schedule in sorted(rows.keys()):
+        row = rows[schedule]
+        # Schedules whose files were all skipped have no timestamps
+        parts = row.pop('timestamps')
+        t = np.sort(np.concatenate(parts)) if parts else np.array([], dtype=np.float64)
+        steps = np.diff(t)
+        row['first'] = float(t[0]) if t.size else None
+        row['last'] = float(t[-1]) if t.size else None
+        row['gaps'] = int(np.count_nonzero(steps > gap))
+        row['largest_gap'] = float(steps.max()) if steps.size else 0.0
+        stats = {}
+        for key, parts in row.pop('values').items():
+            v = np.concatenate(parts)
+            stats[key] = {
+                'count': int(v.size),
+                'mean': float(v.mean()),
+                'percentiles': dict(zip(PERCENTILES,
+                                        np.percentile(v, PERCENTILES).tolist()))
+            }
+        row['metrics'] = stats
+        summary.append(row)
+    return ResultsSummary(summary)
+
+
+class ResultsSummary:
+    ''' 
+    Class that models the statistics of the downloaded results of an experiment.
+    '''
+
+    def __init__(self, data):
+        self._data = data
+
+    def schedules(self):
+        '''Returns the statistics of every schedule, as dicts holding the ``schedule`` and ``node`` IDs, the number of ``files`` and ``bytes``, the number of files ``skipped`` because they do not hold JSON-lines measurements, the number of ``records``, the ``first`` and ``last`` timestamps, the number of coverage ``gaps`` and the ``largest_gap``, and the ``metrics`` statistics per ``(interface, field)``.
+
+       :returns: list
+       '''
+        return self._data
+
+    def nodes(self):
+        '''Returns the number of files, bytes and records per node.
+
+       :returns: dict
+       '''
+        pernode = {}
+        for row in self._data:
+            n = pernode.setdefault(row['node'], {'files': 0, 'bytes': 0, 'records': 0})
+            for key in n:
+                n[key] += row[key]
+        return pernode
+
+    def __repr__(self):
+        return "<ResultsSummary schedules=%r >" % len(self._data)
+
+    def __str__(self):
+        lines = []
+        for row in self._data:
+            lines.append("Schedule ID=%s Node ID=%s Files=%d (%d skipped) Size=%d bytes Records=%d Gaps=%d Largest gap=%.0f s" % (
+                str(row['schedule']), str(row['node']), row['files'], row['skipped'],
+                row['bytes'], row['records'], row['gaps'], row['largest_gap']))
+            for (iface, field), stat in sorted(row['metrics'].items()):
+                p = stat['percentiles']
+                lines.append("    %s %s: count=%d mean=%.2f p50=%.2f p90=%.2f p99=%.2f" % (
+                    iface or '-', field, stat['count'], stat['mean'], p[50],
+                    p[90], p[99]))
+        return "\n".join(lines)
@@ -0,0 +1,90 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    '''
+    Class that stores scheduler responses on disk, one file per endpoint,
+    so that they can be served again without a round trip.
+    '''
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, endpoint):
+        # Hashed, as query strings can exceed the file name length limit
+        return os.path.join(self.directory,
+                            hashlib.sha1(endpoint.encode()).hexdigest() + '.json')
+
+    def _load(self, endpoint):
+        try:
+            with open(self._path(endpoint), 'r') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def age(self, endpoint):
+        '''Returns the age of the cached response for ``endpoint``.
+
+        :returns: float -- Age in seconds, or None if nothing is cached
+        '''
+        entry = self._load(endpoint)
+        if entry is None:
+            return None
+        return time.time() - entry['fetched']
+
+    def load(self, endpoint):
+        '''Returns the cached response for ``endpoint`` whatever its age, with that age.
+
+        :returns: tuple -- ``(response, age in seconds)``, or None if nothing is cached
+        '''
+        entry = self._load(endpoint)
+        if entry is None:
+            return None
+        return entry['body'], time.time() - entry['fetched']
+
+    def get(self, endpoint, max_age):
+        '''Returns the cached response for ``endpoint`` if it is younger than ``max_age`` seconds, otherwise None.'''
+        entry = self._load(endpoint)
+        if entry is None or time.time() - entry['fetched'] > max_age:
+            return None
+        return entry['body']
+
+    def put(self, endpoint, body):
+        '''Stores the response for ``endpoint``. Failures are logged and otherwise ignored, the cache only saves round trips.'''
+        path = self._path(endpoint)
+        try:
+            if not os.path.exists(self.directory):
+                os.makedirs(self.directory)
+            # Write to a temporary file first so readers never see a partial response
+            with open(path + '.tmp', 'w') as f:
+                json.dump({'fetched': time.time(), 'body': body}, f)
+            os.replace(path + '.tmp', path)
+        except (IOError, OSError) as err:
+            log.warning("Could not cache the response for %s: %s", endpoint, err)
+
+
+def detach(target, *args):
+    '''Runs ``target(*args)`` in a detached process, typically to refresh a cache, and returns immediately. The process is forked twice so that it is neither waited for nor left as a zombie.'''
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid:
+        os.waitpid(pid, 0)
+        return
+    try:
+        os.setsid()
+        if os.fork() == 0:
+            null = os.open(os.devnull, os.O_RDWR)
+            for fd in (0, 1, 2):
+                os.dup2(null, fd)
+            target(*args)
+    except BaseException:
+        pass
+    os._exit(0)
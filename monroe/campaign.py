@@ -0,0 +1,502 @@
+import os
+import bisect
+import datetime
+import json
+import random
+import subprocess
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+from monroe.core import AvailabilityReport, CancelToken, FINISHED_STATES
+
+# Steps every experiment of a campaign goes through, in order
+STAGES = ('validate', 'submit', 'deploy', 'exec', 'harvest', 'postprocess')
+
+# Schedule states in which the container is running on the node
+RUNNING_STATES = ('deployed', 'started', 'restarted', 'running')
+
+
+def load_campaign(path):
+    '''Loads a campaign description from a YAML (or JSON) file. The file holds a list of ``experiments``, each with a ``script`` and optionally ``name``, ``duration``, ``nodecount``, ``countries``, ``deployed``, ``model``, ``ifcount``, ``nodes``, ``traffic`` and ``storage`` (in bytes), and an optional ``deadline`` formatted as Y-m-dTH:M:S. When run with ``CampaignRunner``, an experiment can also set ``exec``, a command run over SSH on every node once deployed, and ``postprocess``, a shell command run on the downloaded results, where ``{experiment}`` and ``{path}`` are replaced by the experiment ID and results folder.
+
+    :param path: Location of the campaign file
+    :type path: string
+    :returns: dict
+    '''
+    if not path.endswith('.json') and yaml is None:
+        raise RuntimeError("PyYAML is required to read YAML campaign files, install it with pip install monroe-lib[yaml] or use a .json file")
+    with open(path, 'r') as f:
+        if path.endswith('.json'):
+            data = json.load(f)
+        else:
+            data = yaml.safe_load(f)
+    if not data or not data.get('experiments'):
+        raise RuntimeError("Campaign file holds no experiments")
+    deadline = data.get('deadline')
+    if isinstance(deadline, datetime.datetime):
+        deadline = time.mktime(deadline.timetuple())
+    elif isinstance(deadline, str):
+        deadline = time.mktime(
+            datetime.datetime.strptime(deadline, "%Y-%m-%dT%H:%M:%S").timetuple())
+    data['deadline'] = deadline
+    for spec in data['experiments']:
+        if 'script' not in spec:
+            raise RuntimeError("Every experiment needs a script")
+        spec.setdefault('duration', 300)
+        spec.setdefault('nodecount', 1)
+    return data
+
+
+def spec_experiment(scheduler, spec, start=None):
+    '''Returns a draft ``Experiment`` for an experiment description of a campaign.'''
+    exp = scheduler.new_experiment(
+        spec.get('name'),
+        spec['script'],
+        spec['nodecount'],
+        spec['duration'],
+        testing=not spec.get('deployed', False))
+    if spec.get('countries'):
+        exp.countries([c.lower() for c in spec['countries']])
+    if _model(spec):
+        exp.model(new=_model(spec) == 'model:apu2d4')
+    if spec.get('ifcount'):
+        exp.ifcount(spec['ifcount'])
+    if spec.get('nodes'):
+        exp.nodes(spec['nodes'])
+        exp.nodecount(len(spec['nodes']))
+    if spec.get('traffic'):
+        exp.traffic(spec['traffic'])
+    if spec.get('storage'):
+        exp.storage(spec['storage'])
+    if start is not None:
+        exp.start(start)
+    return exp
+
+
+def _model(spec):
+    model = str(spec.get('model') or '').split(':')[-1]
+    if model in ('new', 'apu2d4'):
+        return 'model:apu2d4'
+    if model in ('old', 'apu1d4'):
+        return 'model:apu1d4'
+    return ''
+
+
+def pool_key(spec):
+    '''Returns the key of the node pool an experiment description draws from; experiments with the same key compete for the same nodes.
+
+    :returns: tuple -- Node type, model, countries and nodes
+    '''
+    return ('type:deployed' if spec.get('deployed') else 'type:testing',
+            _model(spec),
+            tuple(sorted(c.lower() for c in spec.get('countries') or [])),
+            tuple(sorted(spec.get('nodes') or [])))
+
+
+def pool_nodes(nodes, key):
+    '''Returns the IDs of the nodes of the inventory that belong to a node pool.
+
+    :param nodes: Node inventory, as returned by ``Scheduler.nodes``
+    :type nodes: list
+    :param key: Pool key, as returned by ``pool_key``
+    :type key: tuple
+    :returns: frozenset
+    '''
+    nodetype, model, countries, ids = key
+    if ids:
+        return frozenset(ids)
+    return frozenset(
+        n.id() for n in nodes
+        if n.status() == 'active'
+        and n.nodetype() in ('undefined', nodetype.split(':')[-1])
+        and (not model or n.model() == model.split(':')[-1])
+        and (not countries or n.project() in countries or n.site() in countries))
+
+
+def probe_pools(scheduler, specs, workers=8):
+    '''Checks the availability of the node pool of every experiment description concurrently, and finds the nodes of every pool in the node inventory so that pools sharing nodes are planned together.
+
+    :returns: dict -- ``(earliest start, number of nodes, node IDs)`` per pool key, or None for pools the scheduler cannot allocate
+    '''
+    pools = {}
+    for spec in specs:
+        key = pool_key(spec)
+        pools[key] = max(pools.get(key, 0), spec['duration'])
+
+    def probe(key):
+        report = scheduler.availability(
+            pools[key], 1, key[0], countries=list(key[2]),
+            nodes=list(key[3]), model=key[1])
+        if isinstance(report, AvailabilityReport):
+            return (report.start(), report.max_nodecount(),
+                    pool_nodes(inventory, key))
+        return None
+
+    inventory = scheduler.nodes(max_age=3600)
+    keys = list(pools.keys())
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(keys, pool.map(probe, keys)))
+
+
+def _members(pools):
+    # Nodes of every pool; a pool whose nodes are unknown is given nodes of
+    # its own, as many as it can allocate
+    members = {}
+    for key, pool in pools.items():
+        nodes = pool[2] if len(pool) > 2 else None
+        if nodes:
+            members[key] = sorted(nodes, key=str)
+        else:
+            members[key] = [(key, i) for i in range(pool[1])]
+    return members
+
+
+def _peak(nodes, busy, start, stop):
+    # Largest number of the nodes planned to be busy at once in [start, stop)
+    events = []
+    for n in nodes:
+        for a, b in busy[n]:
+            if a < stop and b > start:
+                events.append((max(a, start), 1))
+                events.append((b, -1))
+    peak = current = 0
+    for _, step in sorted(events):
+        current += step
+        peak = max(peak, current)
+    return peak
+
+
+def _place(order, jobs, pools):
+    # Every node keeps the intervals it is planned to be busy, so a node
+    # shared by several pools is only booked once; a pool can also use no
+    # more than its capacity of its nodes at any time
+    members = _members(pools)
+    busy = {}
+    shared = {}
+    for nodes in members.values():
+        for n in nodes:
+            busy[n] = []
+            shared[n] = shared.get(n, 0) + 1
+    stops = []
+    starts = {}
+    for j in order:
+        duration, nodecount, key = jobs[j]
+        earliest, capacity = pools[key][0], pools[key][1]
+        nodes = members[key]
+        # Nodes only free up when a planned experiment stops
+        for t in sorted(set([earliest] + [s for s in stops if s > earliest])):
+            free = [n for n in nodes
+                    if all(b <= t or a >= t + duration for a, b in busy[n])]
+            if len(free) >= nodecount and \
+                    _peak(nodes, busy, t, t + duration) + nodecount <= capacity:
+                break
+        # Nodes in fewer pools first, to keep the shared ones for the others
+        free.sort(key=lambda n: shared[n])
+        for n in free[:nodecount]:
+            busy[n].append((t, t + duration))
+        stops.append(t + duration)
+        starts[j] = t
+    return starts
+
+
+def _makespan(starts, jobs):
+    return max([starts[j] + jobs[j][0] for j in starts] or [0])
+
+
+def plan_campaign(specs, pools, deadline=None, quota_time=None,
+                  iterations=200, seed=0):
+    '''Packs the experiments of a campaign into the available node pools so that the whole campaign finishes as early as possible. Experiments are placed greedily, longest first, at the earliest time their pool has enough free nodes, counting the nodes shared by several pools once, and the order is then improved by local search (pairwise swaps kept when they shorten the campaign).
+
+    :param specs: Experiment descriptions, as loaded by ``load_campaign``
+    :type specs: list
+    :param pools: Availability of the node pools, as returned by ``probe_pools``
+    :type pools: dict
+    :param deadline: UNIX timestamp by which every experiment should be finished
+    :type deadline: int
+    :param quota_time: Remaining time quota, in node seconds; experiments beyond it are left out in file order
+    :type quota_time: int
+    :param iterations: Number of local search moves tried
+    :type iterations: int
+    :returns: CampaignPlan
+    '''
+    jobs = {}
+    skipped = {}
+    used = 0
+    live = dict((k, v) for k, v in pools.items() if v is not None)
+    members = _members(live)
+    for j, spec in enumerate(specs):
+        key = pool_key(spec)
+        cost = spec['duration'] * spec['nodecount']
+        if pools.get(key) is None:
+            skipped[j] = "no nodes available"
+        elif spec['nodecount'] > min(pools[key][1], len(members[key])):
+            skipped[j] = "only %s nodes available" % str(min(pools[key][1], len(members[key])))
+        elif quota_time is not None and used + cost > quota_time:
+            skipped[j] = "exceeds the time quota"
+        else:
+            used += cost
+            jobs[j] = (spec['duration'], spec['nodecount'], key)
+
+    order = sorted(jobs.keys(), key=lambda j: -jobs[j][0] * jobs[j][1])
+    starts = _place(order, jobs, live)
+    best = _makespan(starts, jobs)
+    rng = random.Random(seed)
+    for _ in range(iterations if len(order) > 1 else 0):
+        a, b = rng.sample(range(len(order)), 2)
+        order[a], order[b] = order[b], order[a]
+        candidate = _place(order, jobs, live)
+        span = _makespan(candidate, jobs)
+        if span < best:
+            best, starts = span, candidate
+        else:
+            order[a], order[b] = order[b], order[a]
+
+    entries = []
+    for j in sorted(starts.keys(), key=lambda j: (starts[j], j)):
+        entries.append({
+            'index': j,
+            'name': specs[j].get('name') or specs[j]['script'],
+            'start': starts[j],
+            'stop': starts[j] + jobs[j][0],
+            'late': deadline is not None and starts[j] + jobs[j][0] > deadline
+        })
+    return CampaignPlan({
+        'entries': entries,
+        'skipped': skipped,
+        'makespan': best,
+        'quota_time': used
+    })
+
+
+class CampaignPlan:
+    ''' 
+    Class that models the planned start times of the experiments of a campaign.
+    '''
+
+    def __init__(self, data):
+        self._data = data
+
+    def entries(self):
+        '''Returns the planned experiments, as dicts holding the ``index`` of the description in the campaign, its ``name``, the planned ``start`` and ``stop`` and whether it finishes after the deadline (``late``), ordered by start time.
+
+       :returns: list
+       '''
+        return self._data['entries']
+
+    def skipped(self):
+        '''Returns the reason each unplanned experiment was left out, by index in the campaign.
+
+       :returns: dict
+       '''
+        return self._data['skipped']
+
+    def makespan(self):
+        '''Returns the time at which the last planned experiment finishes.
+
+       :returns: int -- UNIX timestamp
+       '''
+        return self._data['makespan']
+
+    def quota_time(self):
+        '''Returns the node time used by the planned experiments.
+
+       :returns: int -- Node seconds
+       '''
+        return self._data['quota_time']
+
+    def __repr__(self):
+        return "<CampaignPlan experiments=%r makespan=%r >" % (
+            len(self.entries()), self.makespan())
+
+    def __str__(self):
+        fmt = lambda t: str(datetime.datetime.fromtimestamp(t))
+        lines = []
+        for e in self.entries():
+            lines.append("#%d %s : %s to %s%s" % (
+                e['index'], e['name'], fmt(e['start']), fmt(e['stop']),
+                " (after the deadline)" if e['late'] else ""))
+        for j in sorted(self.skipped().keys()):
+            lines.append("#%d not planned: %s" % (j, self.skipped()[j]))
+        if self.entries():
+            lines.append("Campaign finishes at %s, using %.2f hours of node time" % (
+                fmt(self.makespan()), self.quota_time() / 3600.0))
+        return "\n".join(lines)
+
+
+class CampaignRunner:
+    '''
+    Class that runs every experiment of a campaign through its pipeline
+    (validate, submit, wait for deployment, optional SSH command, harvest
+    the results as schedules finish, post-process), many experiments at a
+    time. Progress is checkpointed to a state file after every step, so a
+    runner restarted on the same state file resumes the pipelines instead
+    of submitting the experiments again.
+    '''
+
+    def __init__(self, scheduler, campaign, state, workers=8, interval=60,
+                 sshkey=None, output=print):
+        self.scheduler = scheduler
+        self.campaign = campaign
+        self.path = state
+        self.workers = workers
+        self.interval = interval
+        self.sshkey = sshkey
+        self.output = output
+        self._lock = threading.Lock()
+        self._stop = CancelToken()
+        self._state = {}
+        if os.path.isfile(state):
+            with open(state, 'r') as f:
+                self._state = json.load(f)
+
+    def _save(self):
+        with self._lock:
+            with open(self.path + '.tmp', 'w') as f:
+                json.dump(self._state, f)
+            os.replace(self.path + '.tmp', self.path)
+
+    def state(self, index):
+        '''Returns the checkpointed state of an experiment of the campaign: the last completed ``stage``, the ``experiment`` ID once submitted and the ``error`` that stopped the pipeline, if any.
+
+        :returns: dict
+        '''
+        return self._state.setdefault(str(index), {
+            'stage': None,
+            'experiment': None,
+            'name': None,
+            'submitting': False,
+            'error': None
+        })
+
+    def run(self):
+        '''Runs the pipelines of every unfinished experiment of the campaign until they complete or fail.
+
+        :returns: dict -- State of every experiment, by index in the campaign
+        '''
+        specs = self.campaign['experiments']
+        for j in range(len(specs)):
+            self.state(j)
+        # The requests of the pipelines are cancelled along with the run,
+        # and keep the deadline of the scheduler if it has one
+        scheduler = self.scheduler
+        if scheduler.token is not None:
+            self._stop.deadline = scheduler.token.deadline
+        self.scheduler = scheduler.bounded(token=self._stop)
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            list(pool.map(self._pipeline, range(len(specs))))
+        except BaseException:
+            # Typically KeyboardInterrupt: the workers stop at their next
+            # step instead of being waited for
+            self.stop()
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            self.scheduler = scheduler
+        pool.shutdown()
+        self._stop.check()
+        return dict((j, self.state(j)) for j in range(len(specs)))
+
+    def stop(self):
+        '''Stops the pipelines of a run at their next step, for example from another thread. The experiments are not marked as failed, so running the campaign again resumes them.'''
+        self._stop.cancel()
+
+    def _pipeline(self, index):
+        spec = self.campaign['experiments'][index]
+        st = self.state(index)
+        st['error'] = None
+        done = STAGES.index(st['stage']) + 1 if st['stage'] else 0
+        for stage in STAGES[done:]:
+            try:
+                self._stop.check()
+                getattr(self, '_' + stage)(spec, st)
+            except Exception as err:
+                if self._stop.cancelled():
+                    return
+                st['error'] = "%s: %s" % (stage, str(err))
+                self._save()
+                self.output("#%d failed at %s" % (index, st['error']))
+                return
+            st['stage'] = stage
+            self._save()
+            self.output("#%d %s done" % (index, stage))
+
+    def _draft(self, spec, st):
+        exp = spec_experiment(self.scheduler, spec)
+        if st['name'] is None:
+            # Unique, so that a resumed run can find its own submission
+            st['name'] = "%s-%s" % (exp.name(), uuid.uuid4().hex[:8])
+        exp.name(st['name'])
+        if spec.get('exec'):
+            if self.sshkey is None:
+                raise RuntimeError("An SSH key is needed to run commands on the nodes")
+            with open(self.sshkey + '.pub', 'r') as f:
+                exp.sshkey(f.read())
+        return exp
+
+    def _validate(self, spec, st):
+        self._draft(spec, st).validate(
+            quota=self.scheduler.auth(max_age=self.interval))
+
+    def _submit(self, spec, st):
+        if st['experiment'] is None and st['submitting']:
+            # A previous run stopped between submitting and checkpointing:
+            # look the experiment up by name before submitting it again
+            for e in self.scheduler.experiments():
+                if e.name() == st['name']:
+                    st['experiment'] = e.id()
+        if st['experiment'] is None:
+            st['submitting'] = True
+            self._save()
+            report = self.scheduler.submit_experiment(self._draft(spec, st))
+            if not hasattr(report, 'experiment'):
+                raise RuntimeError(str(report))
+            if 'Could not allocate' in report.message():
+                raise RuntimeError(report.message())
+            st['experiment'] = report.experiment()
+
+    def _wait(self, st, states):
+        while True:
+            schedules = self.scheduler.schedules(st['experiment'])
+            if schedules and all(i.status() in states for i in schedules):
+                return schedules
+            if self._stop.wait(self.interval):
+                self._stop.check()
+
+    def _deploy(self, spec, st):
+        self._wait(st, RUNNING_STATES + FINISHED_STATES)
+
+    def _exec(self, spec, st):
+        if not spec.get('exec'):
+            return
+        for item in self._wait(st, RUNNING_STATES + FINISHED_STATES):
+            if item.status() in FINISHED_STATES:
+                continue
+            cmd = [
+                'ssh', '-o', 'StrictHostKeyChecking=no', '-o',
+                'UserKnownHostsFile=/dev/null', '-i', self.sshkey, '-p',
+                str(30000 + item.nodeid()), 'root@tunnel.monroe-system.eu',
+                spec['exec']
+            ]
+            if subprocess.call(cmd, stdout=subprocess.DEVNULL) != 0:
+                raise RuntimeError("Command failed on node %s" % str(item.nodeid()))
+
+    def _harvest(self, spec, st):
+        for _ in self.scheduler.harvest([st['experiment']], workers=2,
+                                        interval=self.interval):
+            pass
+
+    def _postprocess(self, spec, st):
+        if not spec.get('postprocess'):
+            return
+        cmd = spec['postprocess'].format(
+            experiment=st['experiment'], path=str(st['experiment']))
+        if subprocess.call(cmd, shell=True) != 0:
+            raise RuntimeError("Post-processing command failed")
@@ -9,11 +9,20 @@ import re
 import socket
 import datetime
 import json
+import shutil
 
-from OpenSSL.crypto import load_pkcs12, FILETYPE_PEM, FILETYPE_ASN1, dump_certificate, dump_privatekey
-from Crypto.PublicKey import RSA
-
-from monroe.core import Scheduler, Experiment
+from monroe.core import Scheduler, Experiment, FINISHED_STATES, NODE_FIELDS, CancelToken, Cancelled
+from monroe.cache import ResponseCache, detach
+from monroe.journal import JournalStore, QUOTAS
+from monroe.index import ScheduleIndex
+from monroe.ingest import ResultStore
+from monroe.dedup import ContentStore
+from monroe.verify import verify_results
+from monroe.transfer import TokenBucket, HostSlots, DownloadScheduler
+from monroe.client import SOCKET
+from monroe.completion import BASH_SCRIPT, CACHE as completion_cache, refresh_later
+from monroe.output import FORMATS, write, record as output_record
+from monroe.campaign import load_campaign, probe_pools, plan_campaign, spec_experiment, CampaignRunner, STAGES
 
 # Paths for monroe certificates and keys
 
@@ -24,6 +33,24 @@ sshkey = str(mnr_dir) + 'mnr_rsa.pub'
 sshkey_priv = str(mnr_dir) + 'mnr_rsa'
 ssh_customconf = str(mnr_dir) + 'mnr_config'
 sshhost_alias = 'c' # short name for connection (c for container)
+journal_db = str(mnr_dir) + 'journals.sqlite'
+mnr_cache = str(mnr_dir) + 'cache'
+mnr_templates = str(mnr_dir) + 'templates/'
+schedule_index = str(mnr_dir) + 'schedules.json'
+mnr_store = str(mnr_dir) + 'store'
+mnr_slots = str(mnr_dir) + 'slots'
+mnr_bandwidth = str(mnr_dir) + 'bandwidth'
+
+# Seconds after which a node is considered down when submitting experiments
+heartbeat_max_age = 3600
+
+# Seconds for which the cached node inventory, quota and identity are trusted
+inventory_max_age = 3600
+quota_max_age = 300
+auth_max_age = 300
+
+# Scheduler shared by the commands run in this process
+_scheduler = None
 
 import logging
 logging.getLogger().setLevel(logging.DEBUG)
@@ -33,12 +60,22 @@ class MonroeCliPlugin:
     def register_args(cls, subparsers):
         raise NotImplementedError("Cannot register an abstract plugin!")
 
-def create(args):
+def connect():
     '''
-    Function that creates an experiment based on the parameters given 
-    to the argument parser
+    Function that returns the scheduler of this process, using the user
+    certificate and the local response cache
+    '''
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = Scheduler(mnr_crt, mnr_key, cache=ResponseCache(mnr_cache))
+    return _scheduler
+
+
+def build_experiment(args, scheduler):
+    '''
+    Function that builds a draft experiment from the parameters
+    given to the argument parser
     '''
-    scheduler = Scheduler(mnr_crt, mnr_key)
     exp = scheduler.new_experiment(
         args.name,
         args.script,
@@ -71,15 +108,11 @@ def create(args):
         try:
             d_opt = json.loads(args.jsonstr[0])
         except Exception as err:
-            print("Malformed options string: %s") % err
+            raise SystemExit("Malformed options string: %s" % err)
         exp.jsonstr(d_opt)
 
     if args.ifcount:
-        if args.ifcount in [1, 2, 3]:
-            exp.ifcount(args.ifcount)
-        else:
-            print("Inteface count invalid, number must be an integer between 1 and 3.")
-            sys.exit(1)
+        exp.ifcount(args.ifcount)
     
     if args.countries:
         c = []
@@ -105,28 +138,86 @@ def create(args):
         exp.nodecount(len(args.nodes))
     if args.recurrence:
         try:
-            period = int(arg.recurrence[0])
+            period = int(args.recurrence[0])
         except:
             raise SystemExit('Argument must be an integer')
-        until = args.recurrence[1]
-        if period < 3600:
-            raise SystemExit(
-                "The minimum period for recurring experiments must be at least 3600"
-            )
-        if (period % 3600) != 0:
-            raise SystemExit("Recurrence period must be a multiple of 3600")
         try:
-            date_t(until)
+            until = date_t(args.recurrence[1])
         except Exception as err:
             raise SystemExit(err)
-        exp.recurrence(period, date_t(until))
+        exp.recurrence(period, until)
     if args.maxnodes:
         maxnodes= scheduler.get_availability(exp).max_nodecount()
         #print(maxnodes)
         exp.nodecount(maxnodes)
     if args.start:
         exp.start(args.start)
-    if args.availability:
+    return exp
+
+
+def check_stale_nodes(args, scheduler, exp):
+    '''
+    Function that reports the nodes of an experiment not seen for longer
+    than the heartbeat threshold, and drops them or aborts if asked to
+    '''
+    threshold = args.max_heartbeat_age or heartbeat_max_age
+    stale = scheduler.stale_nodes(exp.nodes(), threshold,
+                                  max_age=inventory_max_age)
+    if not stale:
+        return
+    message = "Nodes not seen for more than %s: %s" % (
+        age_text(threshold), ' '.join([str(i) for i in stale]))
+    if args.stale_nodes == 'abort':
+        raise SystemExit(message)
+    print(message)
+    if args.stale_nodes == 'drop':
+        nodes = [i for i in exp.nodes() if i not in stale]
+        if not nodes:
+            raise SystemExit("No requested node is left.")
+        exp.nodes(nodes)
+        exp.nodecount(min(exp.nodecount(), len(nodes)))
+        print("Remaining nodes: " + ' '.join([str(i) for i in nodes]))
+
+
+def create(args):
+    '''
+    Function that creates an experiment based on the parameters given 
+    to the argument parser
+    '''
+    scheduler = connect()
+    exp = build_experiment(args, scheduler)
+    if args.auto_nodes is not None:
+        constraints = exp.constraints()
+        if args.per_site:
+            constraints['per_site'] = args.per_site
+        # Auto-selection only filters on heartbeats when asked to
+        if args.max_heartbeat_age:
+            constraints['heartbeat'] = args.max_heartbeat_age
+        nodes = scheduler.select_nodes(
+            constraints, args.auto_nodes or None, max_age=inventory_max_age)
+        if not nodes:
+            raise SystemExit("No node set matching the constraints is available.")
+        print("Selected nodes: " + ' '.join([str(i) for i in nodes]))
+        exp.nodes(nodes)
+        exp.nodecount(len(nodes))
+    # Selected node sets are checked too, as the selection may keep stale nodes
+    if exp.nodes() and args.max_heartbeat_age != 0:
+        check_stale_nodes(args, scheduler, exp)
+    try:
+        inventory = None
+        if exp.nodes():
+            inventory = scheduler.nodes(max_age=inventory_max_age)
+        exp.validate(inventory, scheduler.auth(max_age=quota_max_age))
+    except RuntimeError as err:
+        raise SystemExit(err)
+    if args.plan:
+        if not args.recurrence:
+            raise SystemExit("--plan requires --recurrence")
+        try:
+            print(scheduler.plan_recurrence(exp))
+        except Exception as err:
+            raise SystemExit(err)
+    elif args.availability:
         #print(exp.prepareJson())
         try:
             print(scheduler.get_availability(exp))
@@ -140,12 +231,12 @@ def create(args):
                 sys.exit(1)
             expid = int(re.search(r'\d+', str(a)).group())
             if args.jsonstr:
-                print("Additional options passed: " + str(d_opt))
+                print("Additional options passed: " + str(exp.jsonstr()))
             if args.ssh:
                 print('Connecting to your experiment container:\n')
                 item = scheduler.schedules(expid)[0]
                 port = 30000 + item.nodeid()
-                con = check_server('193.10.227.35', port)
+                con = check_server('193.10.227.35', port, token=scheduler.token)
                 if con:
                     with open(ssh_customconf, 'w') as f:
                        f.writelines(['Host {}\n'.format(sshhost_alias),
@@ -161,14 +252,98 @@ def create(args):
         except Exception as err:
            raise SystemExit(err)
 
-def date_t(value):
-    '''Function which checks a given string can be converted to a date within accepted scheduler ranges'''
+def template_save(args):
+    '''
+    Function that stores the experiment built from the parameters
+    given to the argument parser as a reusable template
+    '''
+    scheduler = connect()
+    exp = build_experiment(args, scheduler)
+    if not os.path.exists(mnr_templates):
+        os.makedirs(mnr_templates)
+    with open(mnr_templates + args.template + '.json', 'w') as f:
+        json.dump(exp.template(), f)
+    print("Template %s saved." % args.template)
+
+
+def template_list(args):
+    '''
+    Function that prints the stored experiment templates
+    '''
+    if not os.path.isdir(mnr_templates):
+        return
+    for item in sorted(os.listdir(mnr_templates)):
+        if item.endswith('.json'):
+            with open(mnr_templates + item, 'r') as f:
+                exp = Experiment(json.load(f))
+            print("Template: %s Script: %s Nodecount: %s Duration: %s" % (
+                item[:-5], exp.script(), str(exp.nodecount()), str(exp.duration())))
+
+
+def sweep_values(spec):
+    '''
+    Function that parses a sweep axis of the form option=value,value,...
+    where list values (countries, nodes) are joined with '+'
+    '''
+    key, sep, values = spec.partition('=')
+    if not sep or not values:
+        raise SystemExit("Malformed sweep axis: %s" % spec)
+
+    def convert(value):
+        try:
+            return int(value)
+        except ValueError:
+            return value
+
+    if key in ('countries', 'nodes'):
+        return key, [[convert(i) for i in v.split('+')] for v in values.split(',')]
+    return key, [convert(v) for v in values.split(',')]
+
+
+def template_run(args):
+    '''
+    Function that submits one experiment per combination of the
+    sweep values from a stored template
+    '''
     try:
-        t = time.mktime(
+        with open(mnr_templates + args.template + '.json', 'r') as f:
+            base = Experiment(json.load(f))
+    except (IOError, OSError):
+        raise SystemExit("Template %s not found." % args.template)
+    axes = dict(sweep_values(i) for i in args.sweep or [])
+    try:
+        drafts = list(base.sweep(**axes)) if axes else [base.clone()]
+    except (RuntimeError, TypeError) as err:
+        raise SystemExit("ERROR: %s" % str(err))
+    scheduler = connect()
+    quota = scheduler.auth(max_age=quota_max_age)
+    inventory = None
+    if any(exp.nodes() for exp in drafts):
+        inventory = scheduler.nodes(max_age=inventory_max_age)
+    for exp in drafts:
+        try:
+            exp.validate(inventory, quota)
+            if args.availability:
+                print("%s:\n%s" % (exp.name(), scheduler.get_availability(exp)))
+            else:
+                print("%s: %s" % (exp.name(), scheduler.submit_experiment(exp).message()))
+        except Exception as err:
+            print("%s: %s" % (exp.name(), str(err)))
+
+
+def date_any(value):
+    '''Function which converts a given string to a date'''
+    try:
+        return time.mktime(
             datetime.datetime.strptime(value, "%Y-%m-%dT%H:%M:%S").timetuple())
     except:
         msg = "Incorrect date/time format!"
         raise argparse.ArgumentTypeError(msg)
+
+
+def date_t(value):
+    '''Function which checks a given string can be converted to a date within accepted scheduler ranges'''
+    t = date_any(value)
     if t < time.time() or t > time.time() + 2678400:
         raise SystemExit("Date/time outside the acceptable ranges")
     return t
@@ -179,6 +354,8 @@ def gen_ssh_mnr():
     Function that generates and stores an RSA 2048 
     key for node login in OpenSSH format
     '''
+    from Crypto.PublicKey import RSA
+
     secret = getpass.getpass("Create export passphrase for the new key:")
     key = RSA.generate(2048)
     with open(sshkey, 'wb') as f:
@@ -194,10 +371,11 @@ def gen_ssh_mnr():
     print("These are the default keys used by the cli.")
 
 
-def check_server(address, port):
+def check_server(address, port, timeout=180, token=None):
     '''
     Function that checks the reachability of a server
-    on a specific port
+    on a specific port, for at most timeout seconds or
+    until the token is cancelled
     '''
 
     def spinning_cursor():
@@ -207,42 +385,33 @@ def check_server(address, port):
 
     print("Trying node " + str(port - 30000) + " on port " + str(port) + "...")
     spinner = spinning_cursor()
-    s = socket.socket()
     dead = False
     start = time.time()
+    if token is not None and token.remaining() is not None:
+        timeout = min(timeout, token.remaining())
     while dead == False:
         try:
             sys.stdout.write(next(spinner))
             sys.stdout.flush()
             sys.stdout.write('\b')
-            s.connect((address, port))
+            with socket.socket() as s:
+                s.settimeout(max(1, min(10, timeout - (time.time() - start))))
+                s.connect((address, port))
             print("Connection succeeded")
             return True
         except socket.error as e:
             time.sleep(1)
-        if (time.time() - start) > 180:
+        if (time.time() - start) > timeout or (token is not None and token.cancelled()):
             dead = True
             print("Could not contact the node.")
     return False
 
 
-def handle_args(argv):
+def add_experiment_args(parser_exp):
     '''
-    Main argument handler, registers subparsers
-    for the subcommands 'create', 'whoami', 'experiments',
-    'quota', 'setup', 'delete' and 'results'
+    Function that registers the experiment options shared by
+    the 'create' and 'template save' subcommands
     '''
-    parser = argparse.ArgumentParser(
-        prog='monroe', description='Monroe Cli')
-    parser.set_defaults(func=None)
-    subparsers = parser.add_subparsers(
-        title="Experiment",
-        description="The following commands can be used to create and submit experiments",
-        metavar='Command',
-        help='Description')
-    parser_exp = subparsers.add_parser('create', help='Creates an experiment')
-    parser_exp.set_defaults(func=create)
-
     parser_exp.add_argument(
         '--name', type=str, help='Sets the experiment name')
     parser_exp.add_argument(
@@ -322,19 +491,137 @@ def handle_args(argv):
         nargs=2,
         metavar='<period, finish time>',
         help='Defines recurrence parameters')
+
+
+def add_output_arg(parser, default=argparse.SUPPRESS):
+    '''Adds the output format option, accepted before or after the subcommand'''
+    parser.add_argument(
+        '--output',
+        choices=FORMATS,
+        default=default,
+        help='Prints the records as text (default), a JSON array, one JSON document per line (ndjson) or CSV')
+
+
+def add_cache_args(parser):
+    '''Adds the options serving read-only commands from the local response cache'''
+    parser.add_argument(
+        '--offline',
+        action='store_true',
+        help='Only uses the local cache, whatever its age, and never contacts the scheduler')
+    parser.add_argument(
+        '--max-stale',
+        type=int,
+        default=None,
+        metavar='<seconds>',
+        help='Uses cached responses up to <seconds> old instead of waiting for the scheduler, and refreshes them in the background')
+
+
+def age_text(seconds):
+    '''Returns a duration such as 2d 3h, 3h 12m or 45s'''
+    seconds = int(seconds)
+    for unit, size, sub, subsize in (('d', 86400, 'h', 3600), ('h', 3600, 'm', 60),
+                                     ('m', 60, 's', 1)):
+        if seconds >= size:
+            return "%d%s %d%s" % (seconds // size, unit, seconds % size // subsize, sub)
+    return "%ds" % seconds
+
+
+def report_stale(scheduler):
+    '''Tells how old the cached responses used by a command were, and refreshes them in the background'''
+    if not scheduler.stale:
+        return
+    sys.stderr.write("Served from the local cache, up to %s old%s.\n" % (
+        age_text(max(scheduler.stale.values())), " (offline)" if scheduler.offline else ""))
+    if not scheduler.offline:
+        detach(scheduler.refresh, list(scheduler.stale))
+
+
+def handle_args(argv):
+    '''
+    Main argument handler, registers subparsers
+    for the subcommands 'create', 'whoami', 'experiments',
+    'quota', 'nodes', 'setup', 'delete', 'results', 'template', 'plan',
+    'campaign', 'calendar', 'harvest', 'daemon', 'shell' and 'completion'
+    '''
+    parser = argparse.ArgumentParser(
+        prog='monroe', description='Monroe Cli')
+    parser.set_defaults(func=None)
+    add_output_arg(parser, 'text')
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        metavar='<seconds>',
+        help='Aborts the command when it runs longer than <seconds>, removing partial downloads')
+    subparsers = parser.add_subparsers(
+        title="Experiment",
+        description="The following commands can be used to create and submit experiments",
+        metavar='Command',
+        help='Description')
+    parser_exp = subparsers.add_parser('create', help='Creates an experiment')
+    parser_exp.set_defaults(func=create)
+
+    add_experiment_args(parser_exp)
     #parser_exp.add_argument('--save', action='store_true', help = 'Sets the experiment name')
     parser_exp.add_argument(
         '--availability',
         action='store_true',
         help='Check experiment availability')
+    parser_exp.add_argument(
+        '--auto-nodes',
+        nargs='?',
+        type=int,
+        const=0,
+        metavar='<max>',
+        help='Selects the largest available node set matching the experiment constraints, optionally capped at <max> nodes')
+    parser_exp.add_argument(
+        '--per-site',
+        type=int,
+        metavar='<number>',
+        help='Maximum number of auto-selected nodes per site')
+    parser_exp.add_argument(
+        '--max-heartbeat-age',
+        type=int,
+        metavar='<seconds>',
+        help='Reports requested or selected nodes not seen for longer than <seconds> (default 3600, 0 disables the check); with --auto-nodes, also excludes such nodes from the selection (no filter by default)')
+    parser_exp.add_argument(
+        '--stale-nodes',
+        choices=('warn', 'drop', 'abort'),
+        default='warn',
+        help='What to do with requested or selected nodes not seen recently: warn (default), drop them or abort')
+    parser_exp.add_argument(
+        '--plan',
+        action='store_true',
+        help='Check the availability of every occurrence of a recurrent experiment instead of submitting it')
 
     parser_whoami = subparsers.add_parser(
         'whoami', help='Displays MONROE user details')
     parser_whoami.set_defaults(func=whoami)
+    add_output_arg(parser_whoami)
+    add_cache_args(parser_whoami)
 
     parser_quota = subparsers.add_parser(
         'quota', help='Displays MONROE quota details')
     parser_quota.set_defaults(func=quota)
+    add_output_arg(parser_quota)
+    add_cache_args(parser_quota)
+    parser_quota.add_argument(
+        '--history',
+        metavar='<days>',
+        type=int,
+        help='Displays the quota journal of the last <days> days from the local store')
+    parser_quota.add_argument(
+        '--forecast',
+        action='store_true',
+        help='Displays the daily burn rate and projected exhaustion date of each quota')
+    parser_quota.add_argument(
+        '--days',
+        type=int,
+        default=30,
+        help='Number of days the burn rate is averaged over, default is 30')
+    parser_quota.add_argument(
+        '--refresh',
+        action='store_true',
+        help='Fetches new journal entries even if the local store is recent')
 
     parser_experiments = subparsers.add_parser(
         'experiments', help='Display recent experiments')
@@ -344,7 +631,38 @@ def handle_args(argv):
         type=int,
         default=10,
         help='Maximum number of experiments to display')
+    parser_experiments.add_argument(
+        '--schedules',
+        action='store_true',
+        help='Displays the number of schedules in each state, fetched concurrently')
     parser_experiments.set_defaults(func=experiments)
+    add_output_arg(parser_experiments)
+    add_cache_args(parser_experiments)
+
+    parser_nodes = subparsers.add_parser(
+        'nodes', help='Displays the node inventory')
+    parser_nodes.set_defaults(func=nodes)
+    parser_nodes.add_argument(
+        '--refresh',
+        action='store_true',
+        help='Fetches the inventory even if the cached one is recent')
+    parser_nodes.add_argument(
+        '--stats',
+        action='store_true',
+        help='Displays the heartbeat age distribution and the availability of the nodes per group')
+    parser_nodes.add_argument(
+        '--by',
+        choices=NODE_FIELDS,
+        default='site',
+        help='Groups the statistics by this field, default is site')
+    parser_nodes.add_argument(
+        '--threshold',
+        type=int,
+        default=3600,
+        metavar='<seconds>',
+        help='Counts nodes as alive if seen within <seconds>, default is 3600')
+    add_output_arg(parser_nodes)
+    add_cache_args(parser_nodes)
 
     parser_setup = subparsers.add_parser(
         'setup',
@@ -375,6 +693,191 @@ def handle_args(argv):
         metavar='<exp-id>',
         type=int,
         help='ID of the experiment you want to download')
+    parser_results.add_argument(
+        '--ingest',
+        metavar='<db.sqlite>',
+        help='Loads the measurements into a SQLite database as the files are downloaded')
+    parser_results.add_argument(
+        '--dedup',
+        action='store_true',
+        help='Stores each file once in ~/.monroe/store and hard-links it into the results folder')
+    parser_results.add_argument(
+        '--sync',
+        action='store_true',
+        help='Skips files already downloaded and unchanged on the server')
+    parser_results.add_argument(
+        '--verify',
+        action='store_true',
+        help='Checks the results against the server listing, downloading missing or corrupt files again, and writes <exp-id>/verification.json')
+    parser_results.add_argument(
+        '--summarize',
+        action='store_true',
+        help='Displays per-schedule statistics of the results, downloading them first if needed')
+    add_transfer_args(parser_results)
+
+    parser_template = subparsers.add_parser(
+        'template', help='Saves, lists and runs experiment templates')
+    template_commands = parser_template.add_subparsers(
+        metavar='Command', help='Description')
+    parser_template_save = template_commands.add_parser(
+        'save', help='Saves the experiment options as a template')
+    parser_template_save.set_defaults(func=template_save)
+    parser_template_save.add_argument(
+        'template', metavar='<template>', help='Name of the template')
+    add_experiment_args(parser_template_save)
+    parser_template_list = template_commands.add_parser(
+        'list', help='Lists the saved templates')
+    parser_template_list.set_defaults(func=template_list)
+    parser_template_run = template_commands.add_parser(
+        'run', help='Submits experiments from a template')
+    parser_template_run.set_defaults(func=template_run)
+    parser_template_run.add_argument(
+        'template', metavar='<template>', help='Name of the template')
+    parser_template_run.add_argument(
+        '--sweep',
+        nargs='+',
+        metavar='<option=value,value>',
+        help='Submits one experiment per combination of values. Example: --sweep duration=300,600 nodecount=1,2 countries=norway+sweden,spain')
+    parser_template_run.add_argument(
+        '--availability',
+        action='store_true',
+        help='Check the availability of each experiment instead of submitting it')
+
+    parser_plan = subparsers.add_parser(
+        'plan', help='Plans and submits a campaign of experiments')
+    parser_plan.set_defaults(func=plan)
+    parser_plan.add_argument(
+        'campaign',
+        metavar='<filename>',
+        help='Campaign file (YAML or JSON) listing the experiments and an optional deadline')
+    parser_plan.add_argument(
+        '--iterations',
+        type=int,
+        default=200,
+        help='Number of local search moves used to improve the plan, default is 200')
+    parser_plan.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='Displays the plan without submitting it')
+
+    parser_campaign = subparsers.add_parser(
+        'campaign', help='Runs a campaign of experiments through to their results')
+    campaign_commands = parser_campaign.add_subparsers(
+        metavar='Command', help='Description')
+    parser_campaign_run = campaign_commands.add_parser(
+        'run', help='Submits the experiments, waits for them and downloads and post-processes their results')
+    parser_campaign_run.set_defaults(func=campaign_run)
+    parser_campaign_run.add_argument(
+        '--workers',
+        type=int,
+        default=8,
+        help='Maximum number of experiments handled at a time, default is 8')
+    parser_campaign_run.add_argument(
+        '--interval',
+        type=int,
+        default=60,
+        help='Seconds between two checks of the schedules, default is 60')
+    parser_campaign_status = campaign_commands.add_parser(
+        'status', help='Displays the progress of the experiments of a campaign')
+    parser_campaign_status.set_defaults(func=campaign_status)
+    for p in (parser_campaign_run, parser_campaign_status):
+        p.add_argument(
+            'campaign',
+            metavar='<filename>',
+            help='Campaign file (YAML or JSON) listing the experiments')
+        p.add_argument(
+            '--state',
+            metavar='<filename>',
+            help='State file used to resume the campaign, default is <filename>.state')
+
+    parser_calendar = subparsers.add_parser(
+        'calendar', help='Displays when nodes are busy with your experiments')
+    parser_calendar.set_defaults(func=calendar)
+    parser_calendar.add_argument(
+        '--from',
+        dest='start',
+        type=date_any,
+        help='Start of the period, format Y-m-dTH:M:S, default is now')
+    parser_calendar.add_argument(
+        '--to',
+        dest='stop',
+        type=date_any,
+        help='End of the period, format Y-m-dTH:M:S, default is a week after the start')
+    parser_calendar.add_argument(
+        '--node',
+        nargs='+',
+        type=int,
+        help='Node IDs to display, default is all nodes used by your experiments')
+    parser_calendar.add_argument(
+        '--free',
+        action='store_true',
+        help='Displays the free windows instead of the busy ones')
+    parser_calendar.add_argument(
+        '--min-length',
+        type=int,
+        default=0,
+        metavar='<seconds>',
+        help='Minimum length of the free windows displayed')
+    parser_calendar.add_argument(
+        '--max-age',
+        type=int,
+        default=3600,
+        metavar='<seconds>',
+        help='Rebuilds the local schedule index when older than <seconds>, default is 3600')
+    parser_calendar.add_argument(
+        '--refresh',
+        action='store_true',
+        help='Rebuilds the local schedule index')
+    add_cache_args(parser_calendar)
+
+    parser_harvest = subparsers.add_parser(
+        'harvest',
+        help='Downloads results as soon as each schedule of an experiment finishes')
+    parser_harvest.set_defaults(func=harvest)
+    parser_harvest.add_argument(
+        'exp',
+        nargs='*',
+        metavar='<exp-id>',
+        type=int,
+        default=None,
+        help='IDs of the experiments to watch, default is all unfinished experiments')
+    parser_harvest.add_argument(
+        '--workers',
+        type=int,
+        default=4,
+        help='Maximum number of concurrent downloads, default is 4')
+    parser_harvest.add_argument(
+        '--interval',
+        type=int,
+        default=60,
+        help='Seconds between two checks of the schedules, default is 60')
+    add_transfer_args(parser_harvest)
+
+    parser_daemon = subparsers.add_parser(
+        'daemon',
+        help='Keeps a session warm in the background and runs the monroe commands forwarded to it')
+    parser_daemon.set_defaults(func=daemon)
+    parser_daemon.add_argument(
+        '--socket',
+        default=SOCKET,
+        metavar='<path>',
+        help='Location of the Unix socket, default is ~/.monroe/daemon.sock')
+    parser_daemon.add_argument(
+        '--refresh',
+        type=int,
+        default=300,
+        help='Seconds between two refreshes of the identity and node inventory, default is 300')
+
+    parser_shell = subparsers.add_parser(
+        'shell',
+        help='Runs monroe commands interactively, reusing one session')
+    parser_shell.set_defaults(func=shell)
+
+    parser_completion = subparsers.add_parser(
+        'completion',
+        help='Prints the bash completion script, enable it with eval "$(monroe completion)"')
+    parser_completion.set_defaults(func=completion)
+
     try:
         from straight.plugin import load
         plugins = load("monroe.plugins", subclasses=MonroeCliPlugin)
@@ -383,25 +886,47 @@ def handle_args(argv):
     except ImportError:
         pass
 
+    parser.set_defaults(commands=list(subparsers.choices))
+
     if len(sys.argv) == 1:
         parser.print_help()
         sys.exit(1)
 
     args = parser.parse_args(argv[1:])
+    if args.func is None:
+        parser.print_help()
+        sys.exit(1)
     # Validation of cert and key required before executing commands on the scheduler
-    if args.func != setup:
+    if args.func not in (setup, completion):
         if not os.path.isfile(mnr_key) or not os.path.isfile(mnr_crt):
             raise SystemExit(
                 "Please run monroe setup <certificate> to be able to submit experiments and retrieve results."
             )
+        scheduler = connect()
+        scheduler.offline = getattr(args, 'offline', False)
+        scheduler.max_stale = getattr(args, 'max_stale', None)
+        scheduler.stale = {}
+        scheduler.token = CancelToken.after(args.timeout) if args.timeout else None
         try:
-            scheduler = Scheduler(mnr_crt, mnr_key)
-            auth = scheduler.auth()
+            auth = scheduler.auth(max_age=auth_max_age)
+        except Cancelled as err:
+            raise SystemExit("ERROR: %s" % str(err))
         except:
             raise SystemExit(
                 "Something went wrong.\nTry running monroe setup <certificate>\nto refresh your certificate and check the scheduler is running\nand can be accessed from your local network."
             )
-        args.func(args)
+        try:
+            args.func(args)
+        except Cancelled as err:
+            raise SystemExit("ERROR: %s" % str(err))
+        except RuntimeError as err:
+            if not scheduler.offline:
+                raise
+            raise SystemExit("ERROR: %s" % str(err))
+        report_stale(scheduler)
+        if not scheduler.offline:
+            # Keeps the IDs offered by shell completion up to date
+            refresh_later(scheduler, args.commands, force=args.func in (create, delete))
     else:
         args.func(args)
 
@@ -411,6 +936,8 @@ def setup(args):
     Function that sets up the files necessary to the
     interaction with the scheduler
     '''
+    from OpenSSL.crypto import load_pkcs12, FILETYPE_PEM, dump_certificate, dump_privatekey
+
     if args.cert:
         if os.path.isfile(args.cert):
             try:
@@ -430,6 +957,11 @@ def setup(args):
                     f.write(pk)
                 with open(mnr_crt, 'wb') as f:
                     f.write(ct)
+                # Responses and IDs cached for a previous certificate
+                # belong to another user
+                shutil.rmtree(mnr_cache, ignore_errors=True)
+                if os.path.exists(completion_cache):
+                    os.remove(completion_cache)
             except Exception as err:
                 raise SystemExit('ERROR: %s' % str(err))
             print("Your certificate files were stored in ~/.monroe")
@@ -444,7 +976,7 @@ def delete(args):
     Function that deletes experiments based on the 
     experiment id passed to the parser
     '''
-    scheduler = Scheduler(mnr_crt, mnr_key)
+    scheduler = connect()
     try:
         for i in args.exp:
             a = scheduler.delete_experiment(i)
@@ -453,42 +985,373 @@ def delete(args):
         raise SystemExit("ERROR: %s" % str(err))
 
 
+def rate(value):
+    '''Parses a bandwidth such as 500k or 2M into bytes per second'''
+    m = re.match(r'^(\d+(?:\.\d+)?)([kKmMgG]?)$', value)
+    if m is None:
+        raise argparse.ArgumentTypeError("invalid rate: %s" % value)
+    return float(m.group(1)) * 1024 ** ' kmg'.index(m.group(2).lower() or ' ')
+
+
+def add_transfer_args(parser):
+    '''Adds the download scheduling options to a subcommand parser'''
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=None,
+        help='Downloads files through a shared scheduler with at most this many transfers at a time on this host')
+    parser.add_argument(
+        '--limit-rate',
+        type=rate,
+        default=None,
+        metavar='<rate>',
+        help='Caps the bandwidth used by all downloads on this host, e.g. 500k or 2M bytes per second')
+    parser.add_argument(
+        '--priority',
+        type=int,
+        default=0,
+        help='Priority of these downloads in the shared scheduler, lower goes first, default is 0')
+    parser.add_argument(
+        '--compress',
+        action='store_true',
+        help='Keeps the result files gzip-compressed on disk, with a .gz suffix')
+
+
+def downloader(args, scheduler):
+    '''Returns a download scheduler if any of the transfer options were given'''
+    if args.concurrency is None and args.limit_rate is None:
+        return None
+    concurrency = args.concurrency or 4
+    bucket = None
+    if args.limit_rate:
+        if not os.path.isdir(mnr_dir):
+            os.makedirs(mnr_dir)
+        bucket = TokenBucket(args.limit_rate, path=mnr_bandwidth)
+    return DownloadScheduler(scheduler, concurrency, bucket,
+                             HostSlots(mnr_slots, concurrency), args.priority,
+                             args.compress)
+
+
 def results(args):
     '''
     Function that downloads experiment results based on the 
     experiment id passed to the parser
     '''
-    scheduler = Scheduler(mnr_crt, mnr_key)
-    for i in args.exp:
-        scheduler.result(i)
+    scheduler = connect()
+    store = ResultStore(args.ingest) if args.ingest else None
+    callbacks = []
+    if args.dedup:
+        callbacks.append(ContentStore(mnr_store).callback)
+    if store:
+        callbacks.append(store.callback)
+
+    def callback(experimentid, schedule, path):
+        for c in callbacks:
+            c(experimentid, schedule, path)
+
+    if args.sync and args.compress:
+        raise SystemExit("ERROR: --sync cannot be combined with --compress")
+    status = 0
+    transfers = downloader(args, scheduler)
+    try:
+        for i in args.exp:
+            if not ((args.summarize or args.verify) and os.path.isdir(str(i))):
+                if transfers:
+                    transfers.submit_experiment(i, callback=callback if callbacks else None)
+                    if transfers.join():
+                        status = 1
+                else:
+                    scheduler.result(i, callback if callbacks else None, args.sync,
+                                     args.compress)
+            if args.verify:
+                report = verify_results(scheduler, i)
+                print(report)
+                if report.failed():
+                    status = 1
+            if args.summarize:
+                from monroe.analysis import summarize
+                nodes = dict((int(s.id()), s.nodeid()) for s in scheduler.schedules(i))
+                try:
+                    print(summarize(str(i), nodes))
+                except RuntimeError as err:
+                    raise SystemExit(err)
+    finally:
+        if store:
+            store.close()
+    if status:
+        sys.exit(status)
+
+
+def harvest(args):
+    '''
+    Function that watches experiments and downloads the results
+    of each schedule as soon as it finishes
+    '''
+    scheduler = connect()
+    try:
+        for expid, item in scheduler.harvest(
+                args.exp or None, workers=args.workers, interval=args.interval,
+                downloader=downloader(args, scheduler), compress=args.compress):
+            print("Downloaded results of schedule %s (node %s) for experiment %s" % (
+                str(item.id()), str(item.nodeid()), str(expid)))
+    except KeyboardInterrupt:
+        raise SystemExit(1)
+    except Exception as err:
+        raise SystemExit("ERROR: %s" % str(err))
+
+
+def daemon(args):
+    '''
+    Function that serves the monroe commands forwarded by the
+    command line over a Unix socket from a warm process
+    '''
+    from monroe.daemon import Daemon
+
+    def warm():
+        scheduler = connect()
+        scheduler.auth()
+        scheduler.nodes(max_age=inventory_max_age)
+
+    try:
+        server = Daemon(handle_args, warm, args.socket, args.refresh)
+    except RuntimeError as err:
+        raise SystemExit("ERROR: %s" % str(err))
+    print("Serving monroe commands on %s" % args.socket)
+    server.serve()
+
+
+def completion(args):
+    '''
+    Function that prints the bash completion script
+    '''
+    sys.stdout.write(BASH_SCRIPT)
+
+
+def shell(args):
+    '''
+    Function that runs monroe commands interactively
+    with a single scheduler and its caches
+    '''
+    from monroe.shell import MonroeShell
+
+    try:
+        MonroeShell(handle_args, connect(), args.commands, inventory_max_age).cmdloop()
+    except KeyboardInterrupt:
+        print()
+
+
+def plan(args):
+    '''
+    Function that plans a campaign of experiments into the available
+    node windows and submits the resulting plan
+    '''
+    try:
+        campaign = load_campaign(args.campaign)
+    except Exception as err:
+        raise SystemExit("ERROR: %s" % str(err))
+    scheduler = connect()
+    specs = campaign['experiments']
+    pools = probe_pools(scheduler, specs)
+    result = plan_campaign(specs, pools, campaign['deadline'],
+                           scheduler.auth().quota_time(), args.iterations)
+    print(result)
+    if args.dry_run:
+        return
+    for entry in result.entries():
+        exp = spec_experiment(scheduler, specs[entry['index']], entry['start'])
+        try:
+            print("#%d %s" % (entry['index'], scheduler.submit_experiment(exp).message()))
+        except Exception as err:
+            print("#%d %s" % (entry['index'], str(err)))
+
+
+def campaign_run(args):
+    '''
+    Function that runs every experiment of a campaign from submission
+    to post-processed results, resuming from the campaign state file
+    '''
+    try:
+        campaign = load_campaign(args.campaign)
+    except Exception as err:
+        raise SystemExit("ERROR: %s" % str(err))
+    runner = CampaignRunner(
+        connect(), campaign, args.state or args.campaign + '.state',
+        workers=args.workers, interval=args.interval, sshkey=sshkey_priv)
+    try:
+        states = runner.run()
+    except KeyboardInterrupt:
+        raise SystemExit("Interrupted, run the same command again to resume.")
+    if any(st['error'] for st in states.values()):
+        sys.exit(1)
+
+
+def campaign_status(args):
+    '''
+    Function that prints the progress of every experiment of a campaign
+    '''
+    try:
+        campaign = load_campaign(args.campaign)
+    except Exception as err:
+        raise SystemExit("ERROR: %s" % str(err))
+    runner = CampaignRunner(None, campaign, args.state or args.campaign + '.state')
+    for j, spec in enumerate(campaign['experiments']):
+        st = runner.state(j)
+        if st['error']:
+            status = "failed at %s" % st['error']
+        elif st['stage'] == STAGES[-1]:
+            status = "done"
+        else:
+            status = "last step %s" % (st['stage'] or 'none')
+        print("#%d %s Experiment ID: %s %s" % (
+            j, spec.get('name') or spec['script'], str(st['experiment']), status))
+
+
+def calendar(args):
+    '''
+    Function that prints when nodes are busy with the user's
+    experiments, or free, over a period of time
+    '''
+    index = None
+    limit = float('inf') if args.offline else max(args.max_age, args.max_stale or 0)
+    if not args.refresh and os.path.isfile(schedule_index):
+        index = ScheduleIndex.load(schedule_index)
+        age = time.time() - index.built()
+        if age > limit:
+            index = None
+        elif age > args.max_age:
+            sys.stderr.write("Schedule index built %s ago%s.\n" % (
+                age_text(age), " (offline)" if args.offline else ""))
+            if not args.offline:
+                detach(lambda: ScheduleIndex.build(connect()).save(schedule_index))
+    if index is None:
+        try:
+            index = ScheduleIndex.build(connect())
+        except Exception as err:
+            raise SystemExit("ERROR: %s" % str(err))
+        index.save(schedule_index)
+    start = args.start or time.time()
+    stop = args.stop or start + 7 * 86400
+    fmt = lambda t: datetime.datetime.fromtimestamp(t).strftime('%Y-%m-%d %H:%M')
+    nodes = args.node or index.nodes()
+    for nodeid in nodes:
+        if args.free:
+            for a, b in index.free_windows(nodeid, start, stop, args.min_length):
+                print("Node %s free from %s to %s" % (str(nodeid), fmt(a), fmt(b)))
+        else:
+            for expid, item in index.overlap(start, stop, nodeid):
+                print("Node %s busy from %s to %s with experiment %s (schedule %s, %s)" % (
+                    str(nodeid), fmt(item.start()), fmt(item.stop()),
+                    str(expid), str(item.id()), item.status()))
 
 
 def whoami(args):
     '''
     Function that prints user identity
     '''
-    scheduler = Scheduler(mnr_crt, mnr_key)
-    print(scheduler.auth())
+    scheduler = connect()
+    write([scheduler.auth(max_age=auth_max_age)], args.output)
 
 
 def quota(args):
     '''
-    Function that prints user quota
+    Function that prints user quota, with the history and
+    forecast served from the local journal store
     '''
-    scheduler = Scheduler(mnr_crt, mnr_key)
-    for i in scheduler.journals()[-3:]:
-        print(i)
+    scheduler = connect()
+    if not (args.history or args.forecast):
+        write(scheduler.journals()[-3:], args.output)
+        return
+    if args.history and args.forecast and args.output != 'text':
+        raise SystemExit("--history and --forecast cannot be combined with --output %s" % args.output)
+    store = JournalStore(journal_db)
+    try:
+        if args.offline:
+            max_age = float('inf')
+        elif args.refresh:
+            max_age = 0
+        else:
+            max_age = max(3600, args.max_stale or 0)
+        store.sync(scheduler, max_age=max_age)
+        if args.history:
+            write(store.entries(since=time.time() - args.history * 86400), args.output)
+        if args.forecast:
+            forecasts = []
+            for q in QUOTAS:
+                remaining, rate, until = store.forecast(q, args.days)
+                if remaining is not None:
+                    forecasts.append({'quota': q, 'remaining': remaining,
+                                      'rate': rate, 'until': until})
+            if args.output != 'text':
+                write(forecasts, args.output)
+                return
+            for f in forecasts:
+                unit, scale = ('hours', 3600) if f['quota'] == 'quota_time' else (
+                    'GB', 1024 * 1024 * 1024)
+                if f['until'] is None:
+                    end = "not being consumed"
+                else:
+                    end = "exhausted around %s" % datetime.datetime.fromtimestamp(
+                        f['until']).strftime('%Y-%m-%d')
+                print("%s : %.2f %s remaining, %.2f %s/day consumed, %s." % (
+                    f['quota'], f['remaining'] / scale, unit, f['rate'] / scale, unit, end))
+    finally:
+        store.close()
 
 
 def experiments(args):
     '''
     Function that prints with user experiments
     '''
-    scheduler = Scheduler(mnr_crt, mnr_key)
-    if args.max > len(scheduler.experiments()):
-        args.max = len(scheduler.experiments())
-    for i in scheduler.experiments()[-args.max:]:
-        print(i)
+    scheduler = connect()
+    exps = scheduler.experiments(last=args.max)
+    if not args.schedules:
+        write(exps, args.output)
+        return
+    # Schedules of finished experiments no longer change once they have
+    # been fetched in a finished state
+    finished = [e.id() for e in exps if e.status() in FINISHED_STATES]
+    schedules = scheduler.schedules_many(
+        [e.id() for e in exps if e.status() not in FINISHED_STATES])
+    schedules.update(scheduler.schedules_many(finished, final=True))
+
+    def records():
+        for e in exps:
+            counts = {}
+            for item in schedules[e.id()]:
+                counts[item.status()] = counts.get(item.status(), 0) + 1
+            if args.output == 'text':
+                yield "%s Schedules: %s" % (str(e), ' '.join(
+                    "%s=%d" % c for c in sorted(counts.items())))
+            else:
+                yield dict(output_record(e), schedules=counts)
+
+    write(records(), args.output)
+
+
+def nodes(args):
+    '''
+    Function that prints the node inventory
+    '''
+    scheduler = connect()
+    inventory = scheduler.nodes(max_age=0 if args.refresh else inventory_max_age)
+    if not args.stats:
+        write(inventory, args.output)
+        return
+    # NumPy is only loaded by the commands that need it
+    from monroe.tables import NodeTable
+    try:
+        table = NodeTable.from_nodes(inventory)
+    except RuntimeError as err:
+        raise SystemExit(err)
+    groups = sorted(table.availability(args.by, args.threshold).items(),
+                    key=lambda g: (-g[1]['available'], str(g[0])))
+    if args.output != 'text':
+        write([dict(counts, **{args.by: value}) for value, counts in groups], args.output)
+        return
+    print(table)
+    for value, counts in groups:
+        print("%s : nodes=%d active=%d alive=%d available=%d" % (
+            value, counts['nodes'], counts['active'], counts['alive'], counts['available']))
 
 def main():
     handle_args(sys.argv)
@@ -0,0 +1,88 @@
+import os
+import sys
+import json
+import signal
+import socket
+import struct
+
+# Location of the socket of a running ``monroe daemon``
+SOCKET = os.path.expanduser('~/.monroe/daemon.sock')
+
+# Commands that need the user's terminal and always run in this process
+LOCAL_COMMANDS = ('setup', 'daemon', 'shell')
+
+# Frame header: kind (r for the request and i for interrupts from the client,
+# o for output, e for errors and x for the exit status from the daemon) and length
+HEADER = struct.Struct('!cI')
+
+
+def send_frame(sock, kind, data):
+    sock.sendall(HEADER.pack(kind, len(data)) + data)
+
+
+def recv_exact(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise EOFError("monroe daemon closed the connection")
+        data += chunk
+    return data
+
+
+def forward(argv, path=SOCKET):
+    '''Runs a command in a running ``monroe daemon`` and relays its output.
+
+    :param argv: Command line, including the program name
+    :type argv: list
+    :param path: Location of the daemon socket
+    :type path: string
+    :returns: int -- The exit status of the command, or None if no daemon is running
+    '''
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except (IOError, OSError):
+        sock.close()
+        return None
+    # Ctrl-C interrupts the command in the daemon, which still reports its
+    # exit status; the command is also interrupted if this process dies
+    previous = signal.signal(signal.SIGINT, lambda signum, frame: send_frame(sock, b'i', b''))
+    try:
+        request = json.dumps({'argv': argv, 'cwd': os.getcwd(),
+                              'env': dict(os.environ)}).encode()
+        send_frame(sock, b'r', request)
+        while True:
+            kind, size = HEADER.unpack(recv_exact(sock, HEADER.size))
+            data = recv_exact(sock, size)
+            if kind == b'x':
+                return int(data)
+            stream = sys.stderr if kind == b'e' else sys.stdout
+            stream.buffer.write(data)
+            stream.flush()
+    finally:
+        signal.signal(signal.SIGINT, previous)
+        sock.close()
+
+
+def main():
+    '''
+    Entry point of the monroe command: forwards the command to a running
+    daemon when there is one, and runs it in this process otherwise
+    '''
+    argv = sys.argv
+    if len(argv) > 1 and argv[1] == '__complete':
+        # Answered from the completion cache without loading the cli
+        from monroe.completion import main
+        return main(argv[2:])
+    if (len(argv) > 1 and argv[1] not in LOCAL_COMMANDS and '--ssh' not in argv
+            and not os.environ.get('MONROE_NO_DAEMON')):
+        status = forward(argv)
+        if status is not None:
+            sys.exit(status)
+    from monroe.cli import main
+    main()
+
+
+if __name__ == "__main__":
+    main()
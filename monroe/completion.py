@@ -0,0 +1,92 @@
+import os
+import json
+import time
+
+from monroe.cache import detach
+
+# Compact cache of the IDs offered by shell completion
+CACHE = os.path.expanduser('~/.monroe/completion.json')
+
+# Seconds after which a command refreshes the cache in the background
+MAX_AGE = 600
+
+# Commands whose positional arguments are experiment IDs
+EXPERIMENT_COMMANDS = ('delete', 'results', 'harvest')
+
+# Script that hooks the completion into bash, e.g. eval "$(monroe completion)"
+BASH_SCRIPT = '''_monroe() {
+    COMPREPLY=( $(monroe __complete "${COMP_WORDS[@]:1:$COMP_CWORD}" 2>/dev/null) )
+}
+complete -o default -F _monroe monroe
+'''
+
+
+def load(path=CACHE):
+    '''Returns the completion cache, or an empty one if there is none.
+
+    :returns: dict
+    '''
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def refresh(scheduler, commands, path=CACHE, max_age=3600):
+    '''Rebuilds the completion cache with the user's experiments and the node inventory.
+
+    :param scheduler: Scheduler to list the experiments and nodes from
+    :type scheduler: Scheduler
+    :param commands: Names of the monroe commands
+    :type commands: list
+    :param max_age: Age in seconds up to which a cached node inventory is used
+    :type max_age: int
+    '''
+    data = {
+        'updated': time.time(),
+        'commands': sorted(commands),
+        'experiments': [[e.id(), e.name()] for e in scheduler.experiments(last=None)],
+        'nodes': [[n.id(), n.site()] for n in scheduler.nodes(max_age=max_age)]
+    }
+    with open(path + '.tmp', 'w') as f:
+        json.dump(data, f)
+    os.replace(path + '.tmp', path)
+
+
+def refresh_later(scheduler, commands, path=CACHE, max_age=MAX_AGE, force=False):
+    '''Refreshes the completion cache in a detached process if it is older than ``max_age`` seconds, or if ``force`` is set, and returns immediately.'''
+    if not force and time.time() - load(path).get('updated', 0) < max_age:
+        return
+    if not os.path.isdir(os.path.dirname(path)):
+        return
+    detach(refresh, scheduler, commands, path)
+
+
+def candidates(words, data):
+    '''Returns the completions of the last word of a command line.
+
+    :param words: Words of the command line after the program name, the last one being completed
+    :type words: list
+    :param data: Completion cache
+    :type data: dict
+    :returns: list
+    '''
+    text = words[-1] if words else ''
+    if len(words) <= 1:
+        ids = data.get('commands', [])
+    else:
+        options = [w for w in words[1:-1] if w.startswith('-')]
+        if options and options[-1] == '--nodes':
+            ids = [str(n[0]) for n in data.get('nodes', [])]
+        elif words[0] in EXPERIMENT_COMMANDS and not words[-2].startswith('-'):
+            ids = [str(e[0]) for e in reversed(data.get('experiments', []))]
+        else:
+            ids = []
+    return [i for i in ids if i.startswith(text)]
+
+
+def main(words):
+    '''Prints the completions of a command line, one per line.'''
+    for candidate in candidates(words, load()):
+        print(candidate)
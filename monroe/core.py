@@ -1,17 +1,221 @@
+import os
 import time
 import datetime
+import re
 import json
+import base64
+import binascii
+import contextlib
+import copy
+import gzip
+import hashlib
+import shutil
 import subprocess
+import tempfile
+import itertools
+import threading
+import logging
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 try:
     from haikunator import Haikunator
 except ImportError:
 
     class Haikunator:
-        def haikunate():
+        def haikunate(self):
             return "ididntinstallhaikunator"
 
+log = logging.getLogger(__name__)
+
+# Schedule states after which a node no longer produces results
+FINISHED_STATES = ('finished', 'stopped', 'failed', 'aborted', 'canceled')
+
+# Experiment methods that can be used to set options on clones and sweeps
+SETTERS = ('name', 'script', 'nodetype', 'model', 'ifcount', 'duration',
+           'start', 'countries', 'traffic', 'shared', 'storage', 'nodecount',
+           'nodes', 'jsonstr', 'sshkey', 'recurrence')
+
+# Categorical fields of the node inventory, as grouped by monroe.tables.NodeTable
+NODE_FIELDS = ('status', 'site', 'project', 'model', 'nodetype')
+
+# Scheduler limits on how far ahead experiments can be scheduled (31 days)
+MAX_SCHEDULE_AHEAD = 2678400
+
+# Suffix of result files kept compressed on disk
+COMPRESSED_SUFFIX = '.gz'
+
+# Seconds for which a cached identity is trusted by the methods that only
+# need the user ID; cached identities are kept per certificate
+AUTH_MAX_AGE = 3600
+AUTH_ENDPOINT = "/v1/backend/auth"
+
+# Endpoints whose responses are read back from the cache; one-off queries
+# such as availability checks are not stored
+CACHED_ENDPOINTS = re.compile(
+    r'^(/v1/backend/auth|/v1/resources/|/v1/users/\d+/(experiments|journals)'
+    r'|/v1/experiments/\d+/schedules)$')
+
+# Whether the installed wget can negotiate and decode compressed responses
+_wget_compression = None
+
+
+def certificate_id(path):
+    '''Returns a fingerprint of the certificate file at ``path``, used to keep the identities of different certificates apart.
+
+    :returns: string -- None if the file cannot be read
+    '''
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()[:16]
+    except (IOError, OSError):
+        return None
+
+
+def wget_compression():
+    '''Returns the wget options that request gzip-compressed responses and decode them as they arrive, or no options if the installed wget (older than 1.19.2) does not support it.
+
+    :returns: list
+    '''
+    global _wget_compression
+    if _wget_compression is None:
+        try:
+            usage = subprocess.Popen(['wget', '--help'], stdout=subprocess.PIPE,
+                                     stderr=subprocess.DEVNULL).communicate()[0]
+        except OSError:
+            usage = b''
+        _wget_compression = b'--compression' in usage
+    return ['--compression=auto'] if _wget_compression else []
+
+
+class Cancelled(RuntimeError):
+    '''Raised when a request is cancelled or runs past its deadline.'''
+
+
+class CancelToken:
+    '''
+    Class that models a cancellation token with an optional deadline. A
+    ``Scheduler`` bounded by a token kills its running requests and raises
+    ``Cancelled`` once the token is cancelled, from any thread, or once the
+    deadline has passed.
+    '''
+
+    def __init__(self, deadline=None):
+        self.deadline = deadline
+        self._event = threading.Event()
+
+    @classmethod
+    def after(cls, seconds):
+        '''Returns a token whose deadline is ``seconds`` from now.
+
+        :returns: CancelToken
+        '''
+        return cls(time.time() + seconds)
+
+    def cancel(self):
+        '''Cancels the requests using this token.'''
+        self._event.set()
+
+    def cancelled(self):
+        '''Returns whether the token was cancelled or its deadline has passed.
+
+        :returns: boolean
+        '''
+        return self._event.is_set() or (
+            self.deadline is not None and time.time() >= self.deadline)
+
+    def wait(self, timeout):
+        '''Waits ``timeout`` seconds, or less if the token is cancelled or its deadline passes meanwhile.
+
+        :returns: boolean -- Whether the token was cancelled or its deadline has passed
+        '''
+        remaining = self.remaining()
+        if remaining is not None:
+            timeout = min(timeout, remaining)
+        self._event.wait(timeout)
+        return self.cancelled()
+
+    def remaining(self):
+        '''Returns the seconds left before the deadline.
+
+        :returns: float -- None if there is no deadline
+        '''
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.time())
+
+    def check(self):
+        '''Raises ``Cancelled`` if the token was cancelled or its deadline has passed.'''
+        if self._event.is_set():
+            raise Cancelled("Request cancelled")
+        if self.cancelled():
+            raise Cancelled("Deadline exceeded")
+
+
+class _Request:
+    # Waits for a wget process, killing it as soon as the token fires and
+    # cleaning up after it
+
+    def __init__(self, process, token, cleanup=None):
+        self.process = process
+        self.token = token
+        self.cleanup = cleanup
+        self._done = threading.Event()
+
+    def __enter__(self):
+        if self.token is not None:
+            watcher = threading.Thread(target=self._watch)
+            watcher.daemon = True
+            watcher.start()
+        return self.process
+
+    def _watch(self):
+        while not self._done.wait(0.1):
+            if self.token.cancelled():
+                self.process.kill()
+                return
+
+    def __exit__(self, kind, value, traceback):
+        self._done.set()
+        if kind is not None and self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        cancelled = self.token is not None and self.token.cancelled()
+        if (cancelled or kind is not None) and self.cleanup is not None:
+            self.cleanup()
+        if cancelled:
+            self.token.check()
+        return False
+
+
+def open_result(path):
+    '''Opens a downloaded result file for reading in binary mode, decompressing it if it is kept compressed on disk.
+
+    :returns: file object
+    '''
+    if path.endswith(COMPRESSED_SUFFIX):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+@contextlib.contextmanager
+def compressed_writer(path):
+    '''Opens ``path`` for writing gzip-compressed data. The gzip header records no file name or time, so identical results compress to identical files, which the results store can deduplicate.'''
+    with open(path, 'wb') as raw, gzip.GzipFile(filename='', mode='wb', fileobj=raw, mtime=0) as f:
+        yield f
+
+
+def compress_file(path):
+    '''Replaces a downloaded file with a gzip-compressed copy.
+
+    :returns: string -- The path of the compressed file
+    '''
+    with open(path, 'rb') as src, compressed_writer(path + COMPRESSED_SUFFIX + '.part') as dst:
+        shutil.copyfileobj(src, dst, 1 << 20)
+    os.replace(path + COMPRESSED_SUFFIX + '.part', path + COMPRESSED_SUFFIX)
+    os.remove(path)
+    return path + COMPRESSED_SUFFIX
+
 
 class Experiment:
     ''' 
@@ -20,6 +224,63 @@ class Experiment:
 
     def __init__(self, data):
         self._data = data
+        # True while the options dict is shared with a clone
+        self._shared = False
+
+    def _options(self):
+        if self._shared:
+            self._data['options'] = dict(self._data['options'])
+            self._shared = False
+        return self._data['options']
+
+    def clone(self, **params):
+        '''Returns a draft copy of the experiment, without any request to the scheduler. The options are shared with the copy until either of them modifies them.
+
+        :param params: Options to set on the copy, named after the setter methods, e.g. ``duration=600``. Use a tuple for setters taking several arguments, e.g. ``recurrence=(3600, until)``. Setting ``nodes`` also sets ``nodecount`` to the number of nodes, unless it is given too
+        :returns: Experiment
+        '''
+        data = dict(self._data)
+        data['status'] = 'draft'
+        data['id'] = None
+        data['summary'] = None
+        self._shared = True
+        exp = Experiment(data)
+        exp._shared = True
+        for key, value in params.items():
+            if key not in SETTERS:
+                raise RuntimeError("Unknown experiment option %s" % key)
+            if isinstance(value, tuple):
+                getattr(exp, key)(*value)
+            else:
+                getattr(exp, key)(value)
+        # Specific nodes determine the node count, as in the create command
+        if params.get('nodes') and 'nodecount' not in params:
+            exp.nodecount(len(exp.nodes()))
+        return exp
+
+    def sweep(self, **axes):
+        '''Returns a draft for every combination of the given option values (cartesian product). Drafts are named after the experiment with a numbered suffix unless ``name`` is one of the axes.
+
+        :param axes: Lists of values per option, e.g. ``duration=[300, 600], nodecount=[1, 2], countries=[['norway'], ['sweden', 'spain']]``
+        :returns: generator -- ``Experiment`` drafts
+        '''
+        keys = sorted(axes.keys())
+        for n, values in enumerate(itertools.product(*[axes[k] for k in keys])):
+            params = dict(zip(keys, values))
+            if 'name' not in params:
+                params['name'] = "%s-%d" % (self._data['name'], n + 1)
+            yield self.clone(**params)
+
+    def template(self):
+        '''Returns the options of the experiment as a JSON-serialisable dict, which can be stored and turned back into a draft with ``Experiment(data)``.
+
+        :returns: dict
+        '''
+        data = json.loads(json.dumps(self._data))
+        data['status'] = 'draft'
+        data['id'] = None
+        data['summary'] = None
+        return data
 
     def name(self, value=None):
         '''
@@ -80,15 +341,14 @@ class Experiment:
            else:
               self._data['model'] = 'model:apu1d4'
     def ifcount(self, value=None):
-        ''''Sets the interface count required of the nodes
+        ''''Sets the interface count required of the nodes; values outside 1 to 3 are reported by ``validate``
         :param new : Integer between 1 and 3
         :returns: int -- Interface count needed for the nodes, ranging from 1 to 3'
         ''' 
         if value == None:
            return self._data['ifcount']
         elif self._data['status'] == 'draft':
-           if value in [1, 2, 3]:
-              self._data['ifcount'] = value
+           self._data['ifcount'] = value
         
     def id(self):
         '''Returns the id of an experiment, if it exists. Experiment ids are assigned at experiment submission
@@ -187,7 +447,7 @@ class Experiment:
         if value == None:
             return self._data['options']['traffic']
         elif self._data['status'] == 'draft':
-            self._data['options']['traffic'] = value
+            self._options()['traffic'] = value
         else:
             raise RuntimeError("Attempted to modify a non-draft experiment")
 
@@ -201,7 +461,7 @@ class Experiment:
         if value == None:
             return self._data['options']['shared']
         elif self._data['status'] == 'draft':
-            self._data['options']['shared'] = value
+            self._options()['shared'] = value
         else:
             raise RuntimeError("Attempted to modify a non-draft experiment")
 
@@ -215,7 +475,7 @@ class Experiment:
         if value == None:
             return self._data['options']['storage']
         elif self._data['status'] == 'draft':
-            self._data['options']['storage'] = value
+            self._options()['storage'] = value
         else:
             raise RuntimeError("Attempted to modify a non-draft experiment")
 
@@ -243,7 +503,7 @@ class Experiment:
         if value == None:
             return self._data['options']['nodes']
         elif self._data['status'] == 'draft':
-            self._data['options']['nodes'] = value
+            self._options()['nodes'] = value
         else:
             raise RuntimeError("Attempted to modify a non-draft experiment")
 
@@ -259,7 +519,7 @@ class Experiment:
             return self._data['options']['jsonstr']
         elif self._data['status'] == 'draft':
             if isinstance(value, dict): 
-                self._data['options']['jsonstr'] = value
+                self._options()['jsonstr'] = value
             else:
                 raise RuntimeError("Not a valid dict. JSON strings passed to the scheduler need to be python dictionaries")
         else:
@@ -275,7 +535,7 @@ class Experiment:
         if value == None:
             return self._data['options']['sshkey']
         elif self._data['status'] == 'draft':
-            self._data['options']['sshkey'] = value
+            self._options()['sshkey'] = value
         else:
             raise RuntimeError("Attempted to modify a non-draft experiment")
 
@@ -293,14 +553,112 @@ class Experiment:
                     self._data['options']['until'])
         elif self._data['status'] == 'draft':
             if period is not None and until is not None:
-                self._data['options']['recurrence'] = True
-                self._data['options']['period'] = period
-                self._data['options']['until'] = until
+                self._options()['recurrence'] = True
+                self._options()['period'] = period
+                self._options()['until'] = until
             else:
                 raise RuntimeError("Need to specify a period and finish time")
         else:
             raise RuntimeError("Attempted to modify a non-draft experiment")
 
+    def validate(self, inventory=None, quota=None):
+        '''Checks the experiment for problems the scheduler would reject it for, before it is submitted. The node checks are only run when an inventory is given, and the quota checks when an ``Auth`` object is given.
+
+        :param inventory: Node inventory, as returned by ``Scheduler.nodes``
+        :type inventory: list
+        :param quota: Authentication details holding the user's remaining quota
+        :type quota: Auth
+        :returns: boolean -- True if no problem was found
+        :raises: RuntimeError -- Listing every problem found
+        '''
+        errors = []
+        data = self._data
+        options = data['options']
+        now = time.time()
+        if data['ifcount'] is not None and data['ifcount'] not in [1, 2, 3]:
+            errors.append("Interface count invalid, number must be an integer between 1 and 3.")
+        if data['ifcount'] == 3 and (data['nodecount'] % 2) == 1:
+            errors.append("Number of nodes must be even for dual-node experiments!")
+        if data['start'] not in (0, -1) and not (
+                now <= data['start'] <= now + MAX_SCHEDULE_AHEAD):
+            errors.append("Start date/time outside the acceptable ranges")
+        if options['recurrence'] is True:
+            if data['start'] == -1:
+                errors.append("Cannot deploy Low Priority Queue recurrent events!")
+            if options['sshkey'] is not None:
+                errors.append("Cannot deploy SSH tunnel with recurrent events!")
+            if options['period'] < 3600:
+                errors.append("The minimum period for recurring experiments must be at least 3600")
+            elif (options['period'] % 3600) != 0:
+                errors.append("Recurrence period must be a multiple of 3600")
+            if not (now <= options['until'] <= now + MAX_SCHEDULE_AHEAD):
+                errors.append("Recurrence finish date/time outside the acceptable ranges")
+
+        if inventory is not None and len(options['nodes']) > 0:
+            known = dict((n.id(), n) for n in inventory)
+            for nodeid in options['nodes']:
+                node = known.get(int(nodeid))
+                if node is None:
+                    errors.append("Node %s does not exist" % str(nodeid))
+                elif node.status() != 'active':
+                    errors.append("Node %s is not active (status: %s)" % (
+                        str(nodeid), node.status()))
+                elif node.nodetype() not in ('undefined', data['nodetype'].split(':')[-1]):
+                    errors.append("Node %s is not a %s node" % (
+                        str(nodeid), data['nodetype'].split(':')[-1]))
+
+        if quota is not None:
+            runs = 1
+            if options['recurrence'] is True and options['period']:
+                runs += max(0, int(options['until'] - max(data['start'], now)) // options['period'])
+            # Lower bounds: the scheduler may charge more, e.g. per interface
+            nodes = data['nodecount'] * runs
+            if data['duration'] * nodes > quota.quota_time():
+                errors.append("Experiment needs %s seconds of node time, only %s remaining" % (
+                    str(data['duration'] * nodes), str(quota.quota_time())))
+            if options['traffic'] * (data['ifcount'] or 1) * nodes > quota.quota_data():
+                errors.append("Experiment needs %s bytes of data quota, only %s remaining" % (
+                    str(options['traffic'] * (data['ifcount'] or 1) * nodes), str(quota.quota_data())))
+            if options['storage'] * nodes > quota.quota_storage():
+                errors.append("Experiment needs %s bytes of storage quota, only %s remaining" % (
+                    str(options['storage'] * nodes), str(quota.quota_storage())))
+
+        if errors:
+            raise RuntimeError("\n".join(errors))
+        return True
+
+    def constraints(self):
+        '''Returns the node requirements of the experiment, in the form taken by ``Scheduler.select_nodes``.
+
+        :returns: dict
+        '''
+        c = {
+            'nodetype': self._data['nodetype'],
+            'duration': self._data['duration'],
+            'start': int(self._data['start'])
+        }
+        if self._data['countries']:
+            c['countries'] = self._data['countries']
+        if self._data['model']:
+            c['model'] = self._data['model']
+        if self._data['ifcount']:
+            c['ifcount'] = self._data['ifcount']
+        return c
+
+    def occurrences(self, period=None):
+        '''Returns the start times of every occurrence of a recurrent experiment, optionally for another ``period`` than the experiment's own. Experiments set to start as soon as possible are expanded from the current time.
+
+        :param period: Repeat frequency of the experiment, in seconds
+        :type period: int
+        :returns: list -- UNIX timestamps
+        '''
+        if self._data['options']['recurrence'] is not True:
+            return [int(self._data['start'])]
+        if period is None:
+            period = self._data['options']['period']
+        start = int(self._data['start']) or int(time.time())
+        return list(range(start, int(self._data['options']['until']) + 1, int(period)))
+
     def prepareJson(self):
         '''Returns a formatted JSON string which is suitable for passing to the scheduler backend via an http POST request.
 
@@ -328,30 +686,19 @@ class Experiment:
         options['resultsQuota'] = self._data['options']['resultsQuota']
         options['shared'] = self._data['options']['shared']
         options['storage'] = self._data['options']['storage']
-        if self._data['ifcount'] == 3:
-           if (self._data['nodecount']%2) == 1:
-               raise RuntimeError("Error. Number of nodes must be even for dual-node experiments!")
-
-
-        if self._data['options']['recurrence'] is True and self._data['start'] == -1:
-            raise RuntimeError(
-                "Error. Cannot deploy Low Priority Queue recurrent events!")
+        self.validate()
 
         if self._data['options']['recurrence'] is True:
             options['recurrence'] = 'simple'
             options['period'] = self._data['options']['period']
             options['until'] = self._data['options']['until']
         if self._data['options']['sshkey'] is not None:
-            if self._data['options']['recurrence'] is True:
-                raise RuntimeError(
-                    "Error. Cannot deploy SSH tunnel with recurrent events!")
-            else:
-                options['ssh'] = {
-                    "server": "tunnel.monroe-system.eu",
-                    "server.port": 29999,
-                    "server.user": "tunnel",
-                    "client.public": self._data['options']['sshkey']
-                }
+            options['ssh'] = {
+                "server": "tunnel.monroe-system.eu",
+                "server.port": 29999,
+                "server.user": "tunnel",
+                "client.public": self._data['options']['sshkey']
+            }
         if len(self._data['options']['nodes']) > 0:
             options['nodes'] = ', '.join([str(i) for i in self._data['options']['nodes']])
         jinp =  self._data['options']['jsonstr']
@@ -388,31 +735,124 @@ class Scheduler:
     Class that models the monroe scheduler functionality.
     '''
 
-    def __init__(self, cert, key):
+    def __init__(self, cert, key, cache=None, compression=True, connect_timeout=30,
+                 read_timeout=300, tries=3):
         self.cert = cert
         self.key = key
+        self.cache = cache
+        self.compression = compression
+        # Transport limits, see bounded() for deadlines and cancellation
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.tries = tries
+        self.token = None
+        # Read-through cache modes, see get()
+        self.offline = False
+        self.max_stale = None
+        self.stale = {}
+        self._auth = None
+        self._auth_certificate = None
+        self._auth_fetched = None
         self.endp = "https://scheduler.monroe-system.eu"
         self.endp_download = "https://www.monroe-system.eu"
 
     # using wget as it's compiled against GNU TLS; anything using OpenSSL won't work due to MD5 hashes
     # to be changed once fed4fire updates the experimenter certificates  
 
-    def get(self, endpoint):
+    def _encoding(self):
+        # wget only negotiates gzip, and inflates it as the body arrives
+        return wget_compression() if self.compression else []
+
+    def _open(self, cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cleanup=None,
+              env=None, tries=None):
+        # Starts wget with the transport limits, bounded by the token
+        connect, read = self.connect_timeout, self.read_timeout
+        if self.token is not None:
+            self.token.check()
+            remaining = self.token.remaining()
+            if remaining is not None:
+                connect = min(connect, max(1, int(remaining)))
+                read = min(read, max(1, int(remaining)))
+        limits = ['--dns-timeout=%d' % connect, '--connect-timeout=%d' % connect,
+                  '--read-timeout=%d' % read, '--tries=%d' % (tries or self.tries)]
+        process = subprocess.Popen(cmd[:1] + limits + cmd[1:], stdout=stdout, stderr=stderr,
+                                   env=env)
+        return _Request(process, self.token, cleanup)
+
+    def bounded(self, timeout=None, token=None):
+        '''Returns a copy of this scheduler whose requests are bounded by a deadline and can be cancelled. A request running when the token fires is killed, its partial downloads are removed and ``Cancelled`` is raised, as it is for every later request.
+
+        :param timeout: Seconds from now until the deadline
+        :type timeout: float
+        :param token: Token to use instead, e.g. to cancel from another thread
+        :type token: CancelToken
+        :returns: Scheduler
+        '''
+        bounded = copy.copy(self)
+        bounded.token = token or CancelToken(
+            time.time() + timeout if timeout is not None else None)
+        return bounded
+
+    def get(self, endpoint, max_age=None):
         '''Function which performs an HTTP GET request against the target backend.
 
         :param endpoint: REST API endpoint
         :type endpoint: string
+        :param max_age: Serve the response from the cache if it is younger than ``max_age`` seconds
+        :type max_age: int
         :returns: string -- The response of the request
+
+        When ``offline`` is set, responses are only served from the cache, whatever their age. When ``max_stale`` is set, cached responses up to ``max_stale`` seconds old are served instead of fetching them. The age of every response served older than requested is recorded in ``stale``, by endpoint.
         '''
+        key = self._cache_key(endpoint)
+        if self.cache is not None and (
+                max_age is not None or self.offline or self.max_stale is not None):
+            entry = self.cache.load(key)
+            if entry is not None:
+                body, age = entry
+                if max_age is not None and age <= max_age:
+                    return body
+                # Older responses are served in offline mode, or up to
+                # max_stale seconds, and recorded in self.stale
+                if self.offline or (self.max_stale is not None and age <= self.max_stale):
+                    self.stale[endpoint] = age
+                    return body
+            if self.offline:
+                raise RuntimeError("No cached response for %s" % endpoint)
         url = self.endp + endpoint
         cmd = [
             'wget','--content-on-error', '--certificate', self.cert, '--private-key', self.key, url,
             '-O', '-'
-        ]
-        response = subprocess.Popen(
-            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        ] + self._encoding()
+        with self._open(cmd, stderr=subprocess.DEVNULL) as response:
+            try:
+                res = json.load(response.stdout)
+            finally:
+                response.stdout.close()
+        if self.cache is not None and response.returncode == 0 \
+                and CACHED_ENDPOINTS.match(endpoint):
+            self.cache.put(key, res)
+        return res
+
+    def _cache_key(self, endpoint):
+        # The identity depends on the certificate, which setup may replace
+        if endpoint == AUTH_ENDPOINT:
+            return "%s/%s" % (endpoint, certificate_id(self.cert))
+        return endpoint
 
-        return json.loads(response.communicate()[0].decode())
+    def refresh(self, endpoints):
+        '''Fetches responses again, typically the ``stale`` ones, and stores them in the cache.
+
+        :param endpoints: REST API endpoints
+        :type endpoints: list
+        '''
+        offline, max_stale = self.offline, self.max_stale
+        self.offline, self.max_stale = False, None
+        try:
+            for endpoint in endpoints:
+                self.get(endpoint)
+        finally:
+            self.offline, self.max_stale = offline, max_stale
 
     def post(self, endpoint, postrequest):
         '''Function which performs an HTTP POST request against the target backend.
@@ -426,27 +866,153 @@ class Scheduler:
             'wget', '--content-on-error', '--certificate', self.cert,
             '--private-key', self.key, '--post-data=' + postrequest,
             '--header=Content-Type:application/json', url, '-O', '-'
-        ]
-        response = subprocess.Popen(
-            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        return response.communicate()[0].decode()
+        ] + self._encoding()
+        with self._open(cmd, tries=1) as response:
+            return response.communicate()[0].decode()
 
-    def download(self, endpoint, prefix):
+    def download(self, endpoint, prefix, callback=None, sync=False, compress=False):
         '''Function which downloads files from a given endpoint.
 
         :param endpoint: REST API endpoint
         :type endpoint: string
+        :param callback: Called with the path of every file as soon as it is saved
+        :type callback: function
+        :param sync: Skip files whose local copy has the same size and modification time as the remote one
+        :type sync: boolean
+        :param compress: Keep the files gzip-compressed on disk, with a ``.gz`` suffix
+        :type compress: boolean
         :returns: string -- The response of the request.
         '''
+        if compress:
+            if sync:
+                raise RuntimeError("Compressed results cannot be synchronized")
+            saved = []
+            self.download(endpoint, prefix, saved.append)
+            # wget reads the directory listings back to recurse, so files
+            # are only compressed once it is done
+            for path in saved:
+                if not os.path.basename(path).startswith('index.html'):
+                    path = compress_file(path)
+                if callback is not None:
+                    callback(path)
+            return ""
         url = self.endp_download + endpoint
+        # --unlink replaces files instead of overwriting them in place, which
+        # would also change every hard link to a deduplicated file
         cmd = [
-            'wget', '-r', '-nH', '--cut-dirs=1', '--no-parent', '-P',
+            'wget', '-r', '-nH', '--cut-dirs=1', '--no-parent', '--unlink', '-P',
             str(prefix), '--certificate', self.cert, '--private-key', self.key,
             url
+        ] + self._encoding()
+        if sync:
+            cmd.append('-N')
+        # wget logs every file before writing it and once it is saved, so an
+        # interrupted download only removes the files it had not finished
+        writing = set()
+
+        def cleanup():
+            for path in writing:
+                if os.path.exists(path):
+                    os.remove(path)
+
+        with self._open(cmd + ['--progress=dot:giga'], stdout=subprocess.DEVNULL,
+                        cleanup=cleanup, env=dict(os.environ, LC_ALL='C')) as response:
+            for line in response.stderr:
+                line = line.decode(errors='replace').rstrip()
+                started = re.match(r"^Saving to: '(.+)'$", line)
+                if started:
+                    writing.add(started.group(1))
+                    continue
+                saved = re.search(r" - '(.+)' saved \[[\d/]+\]$", line)
+                if saved:
+                    writing.discard(saved.group(1))
+                    if callback is not None:
+                        callback(saved.group(1))
+        return ""
+
+    def listing(self, endpoint):
+        '''Function which lists the files below a given download endpoint, without downloading them.
+
+        :param endpoint: REST API endpoint
+        :type endpoint: string
+        :returns: dict -- For each file path, its ``size`` in bytes and, if the server sent one, its ``digest`` as an ``(algorithm, hexadecimal digest)`` tuple
+        '''
+        url = self.endp_download + endpoint
+        cmd = [
+            'wget', '-r', '-nd', '--spider', '-S', '--no-parent', '-e', 'robots=off',
+            '-P', tempfile.gettempdir(), '--certificate', self.cert,
+            '--private-key', self.key, url
         ]
-        response = subprocess.Popen(
-            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        return response.communicate()[0].decode()
+        with self._open(cmd, stdout=subprocess.DEVNULL) as response:
+            return self._parse_listing(response.stderr)
+
+    def _parse_listing(self, lines):
+        files = {}
+        current = None
+        for line in lines:
+            line = line.decode(errors='replace').rstrip()
+            request = re.match(r'^--\S+ \S+--\s+(\S+)$', line)
+            if request:
+                path = request.group(1)[len(self.endp_download):]
+                current = None if path.endswith('/') else files.setdefault(
+                    path, {'size': None, 'digest': None})
+                continue
+            if current is None:
+                continue
+            header = re.match(r'^\s+([A-Za-z0-9-]+):\s*(.*)$', line)
+            if not header:
+                continue
+            name, value = header.group(1).lower(), header.group(2)
+            if name == 'content-length':
+                current['size'] = int(value)
+            elif name in ('digest', 'content-md5'):
+                algorithm, _, encoded = value.partition('=') if name == 'digest' \
+                    else ('md5', '', value)
+                try:
+                    current['digest'] = (algorithm.lower().replace('-', ''),
+                                         binascii.hexlify(base64.b64decode(encoded)).decode())
+                except (ValueError, binascii.Error):
+                    pass
+        return files
+
+    def fetch(self, endpoint, path, bucket=None, compress=False):
+        '''Function which downloads a single file from a given endpoint to ``path``. The file only appears at ``path`` once complete.
+
+        :param endpoint: REST API endpoint
+        :type endpoint: string
+        :param bucket: Token bucket the transfer draws from, to limit its bandwidth
+        :type bucket: monroe.transfer.TokenBucket
+        :param compress: Compress the file as it arrives and save it to ``path`` with a ``.gz`` suffix
+        :type compress: boolean
+        :returns: boolean -- True if the download succeeded
+        '''
+        if compress:
+            path += COMPRESSED_SUFFIX
+        url = self.endp_download + endpoint
+        cmd = [
+            'wget', '-q', '--certificate', self.cert, '--private-key',
+            self.key, url, '-O', '-'
+        ] + self._encoding()
+        part = path + '.part'
+
+        def cleanup():
+            if os.path.exists(part):
+                os.remove(part)
+
+        with self._open(cmd, stderr=subprocess.DEVNULL, cleanup=cleanup) as response:
+            try:
+                with compressed_writer(part) if compress else open(part, 'wb') as f:
+                    for block in iter(lambda: response.stdout.read(65536), b''):
+                        if bucket is not None:
+                            bucket.consume(len(block), self.token)
+                        f.write(block)
+            finally:
+                response.stdout.close()
+        if response.returncode != 0:
+            os.remove(path + '.part')
+            return False
+        os.replace(path + '.part', path)
+        return True
 
     def delete(self, endpoint):
         '''Function which performs an HTTP DELETE request against the target backend.
@@ -460,58 +1026,98 @@ class Scheduler:
             'wget', '--method=DELETE', '--certificate', self.cert,
             '--private-key', self.key, url, '-O', '-'
         ]
-        response = subprocess.Popen(
-            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        with self._open(cmd, tries=1) as response:
+            body = response.communicate()[0]
         try:
-            return json.loads(response.communicate()[0].decode())
-        except:
+            return json.loads(body.decode())
+        except ValueError:
             raise RuntimeError("Could not perform action.")
 
-    def auth(self):
-        '''Returns an ``auth`` object associated with a user.'''
-        endpoint = "/v1/backend/auth"
-        return Auth(self.get(endpoint))
-
-    def journals(self):
-        '''Returns all ``JournalEntry`` objects associated with a user.'''
-        res = self.auth()
-        endpoint = "/v1/users/%s/journals" % res.id()
-        return [JournalEntry(e) for e in self.get(endpoint)]
-
-    def nodes(self):
-        '''Returns all ``Node`` objects visible by the scheduler.'''
+    def auth(self, max_age=None):
+        '''Returns an ``auth`` object associated with a user. When ``max_age`` is given, an object fetched earlier by this scheduler or a cached response younger than ``max_age`` seconds is reused, as long as it was fetched with the same certificate.'''
+        certificate = certificate_id(self.cert)
+        if self._auth is None or max_age is None or certificate != self._auth_certificate \
+                or time.time() - self._auth_fetched > max_age:
+            self._auth = Auth(self.get(AUTH_ENDPOINT, max_age))
+            self._auth_certificate = certificate
+            # A response served from the cache is as old as the cached copy
+            age = self.cache.age(self._cache_key(AUTH_ENDPOINT)) if self.cache is not None else None
+            self._auth_fetched = time.time() - (age or 0)
+        return self._auth
+
+    def journals(self, since=None, userid=None):
+        '''Returns all ``JournalEntry`` objects associated with a user.
+
+        :param since: Only return entries from this UNIX timestamp on
+        :type since: int
+        :param userid: User ID, looked up with ``auth`` when not given
+        :type userid: int
+        :returns: list
+        '''
+        if userid is None:
+            userid = self.auth(max_age=AUTH_MAX_AGE).id()
+        endpoint = "/v1/users/%s/journals" % userid
+        return [JournalEntry(e) for e in self.get(endpoint)
+                if since is None or e['timestamp'] >= since]
+
+    def nodes(self, max_age=None):
+        '''Returns all ``Node`` objects visible by the scheduler, served from the cache if it is younger than ``max_age`` seconds.'''
         endpoint = "/v1/resources/"
-        return [Node(e) for e in self.get(endpoint)]
+        return [Node(e) for e in self.get(endpoint, max_age)]
 
-    def experiments(self):
-        '''Returns last 50 ``Experiment`` objects associated to a user.'''
-        res = self.auth()
+    def experiments(self, last=50):
+        '''Returns the last ``last`` ``Experiment`` objects associated to a user, 50 by default, or all of them if ``last`` is None.'''
+        res = self.auth(max_age=AUTH_MAX_AGE)
         endpoint = "/v1/users/%s/experiments" % res.id()
-        obj = []
         exp = self.get(endpoint)
-        if len(exp) > 50:
-            exp = exp[-50:]
-        
+        if last is not None and len(exp) > last:
+            exp = exp[-last:]
+
         return [Experiment(e) for e in exp]
 
-    def schedules(self, experimentid):
-        '''Returns all ``Schedule`` objects associated with an experiment.'''
+    def schedules(self, experimentid, max_age=None, final=False):
+        '''Returns all ``Schedule`` objects associated with an experiment, served from the cache if it is younger than ``max_age`` seconds. With ``final``, cached schedules are served whatever their age if they had all reached a finished state when fetched, since they no longer change.'''
         endpoint = "/v1/experiments/%s/schedules" % str(experimentid)
-        res = self.get(endpoint)
-        obj = {}
-        for item in res['schedules'].keys():
-            obj[item] = {
-                "id": item,
-                "nodeid": res['schedules'][item]['nodeid'],
-                "start": res['schedules'][item]['start'],
-                "status": res['schedules'][item]['status'],
-                "stop": res['schedules'][item]['stop']
-            }
-        return [Schedule(e) for e in obj.values()]
-
-    def submit_experiment(self, monroeExperiment):
-        '''Submits an experiment to the scheduler. Returns a ``SubmissionReport`` object.'''
+        data = None
+        if final and self.cache is not None:
+            entry = self.cache.load(self._cache_key(endpoint))
+            if entry is not None and all(e['status'] in FINISHED_STATES
+                                         for e in entry[0]['schedules'].values()):
+                data = entry[0]
+        if data is None:
+            data = self.get(endpoint, max_age)
+        return [Schedule({
+            "id": item,
+            "nodeid": e['nodeid'],
+            "start": e['start'],
+            "status": e['status'],
+            "stop": e['stop']
+        }) for item, e in data['schedules'].items()]
+
+    def schedules_many(self, experimentids, concurrency=8, max_age=None, final=False):
+        '''Returns the ``Schedule`` objects of several experiments, fetched concurrently.
+
+        :param experimentids: Experiment IDs
+        :type experimentids: list
+        :param concurrency: Maximum number of concurrent requests
+        :type concurrency: int
+        :param max_age: Serve the schedules from the cache if they are younger than ``max_age`` seconds
+        :type max_age: int
+        :param final: Serve cached schedules that had all finished whatever their age, see ``schedules``
+        :type final: boolean
+        :returns: dict -- The list of ``Schedule`` objects of each experiment ID
+        '''
+        experimentids = list(experimentids)
+        if not experimentids:
+            return {}
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            fetched = pool.map(lambda i: self.schedules(i, max_age, final), experimentids)
+            return dict(zip(experimentids, fetched))
+
+    def submit_experiment(self, monroeExperiment, inventory=None, quota=None):
+        '''Submits an experiment to the scheduler, after checking it with ``Experiment.validate`` against the given node inventory and quota. Returns a ``SubmissionReport`` object.'''
         endpoint = "/v1/experiments"
+        monroeExperiment.validate(inventory, quota)
         req = monroeExperiment.prepareJson()
         a = self.post(endpoint, req)
         try:
@@ -525,11 +1131,11 @@ class Scheduler:
                        nodecount=1,
                        duration=300,
                        testing=True):
-        '''Returns an ``Experiment`` object with default options and ``draft`` status.'''
+        '''Returns an ``Experiment`` object with default options and ``draft`` status. Use ``Experiment.clone`` or ``Experiment.sweep`` to derive further drafts without requests to the scheduler.'''
         data = {}
         options = {}
         data['status'] = "draft"
-        data['ownerid'] = self.auth().id()
+        data['ownerid'] = self.auth(max_age=AUTH_MAX_AGE).id()
         data['id'] = None
         data['summary'] = None
         # Initialise basic options
@@ -565,16 +1171,19 @@ class Scheduler:
         res = self.delete(endpoint)
         return res
 
-    def get_availability(self, experiment=None):
-        '''Returns an ``AvailabilityReport`` for a given experiment.'''
+    def get_availability(self, experiment=None, start=None):
+        '''Returns an ``AvailabilityReport`` for a given experiment, optionally for another ``start`` than the experiment's own.'''
         if experiment is not None:
             if experiment._data['status'] == 'draft':
+                if start is None:
+                    start = int(experiment._data['start'])
                 return self.availability(experiment._data['duration'],
                                          experiment._data['nodecount'],
                                          experiment._data['nodetype'],
                                          experiment._data['countries'],
                                          experiment._data['options']['nodes'],
-                                         int(experiment._data['start']))
+                                         experiment._data['model'],
+                                         start)
             else:
                 raise RuntimeError("Can't check availability in the past")
         else:
@@ -608,17 +1217,248 @@ class Scheduler:
         else:         
             endpoint = "/v1/schedules/find?duration=%s&nodecount=%s&nodetypes=%s&start=%s" % (
                 str(duration), str(nodecount), nodetype, start)
+        res = self.get(endpoint)
         try:
-            return AvailabilityReport(self.get(endpoint)[0])
+            return AvailabilityReport(res[0])
         except:
-            return self.get(endpoint)['message']
+            return res['message']
+
+    def plan_recurrence(self, experiment, workers=8, alternatives=3, tolerance=300):
+        '''Expands the recurrence of a draft experiment into its occurrences and checks the availability of every occurrence concurrently, before submission. When some occurrences cannot be allocated, a nodecount and a longer period that would cover more occurrences are suggested.
+
+        :param experiment: Draft experiment with recurrence options set
+        :type experiment: Experiment
+        :param workers: Maximum number of concurrent availability checks
+        :type workers: int
+        :param alternatives: Number of longer periods, in steps of one hour, to try when occurrences fail
+        :type alternatives: int
+        :param tolerance: Seconds an occurrence may be delayed by and still count as available
+        :type tolerance: int
+        :returns: RecurrencePlan
+        '''
+        period, until = experiment.recurrence()
+        if not period or not until:
+            raise RuntimeError("Experiment has no recurrence options")
+        nodecount = experiment.nodecount()
+
+        def probe(start):
+            report = self.get_availability(experiment, start)
+            if isinstance(report, AvailabilityReport):
+                return {
+                    'start': start,
+                    'available': report.start() <= start + tolerance
+                    and report.max_nodecount() >= nodecount,
+                    'max_nodecount': report.max_nodecount(),
+                    'message': None
+                }
+            return {
+                'start': start,
+                'available': False,
+                'max_nodecount': None,
+                'message': str(report)
+            }
+
+        def coverage(occurrences):
+            return sum(1 for o in occurrences if o['available']) / float(len(occurrences) or 1)
+
+        periods = [period]
+        plan = {'period': period, 'until': until, 'nodecount': nodecount,
+                'suggested_period': None, 'suggested_nodecount': None}
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            plan['occurrences'] = list(pool.map(probe, experiment.occurrences()))
+            if coverage(plan['occurrences']) < 1:
+                counts = [o['max_nodecount'] for o in plan['occurrences']
+                          if o['max_nodecount'] is not None]
+                if counts and 0 < min(counts) < nodecount:
+                    plan['suggested_nodecount'] = min(counts)
+                best = coverage(plan['occurrences'])
+                for k in range(1, alternatives + 1):
+                    candidate = period + k * 3600
+                    starts = experiment.occurrences(candidate)
+                    score = coverage(list(pool.map(probe, starts)))
+                    if score > best:
+                        best = score
+                        plan['suggested_period'] = candidate
+        return RecurrencePlan(plan)
+
+    def select_nodes(self, constraints=None, count=None, max_age=3600):
+        '''Chooses the largest set of nodes, up to ``count``, that matches the constraints and that the scheduler can allocate. Candidates are taken from the node inventory (served from the cache if younger than ``max_age`` seconds), spread round-robin across sites, and the set size is found by bisection with a few availability checks.
+
+        :param constraints: Any of ``countries`` (list), ``model`` (e.g. ``model:apu2d4``), ``ifcount`` (int), ``nodetype`` (e.g. ``type:testing``), ``heartbeat`` (maximum heartbeat age in seconds), ``per_site`` (maximum nodes per site), ``duration`` and ``start``
+        :type constraints: dict
+        :param count: Maximum number of nodes, defaults to every candidate
+        :type count: int
+        :returns: list -- Node IDs
+        '''
+        c = constraints or {}
+        nodetype = c.get('nodetype', 'type:testing')
+        now = time.time()
+        sites = {}
+        for node in self.nodes(max_age=max_age):
+            if node.status() != 'active':
+                continue
+            if node.nodetype() not in ('undefined', nodetype.split(':')[-1]):
+                continue
+            if c.get('countries') and node.project() not in c['countries'] \
+                    and node.site() not in c['countries']:
+                continue
+            if c.get('model') and node.model() != c['model'].split(':')[-1]:
+                continue
+            if c.get('ifcount') and node.interfaces() and len(node.interfaces()) < c['ifcount']:
+                continue
+            if c.get('heartbeat') and now - (node.heartbeat() or 0) > c['heartbeat']:
+                continue
+            sites.setdefault(node.site(), []).append(node)
+        # Freshest nodes first within a site, then one site at a time
+        for nodes in sites.values():
+            nodes.sort(key=lambda n: -(n.heartbeat() or 0))
+            if c.get('per_site'):
+                del nodes[c['per_site']:]
+        candidates = []
+        for rank in range(max([len(n) for n in sites.values()] or [0])):
+            for site in sorted(sites.keys()):
+                if rank < len(sites[site]):
+                    candidates.append(sites[site][rank].id())
+        if count is not None:
+            candidates = candidates[:count]
+
+        def fits(k):
+            report = self.availability(c.get('duration', 300), k, nodetype,
+                                       nodes=candidates[:k],
+                                       start=c.get('start', 0))
+            return isinstance(report, AvailabilityReport) and report.max_nodecount() >= k
+
+        low, high = 0, len(candidates)
+        if high and fits(high):
+            return candidates
+        while high - low > 1:
+            mid = (low + high) // 2
+            if fits(mid):
+                low = mid
+            else:
+                high = mid
+        return candidates[:low]
+
+    def stale_nodes(self, nodeids, threshold, max_age=None):
+        '''Returns the nodes whose heartbeat is older than ``threshold`` seconds, or missing. The nodes are first checked against the inventory served from the cache if it is younger than ``max_age`` seconds, and only those that look stale there are checked again against a fresh inventory. Nodes missing from the inventory are left to ``Experiment.validate``.
+
+        :param nodeids: Node IDs
+        :type nodeids: list
+        :param threshold: Maximum heartbeat age in seconds
+        :type threshold: int
+        :param max_age: Maximum age of the cached inventory in seconds
+        :type max_age: int
+        :returns: list -- The IDs of the stale nodes
+        '''
+
+        def check(inventory, ids):
+            now = time.time()
+            known = dict((n.id(), n) for n in inventory)
+            return [i for i in ids
+                    if i in known and now - (known[i].heartbeat() or 0) > threshold]
+
+        stale = check(self.nodes(max_age=max_age), nodeids)
+        if stale and max_age:
+            stale = check(self.nodes(), stale)
+        return stale
 
-    def result(self, experimentid):
-        '''Downloads the results for a given experiment ID in the current folder.'''
+    def result(self, experimentid, callback=None, sync=False, compress=False):
+        '''Downloads the results for a given experiment ID in the current folder. ``callback`` is called with the experiment ID, the ``Schedule`` and the path of every file as soon as it is saved. With ``sync``, files already downloaded and unchanged are skipped. With ``compress``, files are kept gzip-compressed on disk.'''
         schedules = self.schedules(experimentid)
         for item in schedules:
-            endpoint = "/user/" + str(item.id()) + "/"
-            self.download(endpoint, experimentid)
+            self.result_schedule(experimentid, item, callback, sync, compress)
+
+    def result_schedule(self, experimentid, schedule, callback=None, sync=False, compress=False):
+        '''Downloads the results of a single ``Schedule`` of an experiment into the experiment folder.'''
+        endpoint = "/user/" + str(schedule.id()) + "/"
+        if callback is not None:
+            return self.download(endpoint, experimentid,
+                                 lambda path: callback(experimentid, schedule, path),
+                                 sync, compress)
+        return self.download(endpoint, experimentid, sync=sync, compress=compress)
+
+    def harvest(self, experimentids=None, workers=4, interval=60, downloader=None, compress=False,
+                retries=3):
+        '''Watches experiments and downloads the results of every schedule as soon as it reaches a finished state, while the other schedules are still running. Failed polls and downloads are logged and tried again on the next poll.
+
+        :param experimentids: Experiment IDs to watch, defaults to all the user's unfinished experiments
+        :type experimentids: list
+        :param workers: Maximum number of concurrent downloads
+        :type workers: int
+        :param interval: Seconds between two polls of the schedules
+        :type interval: int
+        :param downloader: Routes the file transfers through a shared download scheduler instead of one wget per schedule
+        :type downloader: monroe.transfer.DownloadScheduler
+        :param compress: Keep the files gzip-compressed on disk
+        :type compress: boolean
+        :param retries: Number of times the download of a schedule is tried again before it is given up
+        :type retries: int
+        :returns: generator -- Yields ``(experimentid, Schedule)`` tuples as each download completes without any failed file
+        '''
+        if experimentids is None:
+            experimentids = [
+                e.id() for e in self.experiments()
+                if e.status() not in FINISHED_STATES
+            ]
+        pending = set(experimentids)
+        queued = set()
+        running = {}
+        attempts = {}
+        polled = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while pending or running:
+                if self.token is not None:
+                    self.token.check()
+                if pending and time.time() - polled >= interval:
+                    polled = time.time()
+                    try:
+                        fetched = self.schedules_many(pending, workers)
+                    except Cancelled:
+                        raise
+                    except Exception as err:
+                        log.warning("Could not fetch the schedules, polling again: %s", err)
+                        fetched = {}
+                    for expid, schedules in fetched.items():
+                        for item in schedules:
+                            if item.status() in FINISHED_STATES and item.id() not in queued:
+                                queued.add(item.id())
+                                if downloader is not None:
+                                    future = pool.submit(downloader.download_schedule, expid, item)
+                                else:
+                                    future = pool.submit(self.result_schedule, expid, item,
+                                                         compress=compress)
+                                running[future] = (expid, item)
+                        if all(i.status() in FINISHED_STATES for i in schedules):
+                            pending.discard(expid)
+                timeout = max(0, polled + interval - time.time()) if pending else None
+                if self.token is not None:
+                    # Wake up regularly to notice a cancelled token
+                    timeout = min(timeout, 1) if timeout is not None else 1
+                if not running:
+                    time.sleep(timeout or 0)
+                    continue
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    expid, item = running.pop(future)
+                    try:
+                        failed = future.result()
+                    except Cancelled:
+                        raise
+                    except Exception as err:
+                        failed = [str(err)]
+                    if not failed:
+                        yield expid, item
+                        continue
+                    attempts[item.id()] = attempts.get(item.id(), 0) + 1
+                    if attempts[item.id()] > retries:
+                        log.warning("Giving up on the results of schedule %s: %s",
+                                    item.id(), ', '.join(failed))
+                        continue
+                    # Queued again by the next poll
+                    log.warning("Could not download the results of schedule %s, retrying: %s",
+                                item.id(), ', '.join(failed))
+                    queued.discard(item.id())
+                    pending.add(expid)
 
 
 class Auth:
@@ -776,6 +1616,75 @@ class AvailabilityReport:
         return "%s\n%s\n%s\n%s" % (av, fi, m, de)
 
 
+class RecurrencePlan:
+    ''' 
+    Class that models the availability of every occurrence of a recurrent experiment.
+    '''
+
+    def __init__(self, data):
+        self._data = data
+
+    def occurrences(self):
+        '''Returns the occurrences, as dicts holding the ``start`` time, whether the occurrence is ``available``, the ``max_nodecount`` available and the scheduler ``message`` if the check failed.
+
+       :returns: list
+       '''
+        return self._data['occurrences']
+
+    def failed(self):
+        '''Returns the start times of the occurrences that could not be allocated.
+
+       :returns: list -- UNIX timestamps
+       '''
+        return [o['start'] for o in self.occurrences() if not o['available']]
+
+    def coverage(self):
+        '''Returns the fraction of occurrences that could be allocated.
+
+       :returns: float
+       '''
+        if not self.occurrences():
+            return 0.0
+        return 1 - len(self.failed()) / float(len(self.occurrences()))
+
+    def suggested_period(self):
+        '''Returns a longer period covering more occurrences, if one was found.
+
+       :returns: int -- Period in seconds, or None
+       '''
+        return self._data['suggested_period']
+
+    def suggested_nodecount(self):
+        '''Returns the largest nodecount available for every checked occurrence, if lower than the requested one.
+
+       :returns: int -- Number of nodes, or None
+       '''
+        return self._data['suggested_nodecount']
+
+    def __repr__(self):
+        return "<RecurrencePlan occurrences=%r coverage=%r >" % (
+            len(self.occurrences()), self.coverage())
+
+    def __str__(self):
+        lines = []
+        for o in self.occurrences():
+            t = datetime.datetime.fromtimestamp(o['start'])
+            if o['available']:
+                lines.append("%s : available" % t)
+            elif o['message']:
+                lines.append("%s : not available (%s)" % (t, o['message']))
+            else:
+                lines.append("%s : not available (up to %s nodes)" % (
+                    t, str(o['max_nodecount'])))
+        lines.append("%d of %d occurrences can be allocated" % (
+            len(self.occurrences()) - len(self.failed()), len(self.occurrences())))
+        if self.suggested_nodecount():
+            lines.append("Suggested nodecount: %s" % str(self.suggested_nodecount()))
+        if self.suggested_period():
+            lines.append("Suggested period: %s seconds" % str(self.suggested_period()))
+        return "\n".join(lines)
+
+
 class SubmissionReport:
     ''' 
     Class that models experiment submission information.
@@ -881,9 +1790,9 @@ class Node:
     def heartbeat(self):
         '''Returns timestamp of when the node was last seen.
 
-       :returns: int
+       :returns: int -- None if the node was never seen
        '''
-        return self._data['heartbeat']
+        return self._data.get('heartbeat')
 
     def hostname(self):
         '''Returns the node hostame.
@@ -906,6 +1815,13 @@ class Node:
        '''
         return self._data['model']
 
+    def interfaces(self):
+        '''Returns the interfaces of the node, if the inventory lists them.
+
+       :returns: list
+       '''
+        return self._data.get('interfaces') or []
+
     def project(self):
         '''Returns the designated node project.
 
@@ -954,6 +1870,8 @@ class Schedule:
     Class that models schedules.
     '''
 
+    __slots__ = ('_data',)
+
     def __init__(self, data):
         self._data = data
 
@@ -0,0 +1,153 @@
+import os
+import sys
+import json
+import stat
+import time
+import signal
+import socket
+import threading
+import socketserver
+
+from monroe.client import HEADER, SOCKET, send_frame, recv_exact
+
+
+class _Stream:
+    # Text stream that relays writes to the client as frames
+
+    encoding = 'utf-8'
+
+    def __init__(self, sock, kind):
+        self.sock = sock
+        self.kind = kind
+
+    def write(self, text):
+        if text:
+            send_frame(self.sock, self.kind, text.encode(self.encoding, 'replace'))
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        # Runs in a child forked from the warm daemon, so the command can
+        # change directory, environment and streams without affecting other
+        # commands; it leads its own process group so that it can be
+        # interrupted along with the processes it starts
+        os.setpgrp()
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        try:
+            kind, size = HEADER.unpack(recv_exact(self.request, HEADER.size))
+        except EOFError:
+            # Another daemon checking whether this one is running
+            return
+        request = json.loads(recv_exact(self.request, size).decode())
+        self.done = False
+        watcher = threading.Thread(target=self._watch)
+        watcher.daemon = True
+        watcher.start()
+        sys.stdout = _Stream(self.request, b'o')
+        sys.stderr = _Stream(self.request, b'e')
+        sys.stdin = open(os.devnull)
+        status = 0
+        try:
+            os.chdir(request['cwd'])
+            os.environ.clear()
+            os.environ.update(request.get('env', {}))
+            sys.argv = request['argv']
+            self.server.run(request['argv'])
+        except SystemExit as err:
+            if isinstance(err.code, int) or err.code is None:
+                status = err.code or 0
+            else:
+                sys.stderr.write("%s\n" % err.code)
+                status = 1
+        except KeyboardInterrupt:
+            status = 130
+        except Exception as err:
+            sys.stderr.write("ERROR: %s\n" % str(err))
+            status = 1
+        self.done = True
+        try:
+            send_frame(self.request, b'x', str(status).encode())
+        except OSError:
+            pass
+
+    def _watch(self):
+        # Interrupt frames are relayed as SIGINT; a closed connection means
+        # the client is gone, and the command is terminated
+        try:
+            while True:
+                kind, size = HEADER.unpack(recv_exact(self.request, HEADER.size))
+                recv_exact(self.request, size)
+                if not self.done:
+                    os.killpg(0, signal.SIGINT)
+        except (EOFError, OSError):
+            if not self.done:
+                os.killpg(0, signal.SIGTERM)
+
+
+class Daemon(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    '''
+    Class that models the monroe daemon: a long-lived process that keeps the
+    command line imported and a ``Scheduler`` authenticated, and runs the
+    commands forwarded by ``monroe.client`` over a Unix domain socket. Each
+    command runs in a child forked from the warm process. The identity and
+    the node inventory are refreshed every ``refresh`` seconds so that
+    commands find them in the response cache.
+    '''
+
+    def __init__(self, run, warm, path=SOCKET, refresh=300):
+        self.run = run
+        self.warm = warm
+        self.path = path
+        self.refresh = refresh
+        self.warmed = 0
+        if os.path.exists(path):
+            self._remove_stale(path)
+        # The socket is created private, no other user can connect in between
+        umask = os.umask(0o177)
+        try:
+            socketserver.UnixStreamServer.__init__(self, path, _Handler)
+        finally:
+            os.umask(umask)
+
+    def _remove_stale(self, path):
+        # Only a socket left behind by a daemon that is gone is replaced
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            raise RuntimeError("%s exists and is not a socket" % path)
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except (IOError, OSError):
+            os.remove(path)
+            return
+        finally:
+            probe.close()
+        raise RuntimeError("A monroe daemon is already serving on %s" % path)
+
+    def service_actions(self):
+        socketserver.ForkingMixIn.service_actions(self)
+        if time.time() - self.warmed >= self.refresh:
+            self.warmed = time.time()
+            try:
+                self.warm()
+            except Exception as err:
+                sys.stderr.write("monroe daemon: refresh failed: %s\n" % str(err))
+
+    def serve(self):
+        '''Serves commands until interrupted or terminated, then removes the socket.'''
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        try:
+            self.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.server_close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
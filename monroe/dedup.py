@@ -0,0 +1,83 @@
+import os
+import hashlib
+import warnings
+
+# Size of the reads used to hash files
+BUFFER_SIZE = 1024 * 1024
+
+
+def file_hash(path):
+    '''Returns the SHA-256 digest of a file.
+
+    :returns: string -- Hexadecimal digest
+    '''
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(BUFFER_SIZE), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ContentStore:
+    '''
+    Class that stores result files once by content: every file is kept
+    under its SHA-256 digest and hard-linked into the experiment trees
+    that contain it, so identical files across experiments and
+    re-downloads use the disk space of a single copy.
+    '''
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._skipped = set()
+
+    def path(self, digest):
+        '''Returns the location of the stored file with a given digest.'''
+        return os.path.join(self.directory, digest[:2], digest[2:])
+
+    def contains(self, digest):
+        '''Returns True if a file with the given digest is stored.'''
+        return os.path.isfile(self.path(digest))
+
+    def add(self, path):
+        '''Stores a file, or replaces it with a link to the stored copy if its content is already known. Linked files share their content, so a result file should be replaced rather than modified in place. Files on another file system than the store are left as they are, with a warning, since they cannot be linked.
+
+        :param path: Location of the file
+        :type path: string
+        :returns: string -- Digest of the file
+        '''
+        digest = file_hash(path)
+        target = self.path(digest)
+        if os.path.isfile(target):
+            if not os.path.samefile(path, target):
+                self._link(target, path)
+            return digest
+        if not os.path.isdir(os.path.dirname(target)):
+            os.makedirs(os.path.dirname(target))
+        try:
+            os.link(path, target)
+        except OSError as err:
+            # A copy would use more disk space than it saves
+            self._skip(path, err)
+        return digest
+
+    def _link(self, target, path):
+        tmp = path + '.dedup'
+        try:
+            os.link(target, tmp)
+        except OSError as err:
+            self._skip(path, err)
+            return
+        os.replace(tmp, path)
+
+    def _skip(self, path, err):
+        # Warns once per file system
+        device = os.stat(path).st_dev
+        if device not in self._skipped:
+            self._skipped.add(device)
+            warnings.warn("Files such as %s cannot be linked into the store %s (%s), they are not deduplicated" % (
+                path, self.directory, err.strerror), RuntimeWarning)
+
+    def callback(self, experimentid, schedule, path):
+        '''Stores a file as it is downloaded; suitable as the ``callback`` of ``Scheduler.result``.'''
+        if os.path.isfile(path) and not os.path.basename(path).startswith('index.html'):
+            self.add(path)
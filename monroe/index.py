@@ -0,0 +1,201 @@
+import bisect
+import json
+import time
+
+from monroe.core import Schedule
+
+# Schedule states that do not occupy a node
+IGNORED_STATES = ('canceled', )
+
+
+class IntervalTree:
+    '''
+    Class that models a static centered interval tree over half-open
+    ``[start, stop)`` intervals, answering overlap queries in
+    logarithmic time plus the number of results.
+    '''
+
+    def __init__(self, intervals):
+        self._root = self._build(list(intervals))
+
+    def _build(self, intervals):
+        if not intervals:
+            return None
+        points = sorted([i[0] for i in intervals] + [i[1] for i in intervals])
+        center = points[(len(points) - 1) // 2]
+        left, here, right = [], [], []
+        # The center is an endpoint, so at least the interval it belongs to
+        # stays here and each subtree is smaller
+        for i in intervals:
+            if i[0] <= center <= i[1]:
+                here.append(i)
+            elif i[1] < center:
+                left.append(i)
+            else:
+                right.append(i)
+        return (center,
+                sorted(here, key=lambda i: i[0]),
+                sorted(here, key=lambda i: -i[1]),
+                self._build(left), self._build(right))
+
+    def overlap(self, start, stop):
+        '''Returns the intervals overlapping ``[start, stop)``.
+
+        :returns: list -- ``(start, stop, item)`` tuples
+        '''
+        found = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            center, by_start, by_stop, left, right = node
+            if stop <= center:
+                for i in by_start:
+                    if i[0] >= stop:
+                        break
+                    found.append(i)
+                stack.append(left)
+            elif start >= center:
+                for i in by_stop:
+                    if i[1] <= start:
+                        break
+                    found.append(i)
+                stack.append(right)
+            else:
+                found.extend(by_start)
+                stack.append(left)
+                stack.append(right)
+        return found
+
+
+class ScheduleIndex:
+    '''
+    Class that indexes the schedules of a user's experiments per node,
+    to answer which nodes are busy or free over a period of time.
+    '''
+
+    def __init__(self, schedules, built=None):
+        self._schedules = [(expid, item) for expid, item in schedules
+                           if item.status() not in IGNORED_STATES]
+        self._built = built if built is not None else time.time()
+        pernode = {}
+        for expid, item in self._schedules:
+            pernode.setdefault(item.nodeid(), []).append(
+                (item.start(), item.stop(), (expid, item)))
+        self._trees = {}
+        self._busy = {}
+        for nodeid, intervals in pernode.items():
+            self._trees[nodeid] = IntervalTree(intervals)
+            merged = []
+            for start, stop, _ in sorted(intervals, key=lambda i: i[0]):
+                if merged and start <= merged[-1][1]:
+                    merged[-1][1] = max(merged[-1][1], stop)
+                else:
+                    merged.append([start, stop])
+            self._busy[nodeid] = ([m[0] for m in merged], [m[1] for m in merged])
+
+    @classmethod
+    def build(cls, scheduler, experimentids=None, workers=8):
+        '''Builds the index from the schedules of the given experiments, fetched concurrently.
+
+        :param scheduler: Scheduler to fetch the schedules from
+        :type scheduler: Scheduler
+        :param experimentids: Experiment IDs, defaults to all the user's experiments
+        :type experimentids: list
+        :param workers: Maximum number of concurrent requests
+        :type workers: int
+        :returns: ScheduleIndex
+        '''
+        if experimentids is None:
+            experimentids = [e.id() for e in scheduler.experiments(last=None)]
+        fetched = scheduler.schedules_many(experimentids, workers)
+        return cls([(expid, item)
+                    for expid in experimentids
+                    for item in fetched[expid]])
+
+    @classmethod
+    def load(cls, path):
+        '''Loads an index saved with ``save``.
+
+        :returns: ScheduleIndex
+        '''
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return cls([(e['experiment'], Schedule(e['schedule']))
+                    for e in data['schedules']], data['built'])
+
+    def save(self, path):
+        '''Saves the index to ``path``.'''
+        with open(path, 'w') as f:
+            json.dump({
+                'built': self._built,
+                'schedules': [{'experiment': expid, 'schedule': item._data}
+                              for expid, item in self._schedules]
+            }, f)
+
+    def built(self):
+        '''Returns the time at which the schedules were fetched.
+
+        :returns: float -- UNIX timestamp
+        '''
+        return self._built
+
+    def nodes(self):
+        '''Returns the IDs of the nodes holding at least one schedule.
+
+        :returns: list
+        '''
+        return sorted(self._trees.keys())
+
+    def overlap(self, start, stop, nodeid=None):
+        '''Returns the schedules running between ``start`` and ``stop``, on one node or on all of them, ordered by start time.
+
+        :returns: list -- ``(experimentid, Schedule)`` tuples
+        '''
+        nodes = [nodeid] if nodeid is not None else self._trees.keys()
+        found = []
+        for n in nodes:
+            if n in self._trees:
+                found.extend(i[2] for i in self._trees[n].overlap(start, stop))
+        return sorted(found, key=lambda i: i[1].start())
+
+    def busy_nodes(self, start, stop):
+        '''Returns the IDs of the nodes running one of the schedules between ``start`` and ``stop``.
+
+        :returns: list
+        '''
+        return [n for n in self.nodes() if not self._is_free(n, start, stop)]
+
+    def _is_free(self, nodeid, start, stop):
+        starts, stops = self._busy[nodeid]
+        i = bisect.bisect_left(starts, stop)
+        return i == 0 or stops[i - 1] <= start
+
+    def free_windows(self, nodeid, start, stop, length=0):
+        '''Returns the periods between ``start`` and ``stop`` during which a node runs none of the schedules.
+
+        :param length: Minimum length of a window, in seconds
+        :type length: int
+        :returns: list -- ``(start, stop)`` tuples
+        '''
+        starts, stops = self._busy.get(nodeid, ([], []))
+        windows = []
+        cursor = start
+        i = bisect.bisect_right(stops, start)
+        while i < len(starts) and starts[i] < stop:
+            if starts[i] > cursor:
+                windows.append((cursor, starts[i]))
+            cursor = max(cursor, stops[i])
+            i += 1
+        if cursor < stop:
+            windows.append((cursor, stop))
+        return [w for w in windows if w[1] - w[0] >= length]
+
+    def gaps(self, nodeid):
+        '''Returns the idle periods between the first and the last schedule of a node.
+
+        :returns: list -- ``(start, stop)`` tuples
+        '''
+        starts, stops = self._busy.get(nodeid, ([], []))
+        return list(zip(stops[:-1], starts[1:]))
@@ -0,0 +1,127 @@
+import os
+import json
+import sqlite3
+import threading
+
+from monroe.core import open_result
+
+
+class ResultStore:
+    '''
+    Class that loads downloaded JSON measurement files into a SQLite
+    database, one row per measurement keyed by experiment, schedule, node
+    and timestamp. Rows are inserted in batched transactions so memory use
+    does not grow with the size of the experiment.
+    '''
+
+    def __init__(self, path, batch=5000):
+        self.path = path
+        self.batch = batch
+        self._pending = []
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "path TEXT PRIMARY KEY, experiment INTEGER, schedule INTEGER, "
+            "node INTEGER, size INTEGER, records INTEGER)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS measurements ("
+            "experiment INTEGER, schedule INTEGER, node INTEGER, "
+            "timestamp REAL, file TEXT, data TEXT)")
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS measurements_key ON measurements "
+            "(experiment, schedule, node, timestamp)")
+        self._db.commit()
+
+    def _records(self, path):
+        with open_result(path) as f:
+            # One JSON document per line is the usual layout of MONROE
+            # results; anything else is read as a single document
+            try:
+                json.loads(f.readline().decode())
+                lines = True
+            except ValueError:
+                lines = False
+            f.seek(0)
+            if lines:
+                docs = (json.loads(l.decode()) for l in f if l.strip())
+            else:
+                docs = [json.load(f)]
+            for doc in docs:
+                for record in (doc if isinstance(doc, list) else [doc]):
+                    yield record
+
+    def ingest_file(self, path, experiment, schedule, node=None):
+        '''Parses a result file and queues its measurements for insertion. Files that are not JSON, such as directory listings, and files already ingested are skipped.
+
+        :param path: Location of the downloaded file
+        :type path: string
+        :param experiment: Experiment ID
+        :type experiment: int
+        :param schedule: Schedule ID
+        :type schedule: int
+        :param node: Node ID used when a measurement does not carry one
+        :type node: int
+        :returns: int -- Number of measurements read
+        '''
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM files WHERE path = ?",
+                                (path, )).fetchone():
+                return 0
+            count = 0
+            try:
+                for record in self._records(path):
+                    if not isinstance(record, dict):
+                        continue
+                    self._pending.append((
+                        experiment, schedule, record.get('NodeId', node),
+                        record.get('Timestamp', record.get('timestamp')),
+                        path, json.dumps(record)))
+                    count += 1
+                    if len(self._pending) >= self.batch:
+                        self._flush()
+            except (ValueError, UnicodeDecodeError):
+                pass
+            self._db.execute("INSERT INTO files VALUES (?, ?, ?, ?, ?, ?)", (
+                path, experiment, schedule, node, os.path.getsize(path), count))
+            return count
+
+    def ingest_tree(self, directory, experiment, nodes=None):
+        '''Ingests the results of an experiment already downloaded to ``directory``, laid out as ``<directory>/<schedule>/...``.
+
+        :param nodes: Node ID of each schedule ID
+        :type nodes: dict
+        :returns: int -- Number of measurements read
+        '''
+        count = 0
+        for root, dirs, files in os.walk(directory):
+            parts = os.path.relpath(root, directory).split(os.sep)
+            if not parts[0].isdigit():
+                continue
+            schedule = int(parts[0])
+            for name in files:
+                count += self.ingest_file(os.path.join(root, name), experiment,
+                                          schedule, (nodes or {}).get(schedule))
+        self.commit()
+        return count
+
+    def callback(self, experimentid, schedule, path):
+        '''Ingests a file as it is downloaded; suitable as the ``callback`` of ``Scheduler.result``.'''
+        self.ingest_file(path, experimentid, schedule.id(), schedule.nodeid())
+
+    def _flush(self):
+        if self._pending:
+            self._db.executemany(
+                "INSERT INTO measurements VALUES (?, ?, ?, ?, ?, ?)",
+                self._pending)
+            self._pending = []
+        self._db.commit()
+
+    def commit(self):
+        '''Writes the queued measurements to the database.'''
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        self.commit()
+        self._db.close()
@@ -0,0 +1,168 @@
+import time
+import sqlite3
+
+from monroe.core import JournalEntry, certificate_id
+
+QUOTAS = ('quota_time', 'quota_data', 'quota_storage')
+
+
+class JournalStore:
+    '''
+    Class that keeps a local SQLite copy of the user's quota journal, so that
+    history and burn-rate queries do not need to go through the scheduler.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        # Entries carry no ID of their own, so they are told apart by all
+        # their fields
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS journals ("
+            "timestamp INTEGER, quota TEXT, new_value INTEGER, "
+            "reason TEXT, ownerid INTEGER)")
+        self._db.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS journals_entry ON journals "
+            "(timestamp, quota, new_value, IFNULL(reason, ''), IFNULL(ownerid, -1))")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)")
+        self._db.commit()
+
+    def _meta(self, key, value=None):
+        if value is None:
+            row = self._db.execute("SELECT value FROM meta WHERE key = ?",
+                                   (key, )).fetchone()
+            return row[0] if row else None
+        self._db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                         (key, value))
+
+    def latest(self):
+        '''Returns the timestamp of the newest stored entry.
+
+        :returns: int -- UNIX timestamp, or None if the store is empty
+        '''
+        return self._db.execute(
+            "SELECT MAX(timestamp) FROM journals").fetchone()[0]
+
+    def synced(self):
+        '''Returns the time of the last synchronisation with the scheduler.
+
+        :returns: int -- UNIX timestamp, or None if the store was never synchronised
+        '''
+        return self._meta('synced')
+
+    def sync(self, scheduler, max_age=None):
+        '''Fetches the journal entries from the latest stored one on and stores the new ones.
+
+        :param scheduler: Scheduler to fetch the journals from
+        :type scheduler: Scheduler
+        :param max_age: Skip the fetch if the store was synchronised less than ``max_age`` seconds ago
+        :type max_age: int
+        :returns: int -- Number of new entries stored
+        '''
+        # The history belongs to the user of the certificate it was
+        # fetched with, it is dropped when the certificate changes
+        certificate = certificate_id(scheduler.cert)
+        if certificate != self._meta('certificate'):
+            self._db.execute("DELETE FROM journals")
+            self._db.execute("DELETE FROM meta")
+            self._meta('certificate', certificate)
+        synced = self.synced()
+        if max_age is not None and synced is not None and time.time() - synced < max_age:
+            return 0
+        userid = self._meta('userid')
+        if userid is None:
+            userid = scheduler.auth().id()
+            self._meta('userid', userid)
+        # Entries written in the same second as the latest stored one are
+        # fetched again, the ones already stored are ignored
+        entries = scheduler.journals(since=self.latest(), userid=userid)
+        changes = self._db.total_changes
+        self._db.executemany(
+            "INSERT OR IGNORE INTO journals VALUES (?, ?, ?, ?, ?)",
+            [(e.timestamp(), e.quota(), e.value(), e.reason(), e.ownerid())
+             for e in entries])
+        stored = self._db.total_changes - changes
+        self._meta('synced', int(time.time()))
+        self._db.commit()
+        return stored
+
+    def entries(self, quota=None, since=None):
+        '''Returns the stored ``JournalEntry`` objects, oldest first.
+
+        :param quota: Restrict to one category of quota, e.g. ``quota_time``
+        :type quota: string
+        :param since: Restrict to entries newer than this UNIX timestamp
+        :type since: int
+        :returns: list
+        '''
+        query = "SELECT timestamp, quota, new_value, reason, ownerid FROM journals WHERE 1"
+        params = []
+        if quota is not None:
+            query += " AND quota = ?"
+            params.append(quota)
+        if since is not None:
+            query += " AND timestamp > ?"
+            params.append(since)
+        query += " ORDER BY timestamp, rowid"
+        return [
+            JournalEntry({
+                'timestamp': r[0],
+                'quota': r[1],
+                'new_value': r[2],
+                'reason': r[3],
+                'ownerid': r[4]
+            }) for r in self._db.execute(query, params)
+        ]
+
+    def remaining(self, quota):
+        '''Returns the latest known value of a quota.
+
+        :returns: int -- Remaining quota in bytes or seconds, or None if unknown
+        '''
+        row = self._db.execute(
+            "SELECT new_value FROM journals WHERE quota = ? "
+            "ORDER BY timestamp DESC, rowid DESC LIMIT 1", (quota, )).fetchone()
+        return row[0] if row else None
+
+    def burn_rate(self, quota, days=30):
+        '''Returns the average amount of a quota consumed per day over the last ``days`` days. Quota increases (refills) are not counted as consumption, and a store holding less than ``days`` days of history is averaged over the period it covers.
+
+        :param quota: Category of quota, e.g. ``quota_time``
+        :type quota: string
+        :param days: Length of the window in days
+        :type days: int
+        :returns: float -- Bytes or seconds consumed per day
+        '''
+        since = time.time() - days * 86400
+        baseline = self._db.execute(
+            "SELECT new_value FROM journals WHERE quota = ? AND timestamp <= ? "
+            "ORDER BY timestamp DESC, rowid DESC LIMIT 1", (quota, since)).fetchone()
+        previous = baseline[0] if baseline else None
+        entries = self.entries(quota, since)
+        if not entries:
+            return 0.0
+        # Without older history, average over the period actually covered
+        if baseline is None:
+            since = entries[0].timestamp()
+        consumed = 0
+        for entry in entries:
+            if previous is not None and entry.value() < previous:
+                consumed += previous - entry.value()
+            previous = entry.value()
+        elapsed = max(time.time() - since, 3600)
+        return consumed * 86400.0 / elapsed
+
+    def forecast(self, quota, days=30):
+        '''Projects when a quota will be exhausted at the burn rate of the last ``days`` days.
+
+        :returns: tuple -- Remaining quota, consumption per day and projected exhaustion UNIX timestamp (None if the quota is not being consumed)
+        '''
+        remaining = self.remaining(quota)
+        rate = self.burn_rate(quota, days)
+        if remaining is None or rate <= 0:
+            return (remaining, rate, None)
+        return (remaining, rate, int(time.time() + remaining / rate * 86400))
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,72 @@
+import sys
+import csv
+import json
+
+# Formats of the records printed by the listing commands
+FORMATS = ('text', 'json', 'ndjson', 'csv')
+
+
+def record(obj):
+    '''Returns the payload behind a model object, as received from the scheduler.
+
+    :returns: dict
+    '''
+    return getattr(obj, '_data', obj)
+
+
+def flatten(data, prefix=''):
+    '''Flattens nested dictionaries into one level with dotted keys, for CSV columns. Lists are kept as JSON.
+
+    :returns: dict
+    '''
+    flat = {}
+    for key, value in data.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, prefix + key + '.'))
+        elif isinstance(value, list):
+            flat[prefix + key] = json.dumps(value)
+        else:
+            flat[prefix + key] = value
+    return flat
+
+
+def write(objects, fmt='text', stream=None):
+    '''Prints model objects one at a time as they are produced. ``text`` uses their usual rendering, the other formats their payload: one JSON array, one JSON document per line, or CSV rows. CSV columns are the keys of every record, so CSV rows are only printed once all records are produced.
+
+    :param objects: Objects or dictionaries to print
+    :type objects: iterable
+    :param fmt: One of ``FORMATS``
+    :type fmt: string
+    :param stream: Where to write, defaults to the standard output
+    :type stream: file object
+    :returns: int -- Number of records written
+    '''
+    stream = stream or sys.stdout
+    count = 0
+    rows = []
+    columns = {}
+    if fmt == 'json':
+        stream.write('[')
+    for obj in objects:
+        if fmt == 'text':
+            stream.write(str(obj) + '\n')
+        elif fmt == 'json':
+            stream.write((',\n' if count else '\n') + json.dumps(record(obj)))
+        elif fmt == 'ndjson':
+            stream.write(json.dumps(record(obj)) + '\n')
+        elif fmt == 'csv':
+            row = flatten(record(obj))
+            # Keys missing from earlier records still get a column
+            for key in row:
+                columns.setdefault(key, len(columns))
+            rows.append(row)
+        else:
+            raise RuntimeError("Unknown output format %s" % fmt)
+        count += 1
+    if fmt == 'json':
+        stream.write('\n]\n' if count else ']\n')
+    elif fmt == 'csv' and rows:
+        writer = csv.DictWriter(stream, sorted(columns, key=columns.get))
+        writer.writeheader()
+        writer.writerows(rows)
+    return count
@@ -0,0 +1,104 @@
+import cmd
+import shlex
+
+from monroe.completion import EXPERIMENT_COMMANDS
+
+# Commands after which the list of experiments may have changed
+CHANGING_COMMANDS = ('create', 'delete', 'template', 'plan', 'campaign')
+
+# Commands that cannot be nested in a shell
+EXCLUDED_COMMANDS = ('shell', 'daemon')
+
+
+class MonroeShell(cmd.Cmd):
+    '''
+    Class that models the interactive monroe shell. Every line is run as a
+    monroe command in the same process, so the scheduler, its identity and
+    its caches are reused for the whole session. Experiment and node IDs
+    are completed from lists fetched once and kept in memory.
+    '''
+
+    intro = "MONROE shell, type help for the commands and quit to leave."
+    prompt = 'monroe> '
+
+    def __init__(self, run, scheduler, commands, max_age=3600):
+        cmd.Cmd.__init__(self)
+        self.run = run
+        self.scheduler = scheduler
+        self.commands = sorted(c for c in commands if c not in EXCLUDED_COMMANDS)
+        self.max_age = max_age
+        self._experiments = None
+        self._nodes = None
+
+    def experiment_ids(self):
+        '''Returns the IDs of the user's experiments, newest first.
+
+        :returns: list
+        '''
+        if self._experiments is None:
+            self._experiments = [str(e.id()) for e in reversed(
+                self.scheduler.experiments(last=None))]
+        return self._experiments
+
+    def node_ids(self):
+        '''Returns the IDs of the nodes in the inventory.
+
+        :returns: list
+        '''
+        if self._nodes is None:
+            self._nodes = sorted((str(n.id()) for n in self.scheduler.nodes(
+                max_age=self.max_age)), key=int)
+        return self._nodes
+
+    def default(self, line):
+        try:
+            argv = shlex.split(line)
+        except ValueError as err:
+            print(err)
+            return
+        if argv[0] not in self.commands:
+            print("Unknown command: %s" % argv[0])
+            return
+        try:
+            self.run(['monroe'] + argv)
+        except SystemExit as err:
+            if err.code is not None and not isinstance(err.code, int):
+                print(err.code)
+        except Exception as err:
+            print("ERROR: %s" % str(err))
+        if argv[0] in CHANGING_COMMANDS:
+            self._experiments = None
+
+    def emptyline(self):
+        pass
+
+    def do_help(self, arg):
+        try:
+            self.run(['monroe'] + ([arg] if arg else []) + ['-h'])
+        except SystemExit:
+            pass
+
+    def do_quit(self, arg):
+        return True
+
+    def do_EOF(self, arg):
+        print()
+        return True
+
+    def completenames(self, text, *ignored):
+        return [c + ' ' for c in self.commands + ['help', 'quit']
+                if c.startswith(text)]
+
+    def completedefault(self, text, line, begidx, endidx):
+        words = line[:begidx].split()
+        options = [w for w in words[1:] if w.startswith('-')]
+        try:
+            if options and options[-1] == '--nodes':
+                ids = self.node_ids()
+            elif words[0] in EXPERIMENT_COMMANDS and not words[-1].startswith('-'):
+                ids = self.experiment_ids()
+            else:
+                return []
+        except Exception:
+            return []
+        return [i for i in ids if i.startswith(text)]
@@ -0,0 +1,337 @@
+import time
+
+from monroe.core import NODE_FIELDS, Schedule
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("NumPy is required for schedule and node tables, install it with pip install numpy")
+
+
+def _codes(values, categories=None):
+    # Encodes strings as indices into a list of categories
+    categories = list(categories or [])
+    index = dict((c, i) for i, c in enumerate(categories))
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, v in enumerate(values):
+        if v not in index:
+            index[v] = len(categories)
+            categories.append(v)
+        codes[i] = index[v]
+    return codes, categories
+
+
+class ScheduleSet:
+    '''
+    Class that models the schedules of many experiments as columns of
+    NumPy arrays: ``experiment``, ``id``, ``nodeid``, ``start``, ``stop``
+    and ``status``, the latter stored as indices into ``states``. Filters
+    return new sets and group-bys are computed over whole columns.
+    '''
+
+    def __init__(self, experiment, id, nodeid, start, stop, status, states):
+        _require_numpy()
+        self.experiment = np.asarray(experiment, dtype=np.int64)
+        self.id = np.asarray(id, dtype=np.int64)
+        self.nodeid = np.asarray(nodeid, dtype=np.int64)
+        self.start = np.asarray(start, dtype=np.float64)
+        self.stop = np.asarray(stop, dtype=np.float64)
+        self.status = np.asarray(status, dtype=np.int32)
+        self.states = list(states)
+
+    @classmethod
+    def from_schedules(cls, schedules):
+        '''Builds a set from ``Schedule`` objects.
+
+        :param schedules: The schedules of each experiment ID, as returned by ``Scheduler.schedules_many``, or ``(experimentid, Schedule)`` pairs
+        :type schedules: dict
+        :returns: ScheduleSet
+        '''
+        _require_numpy()
+        if isinstance(schedules, dict):
+            schedules = [(e, s) for e, items in schedules.items() for s in items]
+        rows = [(e, s._data) for e, s in schedules]
+        status, states = _codes([r['status'] for e, r in rows])
+        return cls(
+            np.fromiter((e for e, r in rows), np.int64, len(rows)),
+            np.fromiter((int(r['id']) for e, r in rows), np.int64, len(rows)),
+            np.fromiter((r['nodeid'] for e, r in rows), np.int64, len(rows)),
+            np.fromiter((r['start'] for e, r in rows), np.float64, len(rows)),
+            np.fromiter((r['stop'] for e, r in rows), np.float64, len(rows)),
+            status, states)
+
+    @classmethod
+    def fetch(cls, scheduler, experimentids=None, concurrency=8):
+        '''Builds a set from the schedules of the given experiments, fetched concurrently.
+
+        :param scheduler: Scheduler to fetch the schedules from
+        :type scheduler: Scheduler
+        :param experimentids: Experiment IDs, defaults to all the user's experiments
+        :type experimentids: list
+        :param concurrency: Maximum number of concurrent requests
+        :type concurrency: int
+        :returns: ScheduleSet
+        '''
+        if experimentids is None:
+            experimentids = [e.id() for e in scheduler.experiments(last=None)]
+        return cls.from_schedules(scheduler.schedules_many(experimentids, concurrency))
+
+    @classmethod
+    def merge(cls, sets):
+        '''Concatenates several sets, e.g. fetched for different experiments.
+
+        :param sets: ScheduleSet objects
+        :type sets: list
+        :returns: ScheduleSet
+        '''
+        _require_numpy()
+        sets = list(sets)
+        states = []
+        status = []
+        for s in sets:
+            # Map each set's states onto the merged list
+            mapping, states = _codes(s.states, states)
+            status.append(mapping[s.status] if len(s.status) else s.status)
+        return cls(*[np.concatenate([getattr(s, c) for s in sets] or [[]])
+                     for c in ('experiment', 'id', 'nodeid', 'start', 'stop')],
+                   np.concatenate(status or [[]]), states)
+
+    def __len__(self):
+        return len(self.id)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield int(self.experiment[i]), Schedule({
+                'id': str(self.id[i]),
+                'nodeid': int(self.nodeid[i]),
+                'start': int(self.start[i]),
+                'stop': int(self.stop[i]),
+                'status': self.states[self.status[i]]
+            })
+
+    def _take(self, mask):
+        return ScheduleSet(self.experiment[mask], self.id[mask], self.nodeid[mask],
+                           self.start[mask], self.stop[mask], self.status[mask],
+                           self.states)
+
+    def mask(self, status=None, start=None, stop=None, node=None, experiment=None):
+        '''Returns a boolean array selecting the schedules that match every given criterion.
+
+        :param status: State or list of states
+        :type status: string
+        :param start: Keep schedules still running at or after this UNIX timestamp
+        :type start: int
+        :param stop: Keep schedules starting before this UNIX timestamp
+        :type stop: int
+        :param node: Node ID or list of node IDs
+        :type node: int
+        :param experiment: Experiment ID or list of experiment IDs
+        :type experiment: int
+        :returns: numpy.ndarray
+        '''
+        mask = np.ones(len(self), dtype=bool)
+        if status is not None:
+            wanted = [self.states.index(s) for s in np.atleast_1d(status)
+                      if s in self.states]
+            mask &= np.isin(self.status, wanted)
+        if start is not None:
+            mask &= self.stop > start
+        if stop is not None:
+            mask &= self.start < stop
+        if node is not None:
+            mask &= np.isin(self.nodeid, np.atleast_1d(node))
+        if experiment is not None:
+            mask &= np.isin(self.experiment, np.atleast_1d(experiment))
+        return mask
+
+    def filter(self, **criteria):
+        '''Returns the schedules that match every criterion given to ``mask``.
+
+        :returns: ScheduleSet
+        '''
+        return self._take(self.mask(**criteria))
+
+    def by_status(self):
+        '''Returns the number of schedules in each state.
+
+        :returns: dict
+        '''
+        counts = np.bincount(self.status, minlength=len(self.states))
+        return dict((s, int(c)) for s, c in zip(self.states, counts) if c)
+
+    def by_node(self):
+        '''Returns the number of schedules on each node.
+
+        :returns: dict
+        '''
+        nodes, counts = np.unique(self.nodeid, return_counts=True)
+        return dict((int(n), int(c)) for n, c in zip(nodes, counts))
+
+    def utilization(self, start, stop):
+        '''Returns the fraction of the ``[start, stop)`` period each node spends running these schedules. Overlapping schedules on a node are counted separately, so filter out states such as ``canceled`` first.
+
+        :param start: Start of the period as a UNIX timestamp
+        :type start: int
+        :param stop: End of the period as a UNIX timestamp
+        :type stop: int
+        :returns: dict
+        '''
+        busy = np.clip(np.minimum(self.stop, stop) - np.maximum(self.start, start), 0, None)
+        nodes, index = np.unique(self.nodeid, return_inverse=True)
+        total = np.bincount(index, weights=busy, minlength=len(nodes))
+        return dict((int(n), float(t) / (stop - start)) for n, t in zip(nodes, total))
+
+    def __repr__(self):
+        return "<ScheduleSet schedules=%r experiments=%r >" % (
+            len(self), len(np.unique(self.experiment)))
+
+    def __str__(self):
+        return "Schedules=%d Experiments=%d Nodes=%d %s" % (
+            len(self), len(np.unique(self.experiment)), len(np.unique(self.nodeid)),
+            ' '.join("%s=%d" % c for c in sorted(self.by_status().items())))
+
+
+# Upper bounds in seconds of the heartbeat age buckets reported by NodeTable.liveness
+LIVENESS_BUCKETS = ((300, '5m'), (3600, '1h'), (86400, '1d'), (604800, '7d'))
+
+
+class NodeTable:
+    '''
+    Class that models the node inventory as columns of NumPy arrays: ``id``
+    and ``heartbeat`` (NaN when the node was never seen), and ``status``,
+    ``site``, ``project``, ``model`` and ``nodetype`` stored as indices into
+    the matching entry of ``categories``.
+    '''
+
+    COLUMNS = NODE_FIELDS
+
+    def __init__(self, id, heartbeat, codes, categories):
+        _require_numpy()
+        self.id = np.asarray(id, dtype=np.int64)
+        self.heartbeat = np.asarray(heartbeat, dtype=np.float64)
+        self.codes = codes
+        self.categories = categories
+
+    @classmethod
+    def from_nodes(cls, nodes):
+        '''Builds a table from ``Node`` objects.
+
+        :param nodes: Nodes of the inventory
+        :type nodes: list
+        :returns: NodeTable
+        '''
+        _require_numpy()
+        rows = [n._data for n in nodes]
+        codes, categories = {}, {}
+        for column, key in zip(cls.COLUMNS, ('status', 'site', 'project', 'model', 'type')):
+            codes[column], categories[column] = _codes(
+                [r.get(key) or 'undefined' for r in rows])
+        heartbeat = np.fromiter((r.get('heartbeat') or np.nan for r in rows),
+                                np.float64, len(rows))
+        return cls(np.fromiter((r['id'] for r in rows), np.int64, len(rows)),
+                   heartbeat, codes, categories)
+
+    @classmethod
+    def fetch(cls, scheduler, max_age=None):
+        '''Builds a table from the inventory, served from the cache if it is younger than ``max_age`` seconds.
+
+        :returns: NodeTable
+        '''
+        return cls.from_nodes(scheduler.nodes(max_age=max_age))
+
+    def __len__(self):
+        return len(self.id)
+
+    def column(self, name):
+        '''Returns the values of a categorical column, e.g. ``site``, one per node.
+
+        :returns: numpy.ndarray
+        '''
+        return np.asarray(self.categories[name], dtype=object)[self.codes[name]]
+
+    def age(self, now=None):
+        '''Returns the heartbeat age of every node in seconds, NaN for nodes never seen.
+
+        :returns: numpy.ndarray
+        '''
+        return (time.time() if now is None else now) - self.heartbeat
+
+    def liveness(self, now=None):
+        '''Returns the number of nodes by heartbeat age, e.g. ``{'5m': 310, '1h': 12, ...}`` where each bucket holds the nodes seen within that time but not within the previous bucket. Nodes seen earlier are counted under ``older`` and nodes never seen under ``never``.
+
+        :returns: dict
+        '''
+        age = self.age(now)
+        seen = ~np.isnan(age)
+        bounds = np.array([b for b, label in LIVENESS_BUCKETS], dtype=np.float64)
+        counts = np.bincount(np.searchsorted(bounds, age[seen], side='left'),
+                             minlength=len(bounds) + 1)
+        result = dict((label, int(c)) for (b, label), c in zip(LIVENESS_BUCKETS, counts))
+        result['older'] = int(counts[-1])
+        result['never'] = int((~seen).sum())
+        return result
+
+    def mask(self, status=None, site=None, project=None, model=None, nodetype=None,
+             max_age=None, now=None):
+        '''Returns a boolean array selecting the nodes that match every given criterion. Categorical criteria take a value or a list of values.
+
+        :param max_age: Keep nodes whose heartbeat is at most ``max_age`` seconds old
+        :type max_age: int
+        :returns: numpy.ndarray
+        '''
+        mask = np.ones(len(self), dtype=bool)
+        for column, wanted in (('status', status), ('site', site), ('project', project),
+                               ('model', model), ('nodetype', nodetype)):
+            if wanted is not None:
+                values = [self.categories[column].index(v) for v in np.atleast_1d(wanted)
+                          if v in self.categories[column]]
+                mask &= np.isin(self.codes[column], values)
+        if max_age is not None:
+            with np.errstate(invalid='ignore'):
+                mask &= self.age(now) <= max_age
+        return mask
+
+    def candidates(self, status='active', max_age=3600, now=None, **criteria):
+        '''Returns the IDs of the nodes matching the criteria of ``mask``, active and seen within the last hour by default, freshest heartbeat first.
+
+        :returns: list
+        '''
+        mask = self.mask(status=status, max_age=max_age, now=now, **criteria)
+        order = np.argsort(-np.nan_to_num(self.heartbeat[mask], nan=-np.inf), kind='stable')
+        return [int(i) for i in self.id[mask][order]]
+
+    def availability(self, by='site', max_age=3600, now=None):
+        '''Returns, for every value of a categorical column, the number of ``nodes``, of ``active`` ones, of ``alive`` ones (heartbeat at most ``max_age`` seconds old) and of ``available`` ones (both).
+
+        :param by: One of ``status``, ``site``, ``project``, ``model`` and ``nodetype``
+        :type by: string
+        :returns: dict
+        '''
+        codes = self.codes[by]
+        size = len(self.categories[by])
+        active = self.codes['status'] == (self.categories['status'].index('active')
+                                          if 'active' in self.categories['status'] else -1)
+        with np.errstate(invalid='ignore'):
+            alive = self.age(now) <= max_age
+        columns = {
+            'nodes': np.bincount(codes, minlength=size),
+            'active': np.bincount(codes, weights=active, minlength=size),
+            'alive': np.bincount(codes, weights=alive, minlength=size),
+            'available': np.bincount(codes, weights=active & alive, minlength=size)
+        }
+        return dict((value, dict((k, int(v[i])) for k, v in columns.items()))
+                    for i, value in enumerate(self.categories[by]))
+
+    def __repr__(self):
+        return "<NodeTable nodes=%r >" % len(self)
+
+    def __str__(self):
+        live = self.liveness()
+        return "Nodes=%d Heartbeat age: %s" % (len(self), ' '.join(
+            "%s%s=%d" % ('' if k in ('older', 'never') else '<', k, live[k])
+            for k in [l for b, l in LIVENESS_BUCKETS] + ['older', 'never']))
@@ -0,0 +1,284 @@
+import os
+import time
+import fcntl
+import heapq
+import threading
+
+from monroe.core import COMPRESSED_SUFFIX, Cancelled
+
+# Bytes drawn from a token bucket at a time by a transfer
+CHUNK = 65536
+
+
+def _sleep(seconds, token):
+    # Sleeps, waking up as soon as the token fires
+    if token is None:
+        time.sleep(seconds)
+    elif token.wait(seconds):
+        token.check()
+
+
+class TokenBucket:
+    '''
+    Class that models a token bucket limiting bandwidth: tokens (bytes)
+    accumulate at ``rate`` per second up to ``burst``, and transfers wait
+    until the bytes they move are available. When ``path`` is given, the
+    bucket state is kept in that file under a lock, so that every process
+    on the host using the same file shares one bandwidth limit.
+    '''
+
+    def __init__(self, rate, burst=None, path=None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(rate, CHUNK))
+        self.path = path
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._time = time.time()
+
+    def _take(self, tokens, last, n):
+        now = time.time()
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens >= n:
+            return tokens - n, now, 0
+        return tokens, now, (n - tokens) / self.rate
+
+    def consume(self, n, token=None):
+        '''Blocks until ``n`` bytes may be transferred, or raises ``Cancelled`` once ``token`` fires.'''
+        n = min(n, self.burst)
+        while True:
+            with self._lock:
+                if self.path is None:
+                    self._tokens, self._time, wait = self._take(
+                        self._tokens, self._time, n)
+                else:
+                    wait = self._consume_shared(n)
+            if wait <= 0:
+                return
+            _sleep(wait, token)
+
+    def _consume_shared(self, n):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                tokens, last = [float(i) for i in os.read(fd, 64).split()]
+            except ValueError:
+                tokens, last = self.burst, time.time()
+            tokens, last, wait = self._take(tokens, last, n)
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, ("%f %f" % (tokens, last)).encode())
+            return wait
+        finally:
+            os.close(fd)
+
+
+class HostSlots:
+    '''
+    Class that caps the number of transfers running at a time across every
+    process on the host, using one lock file per slot in ``directory``.
+    '''
+
+    def __init__(self, directory, count):
+        self.directory = directory
+        self.count = count
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def acquire(self, token=None):
+        '''Blocks until a slot is free and returns its handle, or raises ``Cancelled`` once ``token`` fires.'''
+        while True:
+            for i in range(self.count):
+                fd = os.open(os.path.join(self.directory, '%d.lock' % i),
+                             os.O_RDWR | os.O_CREAT, 0o600)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return fd
+                except (IOError, OSError):
+                    os.close(fd)
+            _sleep(0.2, token)
+
+    def release(self, fd):
+        '''Frees a slot returned by ``acquire``.'''
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+class _Batch:
+    # Completion counter for a group of queued files
+
+    def __init__(self):
+        self.pending = 0
+        self.failed = []
+        self.cancelled = None
+        self.cond = threading.Condition()
+
+    def add(self):
+        with self.cond:
+            self.pending += 1
+
+    def done(self, endpoint, ok, cancelled=None):
+        with self.cond:
+            self.cancelled = self.cancelled or cancelled
+            if not ok:
+                self.failed.append(endpoint)
+            self.pending -= 1
+            self.cond.notify_all()
+
+    def wait(self):
+        with self.cond:
+            while self.pending:
+                self.cond.wait()
+            if self.cancelled is not None:
+                raise self.cancelled
+            return self.failed
+
+
+class DownloadScheduler:
+    '''
+    Class that downloads result files through a bounded set of workers.
+    Files are taken by priority (lower first), then smallest first, so that
+    metadata and logs arrive before large captures. Bandwidth can be capped
+    with a ``TokenBucket`` and concurrency across processes with
+    ``HostSlots``. ``priority`` is used for files queued without one. With
+    ``compress``, files are kept gzip-compressed on disk.
+    '''
+
+    def __init__(self, scheduler, concurrency=4, bucket=None, slots=None, priority=0,
+                 compress=False):
+        self.scheduler = scheduler
+        self.priority = priority
+        self.compress = compress
+        self.bucket = bucket
+        self.slots = slots
+        self._queue = []
+        self._seq = 0
+        self._pending = 0
+        self._failed = []
+        self._cancelled = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self._workers = [threading.Thread(target=self._work)
+                         for _ in range(concurrency)]
+        for w in self._workers:
+            w.daemon = True
+            w.start()
+
+    def submit(self, endpoint, path, size=None, priority=None, callback=None, _batch=None):
+        '''Queues the download of one file.
+
+        :param endpoint: REST API endpoint of the file
+        :type endpoint: string
+        :param path: Local location of the file
+        :type path: string
+        :param size: Size of the file in bytes, if known
+        :type size: int
+        :param priority: Lower values are downloaded first, defaults to the scheduler's priority
+        :type priority: int
+        :param callback: Called with the path once the file is saved
+        :type callback: function
+        '''
+        if priority is None:
+            priority = self.priority
+        with self._cond:
+            self._seq += 1
+            self._pending += 1
+            if _batch is not None:
+                _batch.add()
+            heapq.heappush(self._queue, (priority, size if size is not None else 0,
+                                         self._seq, endpoint, path, callback, _batch))
+            self._cond.notify()
+
+    def submit_schedule(self, experimentid, schedule, priority=None, callback=None, _batch=None):
+        '''Queues every result file of a ``Schedule`` into the experiment folder. ``callback`` is called with the experiment ID, the schedule and the path of every saved file.
+
+        :returns: int -- Number of files queued
+        '''
+        listing = self.scheduler.listing("/user/%s/" % str(schedule.id()))
+        for endpoint, info in listing.items():
+            path = os.path.join(str(experimentid), *endpoint.split('/')[2:])
+            self.submit(endpoint, path, info['size'], priority,
+                        callback and (lambda p: callback(experimentid, schedule, p)),
+                        _batch)
+        return len(listing)
+
+    def download_schedule(self, experimentid, schedule, priority=None, callback=None):
+        '''Downloads every result file of a ``Schedule`` and waits until they are saved, sharing the workers with everything else queued. Raises ``Cancelled`` if the scheduler's token fired meanwhile.
+
+        :returns: list -- Endpoints of the files that failed
+        '''
+        batch = _Batch()
+        self.submit_schedule(experimentid, schedule, priority, callback, batch)
+        return batch.wait()
+
+    def submit_experiment(self, experimentid, priority=None, callback=None):
+        '''Queues every result file of an experiment.
+
+        :returns: int -- Number of files queued
+        '''
+        return sum(self.submit_schedule(experimentid, item, priority, callback)
+                   for item in self.scheduler.schedules(experimentid))
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                priority, size, seq, endpoint, path, callback, batch = heapq.heappop(self._queue)
+            cancelled = None
+            slot = None
+            try:
+                if self.slots:
+                    slot = self.slots.acquire(self.scheduler.token)
+                directory = os.path.dirname(path)
+                if directory and not os.path.isdir(directory):
+                    os.makedirs(directory, exist_ok=True)
+                ok = self.scheduler.fetch(endpoint, path, self.bucket, self.compress)
+                if ok and callback is not None:
+                    callback(path + COMPRESSED_SUFFIX if self.compress else path)
+            except Cancelled as e:
+                ok = False
+                cancelled = e
+            except Exception:
+                ok = False
+            finally:
+                if slot is not None:
+                    self.slots.release(slot)
+            if batch is not None:
+                batch.done(endpoint, ok, cancelled)
+            with self._cond:
+                self._cancelled = self._cancelled or cancelled
+                if not ok:
+                    self._failed.append(endpoint)
+                self._pending -= 1
+                self._cond.notify_all()
+
+    def join(self):
+        '''Waits until every queued file is downloaded. If the scheduler's token fired, the remaining files are dropped and ``Cancelled`` is raised.
+
+        :returns: list -- Endpoints of the files that failed
+        '''
+        with self._cond:
+            while self._pending:
+                self._cond.wait()
+            failed, self._failed = self._failed, []
+            cancelled, self._cancelled = self._cancelled, None
+        if cancelled is not None:
+            raise cancelled
+        return failed
+
+    def close(self):
+        '''Waits for the queued files and stops the workers.
+
+        :returns: list -- Endpoints of the files that failed
+        '''
+        try:
+            return self.join()
+        finally:
+            with self._cond:
+                self._closed = True
+                self._cond.notify_all()
+            for w in self._workers:
+                w.join()
@@ -0,0 +1,121 @@
+import os
+import json
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from monroe.core import COMPRESSED_SUFFIX, open_result
+from monroe.dedup import BUFFER_SIZE
+
+
+def _check(job):
+    path, expected = job
+    local = path
+    if not os.path.isfile(local):
+        local = path + COMPRESSED_SUFFIX
+        if not os.path.isfile(local):
+            return (path, 'missing', None)
+    algorithm, digest = expected['digest'] or ('sha256', None)
+    try:
+        h = hashlib.new(algorithm)
+    except ValueError:
+        h, digest = hashlib.sha256(), None
+    if local == path:
+        size = os.path.getsize(path)
+        if expected['size'] is not None and size != expected['size']:
+            return (path, 'size %d, expected %d' % (size, expected['size']), None)
+    size = 0
+    # Compressed files are checked against the size and digest of their content
+    with open_result(local) as f:
+        for block in iter(lambda: f.read(BUFFER_SIZE), b''):
+            h.update(block)
+            size += len(block)
+    if expected['size'] is not None and size != expected['size']:
+        return (path, 'size %d, expected %d' % (size, expected['size']), None)
+    if digest is not None and h.hexdigest() != digest:
+        return (path, '%s mismatch' % algorithm, h.hexdigest())
+    return (path, None, h.hexdigest())
+
+
+def verify_results(scheduler, experimentid, workers=8, retries=1, checksums=None):
+    '''Checks the downloaded results of an experiment against the server listing: every file must exist locally with the listed size, and with the listed digest when the server sends one. Files are hashed in a thread pool with large buffered reads. Failed files are downloaded again and checked once more, up to ``retries`` times, and a report is written to ``<experimentid>/verification.json``.
+
+    :param scheduler: Scheduler to list and download the files from
+    :type scheduler: Scheduler
+    :param experimentid: Experiment ID, whose results are in the folder of the same name
+    :type experimentid: int
+    :param workers: Number of files hashed at a time
+    :type workers: int
+    :param retries: Number of times failed files are downloaded again
+    :type retries: int
+    :param checksums: Expected SHA-256 digests by local path, overriding the server's
+    :type checksums: dict
+    :returns: VerificationReport
+    '''
+    prefix = str(experimentid)
+    expected = {}
+    for item in scheduler.schedules(experimentid):
+        for endpoint, info in scheduler.listing("/user/%s/" % str(item.id())).items():
+            # Local layout drops the leading /user/ as the download does
+            path = os.path.join(prefix, *endpoint.split('/')[2:])
+            if checksums and path in checksums:
+                info = dict(info, digest=('sha256', checksums[path]))
+            expected[path] = (endpoint, info)
+    results = {}
+    pending = list(expected.keys())
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for attempt in range(retries + 1):
+            for path, error, digest in pool.map(
+                    _check, [(p, expected[p][1]) for p in pending]):
+                results[path] = {'error': error, 'sha256': digest,
+                                 'attempts': attempt + 1}
+            pending = [p for p in pending if results[p]['error']]
+            if not pending or attempt == retries:
+                break
+            for path in pending:
+                if not os.path.isdir(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                scheduler.fetch(expected[path][0], path,
+                                compress=os.path.isfile(path + COMPRESSED_SUFFIX))
+    report = VerificationReport({
+        'experiment': experimentid,
+        'checked': time.time(),
+        'files': results
+    })
+    if os.path.isdir(prefix):
+        with open(os.path.join(prefix, 'verification.json'), 'w') as f:
+            json.dump(report._data, f, indent=1)
+    return report
+
+
+class VerificationReport:
+    ''' 
+    Class that models the result of the verification of downloaded results.
+    '''
+
+    def __init__(self, data):
+        self._data = data
+
+    def files(self):
+        '''Returns, for every file, the ``error`` found (None if the file is intact), its ``sha256`` digest and the number of ``attempts``.
+
+       :returns: dict
+       '''
+        return self._data['files']
+
+    def failed(self):
+        '''Returns the paths of the files that are still missing or corrupt.
+
+       :returns: list
+       '''
+        return sorted(p for p, r in self.files().items() if r['error'])
+
+    def __repr__(self):
+        return "<VerificationReport files=%r failed=%r >" % (
+            len(self.files()), len(self.failed()))
+
+    def __str__(self):
+        lines = ["%s : %s" % (p, self.files()[p]['error']) for p in self.failed()]
+        lines.append("%d of %d files verified" % (
+            len(self.files()) - len(self.failed()), len(self.files())))
+        return "\n".join(lines)
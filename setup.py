@@ -32,9 +32,10 @@ setup(
 
     packages=find_packages(exclude=['docs', 'tests']),
     install_requires = ['pyOpenSSL', 'pycryptodome', 'haikunator'],
+    extras_require = {'analysis': ['numpy'], 'yaml': ['PyYAML']},
     entry_points={
     'console_scripts': [
-        'monroe=monroe.cli:main',
+        'monroe=monroe.client:main',
     ],
 },
 )
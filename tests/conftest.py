@@ -0,0 +1,61 @@
+import os
+import sys
+import json
+import stat
+import textwrap
+
+import pytest
+
+PRELUDE = '''#!%s
+import os
+import sys
+import json
+import time
+args = sys.argv[1:]
+with open(os.path.join(os.path.dirname(__file__), 'calls.log'), 'a') as log:
+    log.write(json.dumps(args) + '\\n')
+if '--help' in args:
+    sys.exit(0)
+url = [a for a in args if '://' in a][0]
+path = '/' + url.split('://', 1)[1].split('/', 1)[1]
+'''
+
+
+class FakeWget:
+    '''Installs a fake ``wget`` on PATH running ``body`` with ``args``, ``url`` and ``path`` set.'''
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def __call__(self, body):
+        script = os.path.join(self.directory, 'wget')
+        with open(script, 'w') as f:
+            f.write(PRELUDE % sys.executable + textwrap.dedent(body))
+        os.chmod(script, os.stat(script).st_mode | stat.S_IEXEC)
+
+    def calls(self):
+        try:
+            with open(os.path.join(self.directory, 'calls.log')) as f:
+                return [json.loads(l) for l in f]
+        except IOError:
+            return []
+
+
+@pytest.fixture
+def fake_wget(tmp_path, monkeypatch):
+    directory = tmp_path / 'bin'
+    directory.mkdir()
+    monkeypatch.setenv('PATH', str(directory) + os.pathsep + os.environ['PATH'])
+    return FakeWget(str(directory))
+
+
+@pytest.fixture
+def scheduler(tmp_path, fake_wget):
+    from monroe.core import Scheduler
+    from monroe.cache import ResponseCache
+    cert = tmp_path / 'cert.pem'
+    cert.write_text('certificate')
+    s = Scheduler(str(cert), str(tmp_path / 'key.pem'),
+                  cache=ResponseCache(str(tmp_path / 'cache')), compression=False)
+    s.endp = s.endp_download = 'http://scheduler.test'
+    return s
@@ -0,0 +1,60 @@
+import gzip
+import json
+import argparse
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from monroe.analysis import summarize
+
+
+def write_lines(path, records):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(''.join(json.dumps(r) + '\n' for r in records))
+
+
+def test_summary_of_json_lines_and_other_files(tmp_path):
+    write_lines(tmp_path / '7' / 'rtt.json', [
+        {'Timestamp': 0, 'InterfaceName': 'op0', 'Rtt': 10},
+        {'Timestamp': 10, 'InterfaceName': 'op0', 'Rtt': 30},
+        {'Timestamp': 200, 'InterfaceName': 'op1', 'Rtt': 50}])
+    (tmp_path / '7' / 'container.log').write_text('started\n{"Rtt": 99}\n')
+    (tmp_path / '7' / 'document.json').write_text('{\n  "Timestamp": 5,\n  "Rtt": 1000\n}\n')
+    (tmp_path / '8').mkdir()
+    with gzip.open(str(tmp_path / '8' / 'rtt.json.gz'), 'wt') as f:
+        f.write(json.dumps({'Timestamp': 1, 'InterfaceName': 'op0', 'Rtt': 5}) + '\n')
+    (tmp_path / 'index.html').write_text('<html>')
+    rows = dict((r['schedule'], r) for r in summarize(str(tmp_path), {7: 70}, workers=1).schedules())
+    row = rows[7]
+    assert (row['node'], row['files'], row['skipped'], row['records']) == (70, 3, 2, 3)
+    assert row['gaps'] == 1 and row['largest_gap'] == 190
+    assert row['metrics'][('op0', 'Rtt')]['count'] == 2
+    assert row['metrics'][('op0', 'Rtt')]['mean'] == 20
+    assert ('', 'Rtt') not in row['metrics']
+    assert rows[8]['records'] == 1 and rows[8]['skipped'] == 0
+
+
+def test_schedule_with_only_skipped_files(tmp_path):
+    (tmp_path / '9').mkdir()
+    (tmp_path / '9' / 'container.log').write_text('started\n')
+    row = summarize(str(tmp_path), {9: 90}, workers=1).schedules()[0]
+    assert (row['node'], row['files'], row['skipped'], row['records']) == (90, 1, 1, 0)
+    assert row['first'] is None and row['gaps'] == 0 and row['metrics'] == {}
+
+
+SCHEDULES = '''
+print(json.dumps({'schedules': {'7': {'nodeid': 70, 'start': 0, 'stop': 60, 'status': 'finished'}}}))
+'''
+
+
+def test_results_summary_shows_node_ids(scheduler, fake_wget, tmp_path, monkeypatch, capsys):
+    from monroe import cli
+    fake_wget(SCHEDULES)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(cli, 'connect', lambda: scheduler)
+    write_lines(tmp_path / '5' / '7' / 'rtt.json', [{'Timestamp': 0, 'Rtt': 10}])
+    cli.results(argparse.Namespace(
+        exp=[5], ingest=None, dedup=False, sync=False, compress=False, verify=False,
+        summarize=True, concurrency=None, limit_rate=None, priority=0))
+    assert "Schedule ID=7 Node ID=70 " in capsys.readouterr().out
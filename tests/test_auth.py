@@ -0,0 +1,74 @@
+import json
+import time
+
+from monroe.core import AUTH_ENDPOINT, AUTH_MAX_AGE
+from monroe.journal import JournalStore
+
+AUTH = '''
+cert = open(args[args.index('--certificate') + 1]).read()
+if path == '/v1/backend/auth':
+    print(json.dumps({'fingerprint': cert, 'verified': True,
+                      'user': {'id': int(cert[-1]), 'name': cert}}))
+elif path.endswith('/experiments'):
+    print(json.dumps([]))
+else:
+    print(json.dumps([{'timestamp': 1, 'quota': 'quota_time', 'new_value': int(cert[-1]),
+                       'reason': path, 'ownerid': int(cert[-1])}]))
+'''
+
+
+def test_identity_is_not_reused_across_certificates(scheduler, fake_wget, tmp_path):
+    fake_wget(AUTH)
+    with open(scheduler.cert, 'w') as f:
+        f.write('user1')
+    assert scheduler.experiments() == []
+    assert scheduler.auth(max_age=3600).id() == 1
+    with open(scheduler.cert, 'w') as f:
+        f.write('user2')
+    assert scheduler.auth(max_age=3600).id() == 2
+    assert scheduler.new_experiment().ownerid() == 2
+    # Each certificate has its own cached identity
+    with open(scheduler.cert, 'w') as f:
+        f.write('user1')
+    calls = len(fake_wget.calls())
+    assert scheduler.auth(max_age=3600).id() == 1
+    assert len(fake_wget.calls()) == calls
+
+
+def test_cached_identity_expires(scheduler, fake_wget):
+    fake_wget(AUTH)
+    with open(scheduler.cert, 'w') as f:
+        f.write('user1')
+    key = scheduler._cache_key(AUTH_ENDPOINT)
+    scheduler.cache.put(key, {'user': {'id': 7}})
+    assert scheduler.auth(max_age=AUTH_MAX_AGE).id() == 7
+    with open(scheduler.cache._path(key), 'w') as f:
+        json.dump({'fetched': time.time() - AUTH_MAX_AGE - 1, 'body': {'user': {'id': 7}}}, f)
+    scheduler._auth = None
+    scheduler.experiments()
+    assert fake_wget.calls()[-1][-3].endswith('/v1/users/1/experiments')
+
+
+def test_journal_store_follows_the_certificate(scheduler, fake_wget, tmp_path):
+    fake_wget(AUTH)
+    store = JournalStore(str(tmp_path / 'j.sqlite'))
+    with open(scheduler.cert, 'w') as f:
+        f.write('user1')
+    store.sync(scheduler)
+    assert [e.ownerid() for e in store.entries()] == [1]
+    with open(scheduler.cert, 'w') as f:
+        f.write('user2')
+    store.sync(scheduler, max_age=3600)
+    assert [e.ownerid() for e in store.entries()] == [2]
+
+
+def test_identity_is_fetched_again_once_older_than_max_age(scheduler, fake_wget):
+    fake_wget(AUTH)
+    with open(scheduler.cert, 'w') as f:
+        f.write('user1')
+    scheduler.auth(max_age=60)
+    scheduler.auth(max_age=60)
+    assert len(fake_wget.calls()) == 1
+    time.sleep(1.1)
+    scheduler.auth(max_age=1)
+    assert len(fake_wget.calls()) == 2
@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+ECHO = '''
+print(json.dumps({'path': path}))
+'''
+
+
+def cached(scheduler, endpoint, age):
+    scheduler.cache.put(endpoint, {'path': 'cached'})
+    path = scheduler.cache._path(endpoint)
+    with open(path) as f:
+        entry = json.load(f)
+    entry['fetched'] -= age
+    with open(path, 'w') as f:
+        json.dump(entry, f)
+
+
+def test_offline_serves_any_age_without_requests(scheduler, fake_wget):
+    fake_wget(ECHO)
+    cached(scheduler, '/v1/users/1/experiments', 86400)
+    scheduler.offline = True
+    assert scheduler.get('/v1/users/1/experiments') == {'path': 'cached'}
+    assert 86400 <= scheduler.stale['/v1/users/1/experiments'] < 86460
+    with pytest.raises(RuntimeError, match="No cached response for /v1/resources/"):
+        scheduler.get('/v1/resources/')
+    assert fake_wget.calls() == []
+
+
+def test_max_stale(scheduler, fake_wget):
+    fake_wget(ECHO)
+    cached(scheduler, '/v1/users/1/experiments', 600)
+    cached(scheduler, '/v1/resources/', 7200)
+    scheduler.max_stale = 3600
+    assert scheduler.get('/v1/users/1/experiments', max_age=60) == {'path': 'cached'}
+    assert scheduler.get('/v1/resources/', max_age=60) == {'path': '/v1/resources/'}
+    assert list(scheduler.stale) == ['/v1/users/1/experiments']
+    # Fresh enough responses are not recorded as stale
+    assert scheduler.get('/v1/users/1/experiments', max_age=3600) == {'path': 'cached'}
+    assert list(scheduler.stale) == ['/v1/users/1/experiments']
+
+
+def test_refresh_fetches_stale_responses_again(scheduler, fake_wget):
+    fake_wget(ECHO)
+    cached(scheduler, '/v1/users/1/experiments', 7200)
+    scheduler.offline = True
+    scheduler.get('/v1/users/1/experiments')
+    scheduler.refresh(list(scheduler.stale))
+    assert scheduler.offline
+    scheduler.offline = False
+    assert scheduler.get('/v1/users/1/experiments', max_age=60) == {'path': '/v1/users/1/experiments'}
+    assert len(fake_wget.calls()) == 1
+
+
+def test_one_off_queries_are_not_cached(scheduler, fake_wget, tmp_path):
+    fake_wget(ECHO)
+    endpoint = "/v1/schedules/find?duration=300&nodecount=80&nodes=%s&nodetypes=&start=0" % (
+        ','.join(str(n) for n in range(1000, 1080)))
+    assert scheduler.get(endpoint) == {'path': endpoint}
+    assert not (tmp_path / 'cache').exists()
+    # Long endpoints still fit in a file name
+    scheduler.cache.put(endpoint, {'path': 'cached'})
+    assert scheduler.cache.get(endpoint, 60) == {'path': 'cached'}
+
+
+def test_cache_failures_are_not_fatal(scheduler, fake_wget, tmp_path, caplog):
+    fake_wget(ECHO)
+    (tmp_path / 'cache').write_text('not a directory')
+    assert scheduler.get('/v1/resources/') == {'path': '/v1/resources/'}
+    assert "Could not cache the response for /v1/resources/" in caplog.text
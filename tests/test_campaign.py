@@ -0,0 +1,106 @@
+import json
+import threading
+import time
+
+import pytest
+
+from monroe import campaign
+from monroe.core import Cancelled, CancelToken, Node, Schedule
+from monroe.campaign import CampaignRunner, load_campaign, plan_campaign, pool_key, pool_nodes
+
+NORWAY = {'script': 'a', 'duration': 100, 'nodecount': 2, 'countries': ['norway']}
+NORDIC = {'script': 'b', 'duration': 100, 'nodecount': 4, 'countries': ['norway', 'sweden']}
+
+
+def node(nodeid, project):
+    return Node({'id': nodeid, 'project': project, 'site': project, 'status': 'active',
+                 'type': 'testing', 'model': 'apu2d4'})
+
+
+INVENTORY = [node(1, 'norway'), node(2, 'norway'), node(3, 'sweden'), node(4, 'sweden')]
+
+
+def pools(*specs):
+    return dict((pool_key(s), (1000, len(pool_nodes(INVENTORY, pool_key(s))),
+                               pool_nodes(INVENTORY, pool_key(s)))) for s in specs)
+
+
+def test_overlapping_pools_share_their_nodes():
+    plan = plan_campaign([NORWAY, NORDIC], pools(NORWAY, NORDIC))
+    starts = sorted(e['start'] for e in plan.entries())
+    assert starts == [1000, 1100]
+    assert plan.makespan() == 1200
+
+
+def test_disjoint_pools_run_concurrently():
+    sweden = dict(NORWAY, countries=['sweden'])
+    plan = plan_campaign([NORWAY, sweden], pools(NORWAY, sweden))
+    assert [e['start'] for e in plan.entries()] == [1000, 1000]
+
+
+def test_pool_capacity_below_its_node_count():
+    key = pool_key(NORDIC)
+    plan = plan_campaign([dict(NORDIC, nodecount=1)] * 3,
+                         {key: (0, 2, pool_nodes(INVENTORY, key))})
+    assert sorted(e['start'] for e in plan.entries()) == [0, 0, 100]
+
+
+def test_pools_without_inventory_are_independent():
+    plan = plan_campaign([NORWAY, NORWAY], {pool_key(NORWAY): (0, 4)})
+    assert [e['start'] for e in plan.entries()] == [0, 0]
+    plan = plan_campaign([NORDIC], {pool_key(NORDIC): (0, 4, frozenset([1, 2]))})
+    assert plan.skipped() == {0: "only 2 nodes available"}
+
+
+def test_yaml_campaign_without_pyyaml(tmp_path, monkeypatch):
+    monkeypatch.setattr(campaign, 'yaml', None)
+    path = tmp_path / 'c.yaml'
+    path.write_text('experiments: []')
+    with pytest.raises(RuntimeError, match=r'monroe-lib\[yaml\]'):
+        load_campaign(str(path))
+    path = tmp_path / 'c.json'
+    path.write_text('{"experiments": [{"script": "s"}]}')
+    assert load_campaign(str(path))['experiments'][0]['duration'] == 300
+
+
+class Pending:
+    '''Scheduler whose schedules never get deployed.'''
+
+    token = None
+
+    def __init__(self):
+        self.polls = 0
+
+    def bounded(self, token):
+        self.token = token
+        return self
+
+    def schedules(self, experimentid):
+        self.polls += 1
+        return [Schedule({'id': 1, 'nodeid': 1, 'start': 0, 'stop': 1, 'status': 'defined'})]
+
+
+def runner(tmp_path, scheduler):
+    state = tmp_path / 'state'
+    state.write_text(json.dumps({'0': {'stage': 'submit', 'experiment': 5, 'name': 'e',
+                                       'submitting': False, 'error': None}}))
+    return CampaignRunner(scheduler, {'experiments': [{'script': 's'}]}, str(state),
+                          interval=3600)
+
+
+def test_stopped_run_returns_promptly_and_can_resume(tmp_path):
+    scheduler = Pending()
+    r = runner(tmp_path, scheduler)
+    threading.Timer(0.2, r.stop).start()
+    started = time.time()
+    with pytest.raises(Cancelled):
+        r.run()
+    assert time.time() - started < 5
+    assert r.state(0)['stage'] == 'submit' and r.state(0)['error'] is None
+
+
+def test_run_stops_at_the_scheduler_deadline(tmp_path):
+    scheduler = Pending()
+    scheduler.token = CancelToken.after(0.2)
+    with pytest.raises(Cancelled, match='Deadline'):
+        runner(tmp_path, scheduler).run()
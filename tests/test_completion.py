@@ -0,0 +1,58 @@
+from monroe import completion
+from monroe.core import Experiment, Node
+from monroe.completion import candidates, load, refresh, refresh_later
+from monroe.shell import MonroeShell
+
+DATA = {
+    'commands': ['calendar', 'create', 'delete', 'results'],
+    'experiments': [[101, 'a'], [102, 'b'], [203, 'c']],
+    'nodes': [[7, 'n'], [71, 'm']]
+}
+
+
+def test_commands_and_ids():
+    assert candidates(['c'], DATA) == ['calendar', 'create']
+    assert candidates(['delete', '1'], DATA) == ['102', '101']
+    assert candidates(['create', '--nodes', '7'], DATA) == ['7', '71']
+
+
+def test_no_experiment_ids_where_none_are_accepted():
+    assert candidates(['calendar', ''], DATA) == []
+    assert candidates(['results', '--output', ''], DATA) == []
+
+
+class Scheduler:
+    def experiments(self, last=None):
+        return [Experiment({'id': 101, 'name': 'a'}), Experiment({'id': 203, 'name': 'c'})]
+
+    def nodes(self, max_age=None):
+        return [Node({'id': 7, 'site': 'n'})]
+
+
+def test_refresh_writes_the_cache(tmp_path):
+    path = str(tmp_path / 'completion.json')
+    assert load(path) == {}
+    refresh(Scheduler(), ['results', 'create'], path)
+    data = load(path)
+    assert data['commands'] == ['create', 'results']
+    assert data['experiments'] == [[101, 'a'], [203, 'c']]
+    assert candidates(['results', '2'], data) == ['203']
+    assert candidates(['create', '--nodes', ''], data) == ['7']
+
+
+def test_fresh_cache_is_not_refreshed(tmp_path, monkeypatch):
+    path = str(tmp_path / 'completion.json')
+    refresh(Scheduler(), ['results'], path)
+    detached = []
+    monkeypatch.setattr(completion, 'detach', lambda *args: detached.append(args))
+    refresh_later(Scheduler(), ['results'], path)
+    assert detached == []
+    refresh_later(Scheduler(), ['results'], path, force=True)
+    assert len(detached) == 1
+
+
+def test_shell_completion():
+    shell = MonroeShell(None, Scheduler(), ['calendar', 'delete', 'shell'])
+    assert shell.completedefault('1', 'delete 1', 7, 8) == ['101']
+    assert shell.completedefault('', 'calendar ', 9, 9) == []
+    assert shell.completenames('s') == []
@@ -0,0 +1,36 @@
+import os
+import gzip
+import time
+
+from monroe.core import compress_file, open_result
+from monroe.dedup import ContentStore
+
+RESULT = '''
+sys.stdout.buffer.write(b'{"Rtt": 1}\\n' * 1000)
+'''
+
+
+def test_identical_results_compress_to_identical_files(tmp_path):
+    paths = []
+    for n in (1, 2):
+        path = tmp_path / str(n) / 'rtt.json'
+        path.parent.mkdir()
+        path.write_text('{"Rtt": 1}\n' * 1000)
+        paths.append(compress_file(str(path)))
+        time.sleep(1.1)
+    with open(paths[0], 'rb') as a, open(paths[1], 'rb') as b:
+        assert a.read() == b.read()
+    with open_result(paths[0]) as f:
+        assert f.read() == b'{"Rtt": 1}\n' * 1000
+
+
+def test_fetched_results_are_deduplicated(scheduler, fake_wget, tmp_path):
+    fake_wget(RESULT)
+    store = ContentStore(str(tmp_path / 'store'))
+    paths = [str(tmp_path / 'a.json'), str(tmp_path / 'b.json')]
+    for path in paths:
+        assert scheduler.fetch('/user/5/rtt.json', path, compress=True)
+        store.add(path + '.gz')
+    assert os.path.samefile(paths[0] + '.gz', paths[1] + '.gz')
+    with gzip.open(paths[0] + '.gz') as f:
+        assert f.read() == b'{"Rtt": 1}\n' * 1000
@@ -0,0 +1,135 @@
+import os
+import sys
+import json
+import time
+import socket
+import subprocess
+import threading
+
+import pytest
+
+from monroe.client import HEADER, forward, recv_exact, send_frame
+from monroe.daemon import Daemon
+
+
+def run(argv):
+    if argv[1] == 'where':
+        print(os.getcwd(), os.environ.get('MONROE_TEST'))
+    elif argv[1] == 'fail':
+        raise SystemExit("ERROR: failed")
+    elif argv[1] == 'sleep':
+        try:
+            print('sleeping')
+            time.sleep(30)
+        finally:
+            with open(argv[2], 'w') as f:
+                f.write('interrupted')
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    server = Daemon(run, lambda: None, path=str(tmp_path / 'd.sock'), refresh=3600)
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.1})
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def test_commands_run_in_the_client_directory_and_environment(daemon, tmp_path, monkeypatch, capfd):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('MONROE_TEST', 'client')
+    assert forward(['monroe', 'where'], daemon.path) == 0
+    assert capfd.readouterr().out == "%s client\n" % str(tmp_path)
+    assert forward(['monroe', 'fail'], daemon.path) == 1
+    assert capfd.readouterr().err == "ERROR: failed\n"
+
+
+def start(daemon, marker):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(daemon.path)
+    send_frame(sock, b'r', json.dumps({'argv': ['monroe', 'sleep', marker],
+                                       'cwd': os.getcwd()}).encode())
+    kind, size = HEADER.unpack(recv_exact(sock, HEADER.size))
+    assert (kind, recv_exact(sock, size)) == (b'o', b'sleeping')
+    return sock
+
+
+def wait_for(path):
+    deadline = time.time() + 10
+    while not os.path.exists(path) and time.time() < deadline:
+        time.sleep(0.05)
+    return os.path.exists(path)
+
+
+def test_interrupt_is_relayed(daemon, tmp_path):
+    marker = str(tmp_path / 'marker')
+    sock = start(daemon, marker)
+    send_frame(sock, b'i', b'')
+    frames = []
+    while True:
+        kind, size = HEADER.unpack(recv_exact(sock, HEADER.size))
+        frames.append((kind, recv_exact(sock, size)))
+        if kind == b'x':
+            break
+    sock.close()
+    assert frames[-1] == (b'x', b'130')
+    assert wait_for(marker)
+
+
+CLIENT = """
+import sys, json, socket
+from monroe.client import HEADER, recv_exact, send_frame
+sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+sock.connect(sys.argv[1])
+send_frame(sock, b'r', json.dumps({'argv': ['monroe', 'sleep', sys.argv[2]], 'cwd': '/'}).encode())
+recv_exact(sock, HEADER.size)
+"""
+
+
+def test_command_stops_when_the_client_goes_away(daemon, tmp_path):
+    # The client runs in its own process, as the daemon children forked
+    # from this one would otherwise keep its end of the connection open
+    marker = str(tmp_path / 'marker')
+    subprocess.check_call([sys.executable, '-c', CLIENT, daemon.path, marker],
+                          cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert wait_for(marker)
+
+
+SERVER = """
+import sys
+from monroe.daemon import Daemon
+Daemon(lambda argv: None, lambda: None, path=sys.argv[1], refresh=3600).serve()
+"""
+
+
+def test_running_daemon_is_not_replaced(tmp_path):
+    # The daemon runs in its own process for the same reason as above
+    path = str(tmp_path / 'd.sock')
+    server = subprocess.Popen([sys.executable, '-c', SERVER, path],
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    try:
+        assert wait_for(path)
+        assert os.stat(path).st_mode & 0o777 == 0o600
+        with pytest.raises(RuntimeError, match="already serving"):
+            Daemon(run, lambda: None, path=path)
+        assert server.poll() is None
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def test_stale_socket_is_replaced(tmp_path):
+    path = str(tmp_path / 'd.sock')
+    left = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    left.bind(path)
+    left.close()
+    server = Daemon(run, lambda: None, path=path)
+    try:
+        assert os.stat(path).st_mode & 0o777 == 0o600
+    finally:
+        server.server_close()
+    (tmp_path / 'file').write_text('mine')
+    with pytest.raises(RuntimeError, match="not a socket"):
+        Daemon(run, lambda: None, path=str(tmp_path / 'file'))
@@ -0,0 +1,42 @@
+import os
+import errno
+import stat
+
+import pytest
+
+from monroe import dedup
+from monroe.dedup import ContentStore, file_hash
+
+
+def test_identical_files_share_one_copy(tmp_path):
+    store = ContentStore(str(tmp_path / 'store'))
+    a = tmp_path / 'results' / '1' / 'a.json'
+    b = tmp_path / 'results' / '2' / 'a.json'
+    for path in (a, b):
+        path.parent.mkdir(parents=True)
+        path.write_text('{"Rtt": 1}\n')
+    digest = store.add(str(a))
+    assert store.add(str(b)) == digest == file_hash(str(a))
+    assert os.path.samefile(str(a), str(b))
+    assert os.path.samefile(str(a), store.path(digest))
+    # The results tree stays writable
+    assert os.stat(str(a)).st_mode & stat.S_IWUSR
+
+
+def test_files_on_another_file_system_are_left_alone(tmp_path, monkeypatch):
+    store = ContentStore(str(tmp_path / 'store'))
+
+    def link(src, dst):
+        raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+
+    monkeypatch.setattr(dedup.os, 'link', link)
+    paths = []
+    for n in range(3):
+        path = tmp_path / ('%d.json' % n)
+        path.write_text('same')
+        paths.append(str(path))
+    with pytest.warns(RuntimeWarning) as warned:
+        for path in paths:
+            store.add(path)
+    assert len(warned) == 1
+    assert not store.contains(file_hash(paths[0]))
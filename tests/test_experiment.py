@@ -0,0 +1,65 @@
+import time
+
+import pytest
+
+from monroe.core import Auth, Experiment, Node
+
+
+def draft(**options):
+    data = {'status': 'draft', 'id': None, 'summary': None, 'name': 'e',
+            'script': 's', 'nodecount': 3, 'start': 0, 'stop': 300,
+            'duration': 300, 'ifcount': None, 'nodetype': 'type:testing',
+            'model': None, 'countries': [],
+            'options': {'nodes': [], 'traffic': 1000, 'resultsQuota': 0, 'shared': 0,
+                        'storage': 1000, 'sshkey': None, 'recurrence': False,
+                        'jsonstr': {}, 'period': None, 'until': None}}
+    data.update(options)
+    return Experiment(data)
+
+
+def quota(time_left, data_left=10 ** 9, storage_left=10 ** 9):
+    return Auth({'user': {'quota_time': time_left, 'quota_data': data_left,
+                          'quota_storage': storage_left}})
+
+
+def test_clone_with_nodes_sets_nodecount():
+    exp = draft()
+    clone = exp.clone(nodes=[10, 11])
+    assert clone.nodes() == [10, 11]
+    assert clone.nodecount() == 2
+    assert exp.nodecount() == 3
+
+
+def test_clone_keeps_explicit_nodecount():
+    assert draft().clone(nodes=[10, 11], nodecount=1).nodecount() == 1
+
+
+def test_sweep_over_nodes():
+    counts = [e.nodecount() for e in draft().sweep(nodes=[[1], [1, 2, 3, 4]])]
+    assert counts == [1, 4]
+    assert [e.name() for e in draft().sweep(duration=[1, 2])] == ['e-1', 'e-2']
+
+
+def test_validate_nodes_against_inventory():
+    exp = draft()
+    exp.nodes([1, 2, 3, 4])
+    inventory = [Node({'id': 1, 'status': 'active', 'type': 'testing'}),
+                 Node({'id': 2, 'status': 'maintenance', 'type': 'testing'}),
+                 Node({'id': 3, 'status': 'active', 'type': 'deployed'})]
+    with pytest.raises(RuntimeError) as err:
+        exp.validate(inventory)
+    assert str(err.value).splitlines() == [
+        "Node 2 is not active (status: maintenance)",
+        "Node 3 is not a testing node",
+        "Node 4 does not exist"]
+    exp.nodes([1])
+    assert exp.validate(inventory)
+
+
+def test_validate_quota_counts_every_occurrence():
+    exp = draft(nodecount=2)
+    assert exp.validate(quota=quota(600))
+    until = int(time.time()) + 3 * 3600 + 60
+    exp.recurrence(3600, until)
+    with pytest.raises(RuntimeError, match="needs 2400 seconds of node time"):
+        exp.validate(quota=quota(600))
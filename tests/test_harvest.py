@@ -0,0 +1,99 @@
+import os
+
+from monroe.transfer import DownloadScheduler
+
+# Schedule 1 finishes at once, schedule 2 on the next poll
+SERVER = '''
+state = os.path.join(os.path.dirname(__file__), 'polls')
+if path.endswith('/schedules'):
+    polls = int(open(state).read()) if os.path.exists(state) else 0
+    open(state, 'w').write(str(polls + 1))
+    print(json.dumps({'schedules': {
+        '1': {'nodeid': 10, 'start': 0, 'stop': 60, 'status': 'finished'},
+        '2': {'nodeid': 11, 'start': 0, 'stop': 60,
+              'status': 'finished' if polls else 'started'}}}))
+elif '--spider' in args:
+    sys.stderr.write('--2026-10-19 18:31:25--  %s/rtt.json\\n' % url.rstrip('/'))
+    sys.stderr.write('  Content-Length: 11\\n')
+elif '-P' in args:
+    prefix = args[args.index('-P') + 1]
+    target = os.path.join(prefix, path.split('/')[2], 'rtt.json')
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    sys.stderr.write("Saving to: '%s'\\n" % target)
+    open(target, 'w').write('{"Rtt": 1}\\n')
+    sys.stderr.write("2026-10-19 18:31:25 (67.7 KB/s) - '%s' saved [11/11]\\n" % target)
+else:
+    sys.stdout.write('{"Rtt": 1}\\n')
+'''
+
+
+def test_harvest_downloads_schedules_as_they_finish(scheduler, fake_wget, tmp_path, monkeypatch):
+    fake_wget(SERVER)
+    monkeypatch.chdir(tmp_path)
+    harvested = [(expid, s.id()) for expid, s in scheduler.harvest([5], interval=0.2)]
+    assert harvested == [(5, '1'), (5, '2')]
+    assert os.path.exists(os.path.join('5', '1', 'rtt.json'))
+    assert os.path.exists(os.path.join('5', '2', 'rtt.json'))
+
+
+def test_harvest_through_download_scheduler(scheduler, fake_wget, tmp_path, monkeypatch):
+    fake_wget(SERVER)
+    monkeypatch.chdir(tmp_path)
+    transfers = DownloadScheduler(scheduler, concurrency=2)
+    try:
+        harvested = sorted(s.id() for _, s in
+                           scheduler.harvest([5], interval=0.2, downloader=transfers))
+    finally:
+        transfers.close()
+    assert harvested == ['1', '2']
+    assert os.path.exists(os.path.join('5', '2', 'rtt.json'))
+
+
+# The first poll fails, and so does the first download of every file
+FLAKY = '''
+def attempt(name):
+    state = os.path.join(os.path.dirname(__file__), name)
+    count = int(open(state).read()) if os.path.exists(state) else 0
+    open(state, 'w').write(str(count + 1))
+    return count
+
+if path.endswith('/schedules'):
+    if not attempt('polls'):
+        sys.exit(4)
+    print(json.dumps({'schedules': {
+        '1': {'nodeid': 10, 'start': 0, 'stop': 60, 'status': 'finished'}}}))
+elif '--spider' in args:
+    sys.stderr.write('--2026-10-19 18:31:25--  %srtt.json\\n' % url)
+    sys.stderr.write('  Content-Length: 11\\n')
+elif not attempt('downloads'):
+    sys.exit(8)
+else:
+    sys.stdout.write('{"Rtt": 1}\\n')
+'''
+
+
+def test_harvest_retries_failed_polls_and_downloads(scheduler, fake_wget, tmp_path,
+                                                     monkeypatch, caplog):
+    fake_wget(FLAKY)
+    monkeypatch.chdir(tmp_path)
+    transfers = DownloadScheduler(scheduler, concurrency=1)
+    try:
+        harvested = [s.id() for _, s in
+                     scheduler.harvest([5], interval=0.2, downloader=transfers)]
+    finally:
+        transfers.close()
+    assert harvested == ['1']
+    assert os.path.exists(os.path.join('5', '1', 'rtt.json'))
+    assert "Could not fetch the schedules" in caplog.text
+    assert "Could not download the results of schedule 1, retrying: /user/1/rtt.json" in caplog.text
+
+
+def test_harvest_gives_up_after_retries(scheduler, fake_wget, tmp_path, monkeypatch, caplog):
+    fake_wget(FLAKY.replace("elif not attempt('downloads')", "elif True"))
+    monkeypatch.chdir(tmp_path)
+    transfers = DownloadScheduler(scheduler, concurrency=1)
+    try:
+        assert list(scheduler.harvest([5], interval=0.1, downloader=transfers, retries=1)) == []
+    finally:
+        transfers.close()
+    assert "Giving up on the results of schedule 1" in caplog.text
@@ -0,0 +1,44 @@
+import random
+
+from monroe.core import Schedule
+from monroe.index import IntervalTree, ScheduleIndex
+
+
+def brute_force(intervals, start, stop):
+    return sorted(i for i in intervals if i[0] < stop and i[1] > start)
+
+
+def test_zero_length_intervals():
+    tree = IntervalTree([(5, 5, n) for n in range(100)])
+    assert sorted(tree.overlap(0, 10)) == [(5, 5, n) for n in range(100)]
+    assert tree.overlap(5, 10) == []
+    assert tree.overlap(0, 5) == []
+
+
+def test_overlap_matches_brute_force():
+    rnd = random.Random(1)
+    intervals = []
+    for n in range(500):
+        start = rnd.randrange(0, 1000)
+        intervals.append((start, start + rnd.choice([0, 1, 10, 100]), n))
+    tree = IntervalTree(intervals)
+    for _ in range(500):
+        start = rnd.randrange(-10, 1100)
+        stop = start + rnd.randrange(1, 200)
+        assert sorted(tree.overlap(start, stop)) == brute_force(intervals, start, stop)
+
+
+def schedule(nodeid, start, stop, status='defined'):
+    return Schedule({'id': start, 'nodeid': nodeid, 'start': start, 'stop': stop,
+                     'status': status})
+
+
+def test_schedule_index_windows():
+    index = ScheduleIndex([(1, schedule(10, 100, 200)), (1, schedule(10, 150, 300)),
+                           (2, schedule(10, 400, 500)), (2, schedule(11, 0, 50, 'canceled'))])
+    assert index.nodes() == [10]
+    assert index.busy_nodes(250, 260) == [10]
+    assert index.busy_nodes(300, 400) == []
+    assert index.free_windows(10, 0, 600, length=60) == [(0, 100), (300, 400), (500, 600)]
+    assert index.gaps(10) == [(300, 400)]
+    assert [i[1].start() for i in index.overlap(190, 410)] == [100, 150, 400]
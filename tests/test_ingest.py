@@ -0,0 +1,33 @@
+import gzip
+import json
+import sqlite3
+
+from monroe.ingest import ResultStore
+
+
+def write_results(directory):
+    (directory / '10').mkdir(parents=True)
+    (directory / '11').mkdir()
+    (directory / '10' / 'rtt.json').write_text(
+        '{"Timestamp": 1, "Rtt": 5}\n{"Timestamp": 2, "Rtt": 6, "NodeId": 99}\n')
+    (directory / '10' / 'index.html').write_text('<html></html>')
+    (directory / '11' / 'trace.json').write_text(json.dumps([{'timestamp': 3}, {'timestamp': 4}]))
+    with gzip.open(str(directory / '11' / 'rtt.json.gz'), 'wt') as f:
+        f.write('{"Timestamp": 5}\n')
+
+
+def test_ingest_tree(tmp_path):
+    write_results(tmp_path / '5')
+    path = str(tmp_path / 'results.db')
+    store = ResultStore(path, batch=2)
+    assert store.ingest_tree(str(tmp_path / '5'), 5, {10: 1, 11: 2}) == 5
+    # Files already ingested are skipped
+    assert store.ingest_tree(str(tmp_path / '5'), 5, {10: 1, 11: 2}) == 0
+    store.close()
+    db = sqlite3.connect(path)
+    rows = db.execute("SELECT schedule, node, timestamp FROM measurements "
+                      "ORDER BY timestamp").fetchall()
+    assert rows == [(10, 1, 1), (10, 99, 2), (11, 2, 3), (11, 2, 4), (11, 2, 5)]
+    files = dict(db.execute("SELECT path, records FROM files").fetchall())
+    assert files[str(tmp_path / '5' / '10' / 'index.html')] == 0
+    assert len(files) == 4
@@ -0,0 +1,42 @@
+from monroe.core import Auth, JournalEntry
+from monroe.journal import JournalStore
+
+
+class Journals:
+    cert = __file__
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.since = []
+
+    def auth(self, max_age=None):
+        return Auth({'user': {'id': 1}})
+
+    def journals(self, since=None, userid=None):
+        self.since.append(since)
+        return [JournalEntry(e) for e in self.entries
+                if since is None or e['timestamp'] >= since]
+
+
+def entry(timestamp, quota='quota_time', value=100, reason='x'):
+    return {'timestamp': timestamp, 'quota': quota, 'new_value': value,
+            'reason': reason, 'ownerid': 1}
+
+
+def test_entries_with_the_same_timestamp_are_kept(tmp_path):
+    store = JournalStore(str(tmp_path / 'j.sqlite'))
+    source = Journals([entry(10, value=100), entry(10, value=90), entry(10, value=90, reason=None)])
+    assert store.sync(source) == 3
+    assert len(store.entries()) == 3
+
+
+def test_entry_in_the_same_second_as_the_last_sync_is_fetched(tmp_path):
+    store = JournalStore(str(tmp_path / 'j.sqlite'))
+    source = Journals([entry(10, value=100)])
+    assert store.sync(source) == 1
+    source.entries.append(entry(10, value=80))
+    assert store.sync(source) == 1
+    assert source.since == [None, 10]
+    assert [e.value() for e in store.entries()] == [100, 80]
+    assert store.sync(source) == 0
+
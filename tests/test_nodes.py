@@ -0,0 +1,66 @@
+import json
+import argparse
+
+import pytest
+
+from monroe.cli import check_stale_nodes
+from test_experiment import draft
+
+INVENTORY = '''
+now = time.time()
+if path.startswith('/v1/resources'):
+    seen = json.load(open(os.path.join(os.path.dirname(__file__), 'seen')))
+    print(json.dumps([{'id': n, 'hostname': 'n%d' % n, 'status': 'active', 'type': 'testing',
+                       'model': 'apu2d4', 'project': site, 'site': site,
+                       'heartbeat': now - age}
+                      for n, site, age in seen]))
+else:
+    # Every node set of up to 3 nodes can be allocated
+    nodes = path.split('nodes=')[1].split('&')[0].split(',')
+    if len(nodes) <= 3:
+        print(json.dumps([{'max_nodecount': len(nodes), 'start': 0, 'max_stop': 0,
+                           'nodecount': len(nodes), 'nodetypes': ''}]))
+    else:
+        print(json.dumps({'message': 'Could not allocate'}))
+'''
+
+
+def inventory(fake_wget, seen):
+    fake_wget(INVENTORY)
+    with open(fake_wget.directory + '/seen', 'w') as f:
+        f.write(json.dumps(seen))
+
+
+def test_stale_nodes_are_checked_again_against_a_fresh_inventory(scheduler, fake_wget):
+    inventory(fake_wget, [[1, 'norway', 10], [2, 'norway', 7200], [3, 'sweden', 7200]])
+    assert scheduler.stale_nodes([1, 2, 3, 4], 3600) == [2, 3]
+    # Node 2 came back since the inventory was cached
+    inventory(fake_wget, [[1, 'norway', 10], [2, 'norway', 10], [3, 'sweden', 7200]])
+    assert scheduler.stale_nodes([1, 2, 3], 3600, max_age=3600) == [3]
+
+
+def test_select_nodes_spreads_across_sites(scheduler, fake_wget):
+    inventory(fake_wget, [[1, 'norway', 10], [2, 'norway', 20], [3, 'norway', 30],
+                          [4, 'sweden', 10], [5, 'sweden', 7200]])
+    assert scheduler.select_nodes() == [1, 4, 2]
+    assert scheduler.select_nodes({'countries': ['sweden']}) == [4, 5]
+    assert scheduler.select_nodes({'countries': ['sweden'], 'heartbeat': 3600}) == [4]
+    assert scheduler.select_nodes({'per_site': 1}) == [1, 4]
+    assert scheduler.select_nodes(count=1) == [1]
+
+
+def test_selected_nodes_are_checked_for_heartbeats(scheduler, fake_wget, capsys):
+    inventory(fake_wget, [[1, 'norway', 10], [2, 'sweden', 7200]])
+    exp = draft()
+    exp.nodes(scheduler.select_nodes())
+    exp.nodecount(2)
+    args = argparse.Namespace(max_heartbeat_age=None, stale_nodes='warn')
+    check_stale_nodes(args, scheduler, exp)
+    assert "Nodes not seen for more than 1h 0m: 2" in capsys.readouterr().out
+    check_stale_nodes(argparse.Namespace(max_heartbeat_age=None, stale_nodes='drop'),
+                      scheduler, exp)
+    assert (exp.nodes(), exp.nodecount()) == ([1], 1)
+    exp.nodes([2])
+    with pytest.raises(SystemExit):
+        check_stale_nodes(argparse.Namespace(max_heartbeat_age=60, stale_nodes='abort'),
+                          scheduler, exp)
@@ -0,0 +1,66 @@
+import io
+import csv
+import json
+import argparse
+
+import pytest
+
+from monroe.core import Experiment, Node, Schedule
+from monroe.output import write
+
+NODES = [Node({'id': 1, 'site': 'oslo', 'interfaces': [{'iccid': 'a'}], 'extra': {'model': 'apu'}}),
+         Node({'id': 2, 'site': 'lund', 'interfaces': [], 'extra': {'model': 'apu'}})]
+
+
+def render(objects, fmt):
+    stream = io.StringIO()
+    count = write(objects, fmt, stream)
+    return count, stream.getvalue()
+
+
+def test_json():
+    count, text = render(iter(NODES), 'json')
+    assert count == 2
+    assert json.loads(text) == [n._data for n in NODES]
+    assert json.loads(render([], 'json')[1]) == []
+
+
+def test_ndjson():
+    _, text = render(NODES, 'ndjson')
+    assert [json.loads(l) for l in text.splitlines()] == [n._data for n in NODES]
+
+
+def test_csv_flattens_records():
+    _, text = render(NODES, 'csv')
+    rows = list(csv.DictReader(io.StringIO(text)))
+    assert rows[0] == {'id': '1', 'site': 'oslo', 'interfaces': '[{"iccid": "a"}]',
+                       'extra.model': 'apu'}
+    assert rows[1]['interfaces'] == '[]'
+
+
+def test_unknown_format():
+    with pytest.raises(RuntimeError, match="Unknown output format"):
+        render(NODES, 'xml')
+
+
+class Scheduler:
+    def experiments(self, last=None):
+        return [Experiment({'id': 1, 'status': 'finished'}),
+                Experiment({'id': 2, 'status': 'started'})]
+
+    def schedules_many(self, experimentids, final=False):
+        states = {1: ['finished', 'finished'], 2: ['started', 'failed']}
+        return dict((e, [Schedule({'id': str(i), 'status': s}) for i, s in enumerate(states[e])])
+                    for e in experimentids)
+
+
+def test_csv_of_experiments_with_mixed_schedule_states(monkeypatch, capsys):
+    from monroe import cli
+    monkeypatch.setattr(cli, 'connect', lambda: Scheduler())
+    cli.experiments(argparse.Namespace(max=None, schedules=True, output='csv'))
+    rows = list(csv.DictReader(io.StringIO(capsys.readouterr().out)))
+    assert rows == [
+        {'id': '1', 'status': 'finished', 'schedules.finished': '2',
+         'schedules.started': '', 'schedules.failed': ''},
+        {'id': '2', 'status': 'started', 'schedules.finished': '',
+         'schedules.started': '1', 'schedules.failed': '1'}]
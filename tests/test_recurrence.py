@@ -0,0 +1,43 @@
+import time
+
+from test_experiment import draft
+
+# Every other hour after the base time in the "base" file is taken
+AVAILABILITY = '''
+base = int(open(os.path.join(os.path.dirname(__file__), 'base')).read())
+start = int(url.split('start=')[1])
+if (start - base) // 3600 % 2:
+    print(json.dumps({'message': 'No nodes available'}))
+else:
+    print(json.dumps([{'start': start, 'stop': start + 300, 'max_stop': start + 300,
+                       'max_nodecount': 2, 'nodecount': 2, 'nodetypes': 'type:testing'}]))
+'''
+
+
+def recurrent(fake_wget, nodecount=2):
+    base = int(time.time()) + 3600
+    with open(fake_wget.directory + '/base', 'w') as f:
+        f.write(str(base))
+    exp = draft(nodecount=nodecount, start=base)
+    exp.recurrence(3600, base + 4 * 3600)
+    return exp
+
+
+def test_plan_recurrence_checks_every_occurrence(scheduler, fake_wget):
+    fake_wget(AVAILABILITY)
+    exp = recurrent(fake_wget)
+    plan = scheduler.plan_recurrence(exp, alternatives=1)
+    starts = exp.occurrences()
+    assert [o['start'] for o in plan.occurrences()] == starts
+    assert plan.failed() == [starts[1], starts[3]]
+    assert plan.coverage() == 0.6
+    assert plan.occurrences()[1]['message'] == 'No nodes available'
+    assert plan.suggested_period() == 7200
+    assert plan.suggested_nodecount() is None
+
+
+def test_plan_recurrence_suggests_nodecount(scheduler, fake_wget):
+    fake_wget(AVAILABILITY)
+    plan = scheduler.plan_recurrence(recurrent(fake_wget, nodecount=3), alternatives=0)
+    assert plan.suggested_nodecount() == 2
+    assert plan.suggested_period() is None
@@ -0,0 +1,32 @@
+SCHEDULES = '''
+status = open(os.path.join(os.path.dirname(__file__), 'status')).read()
+print(json.dumps({'schedules': {'1': {'nodeid': 10, 'start': 0, 'stop': 60, 'status': status},
+                                '2': {'nodeid': 11, 'start': 0, 'stop': 60, 'status': 'finished'}}}))
+'''
+
+
+def status(fake_wget, value):
+    with open(fake_wget.directory + '/status', 'w') as f:
+        f.write(value)
+
+
+def test_final_schedules_are_refetched_until_finished(scheduler, fake_wget):
+    fake_wget(SCHEDULES)
+    status(fake_wget, 'started')
+    assert [s.status() for s in scheduler.schedules(5)] == ['started', 'finished']
+    status(fake_wget, 'stopped')
+    # The cached schedules were fetched while still running
+    assert [s.status() for s in scheduler.schedules(5, final=True)] == ['stopped', 'finished']
+    calls = len(fake_wget.calls())
+    status(fake_wget, 'failed')
+    assert scheduler.schedules_many([5], final=True)[5][0].status() == 'stopped'
+    assert len(fake_wget.calls()) == calls
+
+
+def test_schedules_many(scheduler, fake_wget):
+    fake_wget(SCHEDULES)
+    status(fake_wget, 'started')
+    fetched = scheduler.schedules_many([1, 2, 3], concurrency=2)
+    assert sorted(fetched) == [1, 2, 3]
+    assert [s.nodeid() for s in fetched[2]] == [10, 11]
+    assert scheduler.schedules_many([]) == {}
@@ -0,0 +1,76 @@
+import pytest
+
+pytest.importorskip('numpy')
+
+from monroe.core import Node, Schedule
+from monroe.tables import NodeTable, ScheduleSet
+
+
+def schedule(id, nodeid, start, stop, status):
+    return Schedule({'id': str(id), 'nodeid': nodeid, 'start': start, 'stop': stop,
+                     'status': status})
+
+
+SCHEDULES = {
+    5: [schedule(1, 10, 0, 100, 'finished'), schedule(2, 11, 50, 150, 'failed')],
+    6: [schedule(3, 10, 100, 200, 'started'), schedule(4, 12, 300, 400, 'canceled')]
+}
+
+
+def test_filters_and_groups():
+    s = ScheduleSet.from_schedules(SCHEDULES)
+    assert len(s) == 4
+    assert s.by_status() == {'finished': 1, 'failed': 1, 'started': 1, 'canceled': 1}
+    assert s.by_node() == {10: 2, 11: 1, 12: 1}
+    assert [i.id() for _, i in s.filter(status=['finished', 'started'])] == ['1', '3']
+    assert [e for e, _ in s.filter(start=100, stop=300)] == [5, 6]
+    assert len(s.filter(node=10, experiment=6)) == 1
+    assert len(s.filter(status='unknown')) == 0
+
+
+def test_utilization():
+    s = ScheduleSet.from_schedules(SCHEDULES).filter(status=['finished', 'failed', 'started'])
+    assert s.utilization(0, 200) == {10: 1.0, 11: 0.5}
+
+
+def test_merge_maps_states():
+    a = ScheduleSet.from_schedules({5: SCHEDULES[5]})
+    b = ScheduleSet.from_schedules({6: SCHEDULES[6]})
+    merged = ScheduleSet.merge([a, b, ScheduleSet.from_schedules({})])
+    assert merged.by_status() == ScheduleSet.from_schedules(SCHEDULES).by_status()
+    assert [(e, i.status()) for e, i in merged][2] == (6, 'started')
+
+
+NOW = 1000000
+
+
+def node(id, status, site, age):
+    return Node({'id': id, 'status': status, 'site': site, 'project': site,
+                 'type': 'testing', 'model': 'apu2d4',
+                 'heartbeat': NOW - age if age is not None else None})
+
+
+NODES = [node(1, 'active', 'oslo', 60), node(2, 'active', 'oslo', 7200),
+         node(3, 'maintenance', 'lund', 60), node(4, 'active', 'lund', None),
+         node(5, 'active', 'lund', 10)]
+
+
+def test_liveness():
+    table = NodeTable.from_nodes(NODES)
+    assert table.liveness(NOW) == {'5m': 3, '1h': 0, '1d': 1, '7d': 0, 'older': 0, 'never': 1}
+
+
+def test_candidates_freshest_first():
+    table = NodeTable.from_nodes(NODES)
+    assert table.candidates(now=NOW) == [5, 1]
+    assert table.candidates(max_age=None, now=NOW) == [5, 1, 2, 4]
+    assert table.candidates(site='oslo', max_age=None, now=NOW) == [1, 2]
+    assert table.candidates(model='unknown', now=NOW) == []
+
+
+def test_availability_by_site():
+    table = NodeTable.from_nodes(NODES)
+    assert table.availability(now=NOW) == {
+        'oslo': {'nodes': 2, 'active': 2, 'alive': 1, 'available': 1},
+        'lund': {'nodes': 3, 'active': 2, 'alive': 2, 'available': 1}}
+    assert list(table.column('site')) == ['oslo', 'oslo', 'lund', 'lund', 'lund']
@@ -0,0 +1,128 @@
+import os
+import time
+import socket
+import threading
+
+import pytest
+
+from monroe.core import Cancelled, CancelToken
+from monroe.transfer import TokenBucket, HostSlots, DownloadScheduler
+from monroe.cli import check_server
+
+# Saves one file, then stalls in the middle of the next one
+STALLED = '''
+prefix = args[args.index('-P') + 1]
+os.makedirs(os.path.join(prefix, '5'), exist_ok=True)
+for name, last in (('a.json', False), ('b.json', True)):
+    target = os.path.join(prefix, '5', name)
+    sys.stderr.write("Saving to: '%s'\\n" % target)
+    sys.stderr.flush()
+    with open(target, 'w') as f:
+        f.write('{"Rtt": 1}\\n')
+    if last:
+        time.sleep(30)
+    sys.stderr.write("2026-10-19 18:31:25 (67.7 KB/s) - '%s' saved [11/11]\\n" % target)
+'''
+
+ECHO = '''
+sys.stdout.write('{}')
+'''
+
+STALLED_FETCH = '''
+sys.stdout.write('x' * 10)
+sys.stdout.flush()
+time.sleep(30)
+'''
+
+
+def test_cancelled_download_only_removes_the_unfinished_file(scheduler, fake_wget, tmp_path):
+    fake_wget(STALLED)
+    prefix = tmp_path / 'exp'
+    prefix.mkdir()
+    mine = prefix / 'mine.txt'
+    mine.write_text('notes')
+    saved = []
+    bounded = scheduler.bounded(timeout=2)
+    with pytest.raises(Cancelled):
+        bounded.download('/user/5/', str(prefix), saved.append)
+    assert saved == [str(prefix / '5' / 'a.json')]
+    assert (prefix / '5' / 'a.json').exists()
+    assert not (prefix / '5' / 'b.json').exists()
+    assert mine.read_text() == 'notes'
+
+
+def test_only_idempotent_requests_are_retried(scheduler, fake_wget):
+    fake_wget(ECHO)
+    scheduler.post('/v1/experiments', '{}')
+    scheduler.delete('/v1/experiments/5')
+    scheduler.get('/v1/experiments/5')
+    tries = [[a for a in call if a.startswith('--tries=')] for call in fake_wget.calls()]
+    assert tries == [['--tries=1'], ['--tries=1'], ['--tries=3']]
+
+
+def test_files_are_downloaded_by_priority_then_size(scheduler, fake_wget, tmp_path):
+    fake_wget(ECHO)
+    slots = HostSlots(str(tmp_path / 'slots'), 1)
+    held = slots.acquire()
+    transfers = DownloadScheduler(scheduler, concurrency=1, slots=slots, priority=1)
+    # The worker takes the first file and waits for the slot
+    transfers.submit('/user/1/first', str(tmp_path / 'first'))
+    time.sleep(0.3)
+    transfers.submit('/user/1/capture', str(tmp_path / 'capture'), size=10 ** 6)
+    transfers.submit('/user/1/log', str(tmp_path / 'log'), size=100)
+    transfers.submit('/user/1/metadata', str(tmp_path / 'metadata'), size=10 ** 6, priority=0)
+    slots.release(held)
+    assert transfers.close() == []
+    order = [call[-3].rsplit('/', 1)[1] for call in fake_wget.calls()]
+    assert order == ['first', 'metadata', 'log', 'capture']
+
+
+def test_token_bucket_is_shared_through_its_file(tmp_path):
+    path = str(tmp_path / 'bandwidth')
+    TokenBucket(1000, burst=1000, path=path).consume(1000)
+    started = time.time()
+    TokenBucket(1000, burst=1000, path=path).consume(500)
+    assert time.time() - started >= 0.4
+
+
+def test_token_bucket_wait_is_cancelled():
+    bucket = TokenBucket(1, burst=10)
+    bucket.consume(10)
+    token = CancelToken.after(0.5)
+    started = time.time()
+    with pytest.raises(Cancelled):
+        bucket.consume(10, token)
+    assert time.time() - started < 5
+
+
+def test_host_slot_wait_is_cancelled(tmp_path):
+    slots = HostSlots(str(tmp_path / 'slots'), 1)
+    held = slots.acquire()
+    try:
+        with pytest.raises(Cancelled):
+            slots.acquire(CancelToken.after(0.5))
+    finally:
+        slots.release(held)
+
+
+def test_cancelled_transfers_raise_from_join(scheduler, fake_wget, tmp_path):
+    fake_wget(STALLED_FETCH)
+    token = CancelToken()
+    transfers = DownloadScheduler(scheduler.bounded(token=token), concurrency=2)
+    paths = [str(tmp_path / ('%d.json' % i)) for i in range(4)]
+    for path in paths:
+        transfers.submit('/user/5/rtt.json', path)
+    threading.Timer(0.5, token.cancel).start()
+    started = time.time()
+    with pytest.raises(Cancelled):
+        transfers.close()
+    assert time.time() - started < 10
+    assert not [p for p in os.listdir(str(tmp_path)) if p.endswith('.json') or p.endswith('.part')]
+
+
+def test_check_server_survives_socket_errors(monkeypatch):
+    def refuse(*args, **kwargs):
+        raise socket.error("no sockets left")
+    monkeypatch.setattr(socket, 'socket', refuse)
+    monkeypatch.setattr(time, 'sleep', lambda s: None)
+    assert not check_server('127.0.0.1', 30001, timeout=0)
@@ -0,0 +1,52 @@
+import os
+import json
+import base64
+import hashlib
+
+from monroe.verify import verify_results
+
+CONTENT = b'{"Rtt": 1}\n'
+
+SERVER = '''
+content = CONTENT
+if path.endswith('/schedules'):
+    print(json.dumps({'schedules': {
+        '10': {'nodeid': 1, 'start': 0, 'stop': 60, 'status': 'finished'}}}))
+elif '--spider' in args:
+    for name in ('a.json', 'b.json'):
+        sys.stderr.write('--2026-10-19 18:31:25--  %s%s\\n' % (url, name))
+        sys.stderr.write('  Content-Length: %d\\n' % len(content))
+        if name == 'a.json':
+            sys.stderr.write('  Digest: sha-256=DIGEST\\n')
+else:
+    sys.stdout.buffer.write(content)
+'''
+
+
+def server(fake_wget, served=CONTENT):
+    digest = base64.b64encode(hashlib.sha256(CONTENT).digest()).decode()
+    fake_wget(SERVER.replace('CONTENT', repr(served)).replace('DIGEST', digest))
+
+
+def test_corrupt_and_missing_files_are_downloaded_again(scheduler, fake_wget, tmp_path, monkeypatch):
+    server(fake_wget)
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(os.path.join('5', '10'))
+    with open(os.path.join('5', '10', 'a.json'), 'wb') as f:
+        f.write(b'{"Rtt": 2}\n')
+    report = verify_results(scheduler, 5)
+    assert report.failed() == []
+    files = report.files()
+    assert files[os.path.join('5', '10', 'a.json')]['attempts'] == 2
+    assert files[os.path.join('5', '10', 'b.json')]['sha256'] == hashlib.sha256(CONTENT).hexdigest()
+    with open(os.path.join('5', 'verification.json')) as f:
+        assert json.load(f)['experiment'] == 5
+
+
+def test_files_still_corrupt_are_reported(scheduler, fake_wget, tmp_path, monkeypatch):
+    server(fake_wget, served=b'{"Rtt": 2}\n')
+    monkeypatch.chdir(tmp_path)
+    report = verify_results(scheduler, 5, retries=1)
+    assert report.failed() == [os.path.join('5', '10', 'a.json')]
+    assert report.files()[os.path.join('5', '10', 'a.json')]['error'] == 'sha256 mismatch'
+    assert str(report).endswith("1 of 2 files verified")